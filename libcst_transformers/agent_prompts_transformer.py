@@ -0,0 +1,41 @@
+import libcst as cst
+import libcst.matchers as m
+
+SERIALIZER_IMPORT = "from browser_use.dom.budgeted_serializer import serialize_dom_state"
+
+
+class AgentPromptsTransformer(cst.CSTTransformer):
+  """
+  The element list of the agent prompt goes through the token budgeted serializer (browser_use/dom/budgeted_serializer.py):
+    X.clickable_elements_to_string(...) => serialize_dom_state(X, ...)
+  It's the same string as before while RE_BROWSER_USE_DOM_TOKEN_BUDGET isn't set or the page fits in it.
+  """
+
+  def __init__(self):
+    super().__init__()
+    self.replaced = 0
+
+  def leave_Call(self, original_node, updated_node):
+    if m.matches(updated_node, m.Call(func=m.Attribute(attr=m.Name("clickable_elements_to_string")))):
+      self.replaced += 1
+      return updated_node.with_changes(
+        func=cst.Name("serialize_dom_state"),
+        args=[cst.Arg(value=updated_node.func.value)] + list(updated_node.args),
+      )
+
+    return updated_node
+
+  def leave_Module(self, original_node, updated_node):
+    body = list(updated_node.body)
+    if not self.replaced or any(m.matches(stmt, m.SimpleStatementLine(body=[m.ImportFrom(
+        module=m.Attribute(attr=m.Name("budgeted_serializer")))])) for stmt in body):
+      return updated_node
+
+    # After the last top level import ...
+    insert_idx = 0
+    for i, stmt in enumerate(body):
+      if isinstance(stmt, cst.SimpleStatementLine) and isinstance(stmt.body[0], (cst.Import, cst.ImportFrom)):
+        insert_idx = i + 1
+    body[insert_idx:insert_idx] = [cst.parse_statement(SERIALIZER_IMPORT)]
+
+    return updated_node.with_changes(body=body)
@@ -7,6 +7,23 @@ class AgentServiceTransformer(cst.CSTTransformer):
   def __init__(self):
     self.in_get_next_action = False
     self.class_stack = []
+    self.function_stack = []
+    self.activated_sections = False
+
+  def leave_Module(self, original_node, updated_node):
+    body = list(updated_node.body)
+    if not self.activated_sections or any(m.matches(stmt, m.SimpleStatementLine(body=[m.ImportFrom(
+        module=m.Attribute(attr=m.Name("budgeted_serializer")))])) for stmt in body):
+      return updated_node
+
+    # After the last top level import ...
+    insert_idx = 0
+    for i, stmt in enumerate(body):
+      if isinstance(stmt, cst.SimpleStatementLine) and isinstance(stmt.body[0], (cst.Import, cst.ImportFrom)):
+        insert_idx = i + 1
+    body[insert_idx:insert_idx] = [cst.parse_statement("from browser_use.dom.budgeted_serializer import ExpandedSections")]
+
+    return updated_node.with_changes(body=body)
 
   def visit_ClassDef(self, node):
     self.class_stack.append(node.name.value)
@@ -14,6 +31,7 @@ class AgentServiceTransformer(cst.CSTTransformer):
 
   # visit_FunctionDef is called when entering a function definition node, before visiting its body
   def visit_FunctionDef(self, node):
+    self.function_stack.append(node.name.value)
     # LibCST traverses the entire file and look for any function named get_next_action, regardless of class
     # if node.name.value == "get_next_action" and self.current_class == "Agent":
     if node.name.value == "get_next_action" and self.class_stack and self.class_stack[-1] == "Agent":
@@ -21,6 +39,16 @@ class AgentServiceTransformer(cst.CSTTransformer):
 
   # leave_FunctionDef is called after visiting all children (body, decorators, etc.) of the function definition node
   def leave_FunctionDef(self, original_node, updated_node):
+    self.function_stack.pop()
+    # multi_act(..., start_speculative_capture=True): the streamed actions (one multi_act each) start it once, at the end ...
+    if (original_node.name.value == "multi_act" and self.class_stack and self.class_stack[-1] == "Agent"
+        and not any(param.name.value == "start_speculative_capture" for param in updated_node.params.params)):
+      # One parameter per line: the new last one takes the comma (and line break) of the old last one ...
+      *params, before_last, last = updated_node.params.params
+      param = last.with_changes(name=cst.Name("start_speculative_capture"), annotation=cst.Annotation(cst.Name("bool")),
+                                default=cst.Name("True"))
+      params = [*params, before_last, last.with_changes(comma=before_last.comma), param]
+      return updated_node.with_changes(params=updated_node.params.with_changes(params=params))
     if self.in_get_next_action:
       # Insert LLM_TIMEOUT_SECONDS after the docstring (if present)
       # .body (of FunctionDef) is a cst.IndentedBlock (the function’s code block)..body (of IndentedBlock) is a list of statements inside the block.
@@ -50,8 +78,15 @@ class AgentServiceTransformer(cst.CSTTransformer):
       if not already_present:
         # Parse the assignment statement with comment
         assign = cst.parse_statement("# Timeout for LLM API calls in seconds: Gemini is killing me and getting stuck forever ...\n"
+                                     "# It's the maximum now: the timeout adapts to the model's latencies (browser_use/agent/llm_timing.py)\n"
                                      "LLM_TIMEOUT_SECONDS = 20")
-        body.insert(insert_at, assign)
+        timing_import = cst.parse_statement("from browser_use.agent.llm_timing import timed_llm_call")
+        streaming_import = cst.parse_statement("from browser_use.agent.streaming_actions import STREAM_ACTIONS, stream_next_action")
+        streaming_branch = cst.parse_statement(
+          "if getattr(self, 'stream_actions', STREAM_ACTIONS) and self.tool_calling_method == 'function_calling':\n"
+          "  # Every action executed as soon as it's complete in the stream (browser_use/agent/streaming_actions.py) ...\n"
+          "  return await stream_next_action(self, input_messages, max_timeout=LLM_TIMEOUT_SECONDS)\n")
+        body[insert_at:insert_at] = [timing_import, streaming_import, assign, streaming_branch]
         updated_node = updated_node.with_changes(body=updated_node.body.with_changes(body=body))
 
     self.in_get_next_action = False
@@ -59,6 +94,15 @@ class AgentServiceTransformer(cst.CSTTransformer):
 
   # leave_Await is called after visiting the child of an await expression node
   def leave_Await(self, original_node, updated_node):
+    # await self.controller.act(...) in multi_act => await self.browser_session.measure_action(action, self.controller.act(...))
+    if (self.function_stack and self.function_stack[-1] == "multi_act" and
+        m.matches(updated_node.expression,
+                  m.Call(func=m.Attribute(value=m.Attribute(value=m.Name("self"), attr=m.Name("controller")), attr=m.Name("act"))))):
+      new_call = cst.parse_expression(
+        f"self.browser_session.measure_action(action, {cst.Module([]).code_for_node(updated_node.expression)})"
+      )
+      return updated_node.with_changes(expression=new_call)
+
     if self.in_get_next_action:
       # Match await self.llm.ainvoke(...) or await structured_llm.ainvoke(...)
       # 'value' is the object before the dot (e.g., structured_llm.ainvoke → structured_llm is the value, ainvoke is the 'attr').
@@ -68,13 +112,29 @@ class AgentServiceTransformer(cst.CSTTransformer):
           updated_node.expression,
           m.Call(func=m.Attribute(value=m.OneOf(m.Attribute(value=m.Name("self"), attr=m.Name("llm")), m.Name("structured_llm")),
                                   attr=m.Name("ainvoke")))):
+        # A lambda: with hedging the same request may have to be sent twice ...
         new_call = cst.parse_expression(
-          f"asyncio.wait_for({cst.Module([]).code_for_node(updated_node.expression)}, timeout=LLM_TIMEOUT_SECONDS)"
+          f"timed_llm_call(self.llm, lambda: {cst.Module([]).code_for_node(updated_node.expression)}, max_timeout=LLM_TIMEOUT_SECONDS)"
         )
         return updated_node.with_changes(expression=new_call)
 
     return updated_node
 
+  # await self.browser_session.get_state_summary(...) between the actions of multi_act => no new capture if nothing changed
+  def leave_Call(self, original_node, updated_node):
+    if (self.function_stack and self.function_stack[-1] == "multi_act" and
+        m.matches(updated_node.func, m.Attribute(value=m.Attribute(value=m.Name("self"), attr=m.Name("browser_session")),
+                                                 attr=m.Name("get_state_summary")))):
+      return updated_node.with_changes(func=updated_node.func.with_changes(attr=cst.Name("get_state_summary_if_changed")))
+
+    # for step in range(max_steps) in run => a resumed agent (browser_use/agent/checkpoint.py) only runs the steps left.
+    # Only the first run() after the restore: read and cleared at once, any other run() gets its max_steps as always ...
+    if (self.function_stack and self.function_stack[-1] == "run" and self.class_stack and self.class_stack[-1] == "Agent"
+        and m.matches(updated_node, m.Call(func=m.Name("range"), args=[m.Arg(value=m.Name("max_steps"))]))):
+      return cst.parse_expression("range(vars(self).pop('resumed_from_step', 0), max_steps)")
+
+    return updated_node
+
   # Solving the problem with the tests ValueError: EventBus with name "Agent" already exists. Please choose a unique name or let it auto-generate.
   def leave_Assign(self, original_node, updated_node):
     # Match: self.eventbus = EventBus(name='Agent', wal_path=wal_path)
@@ -103,33 +163,167 @@ class AgentServiceTransformer(cst.CSTTransformer):
 
     return updated_node
 
+  # Waiting for a challenge being resolved before capturing the state in Agent.step:
+  #   browser_state_summary = await self.browser_session.get_state_summary(...)
+  def leave_SimpleStatementLine(self, original_node, updated_node):
+    if (self.function_stack and self.function_stack[-1] == "step" and self.class_stack and self.class_stack[-1] == "Agent"
+        and m.matches(
+          updated_node,
+          m.SimpleStatementLine(body=[m.Assign(
+            targets=[m.AssignTarget(target=m.Name("browser_state_summary"))],
+            value=m.Await(m.Call(func=m.Attribute(value=m.Attribute(value=m.Name("self"), attr=m.Name("browser_session")),
+                                                  attr=m.Name("get_state_summary")))),
+          )])
+        )):
+      wait_stmt = cst.parse_statement(
+        "# A challenge resolving by itself (browser_use/browser/challenge_watcher.py): no point in capturing and thinking until it's over ...\n"
+        "await self.browser_session.wait_for_challenge_resolution()")
+      performance_step_stmt = cst.parse_statement(
+        "# Browser-side metrics are kept per step (browser_use/browser/perf_metrics.py), numbered as the history item will be:\n"
+        "# StepMetadata.step_number is read after n_steps += 1 ...\n"
+        "self.browser_session.begin_performance_step(self.state.n_steps + 1)")
+      sections_stmt = cst.parse_statement(
+        "# The sections expanded for this task only, in the element list of the prompt (browser_use/dom/budgeted_serializer.py) ...\n"
+        "ExpandedSections.activate(self.controller, (self.task_id, self.task))")
+      self.activated_sections = True
+      # The state may already be there: captured while the previous step was closing (browser_use/browser/speculative_capture.py) ...
+      capture_stmt = cst.parse_statement(
+        cst.Module([]).code_for_node(updated_node).replace(".get_state_summary(", ".get_state_summary_pipelined(", 1))
+      return cst.FlattenSentinel([wait_stmt, performance_step_stmt, sections_stmt, capture_stmt])
+
+    # input_messages = self._message_manager.get_messages() => the older steps of the history compacted to the budget
+    if (self.function_stack and self.function_stack[-1] == "step" and self.class_stack and self.class_stack[-1] == "Agent"
+        and m.matches(
+          updated_node,
+          m.SimpleStatementLine(body=[m.Assign(
+            targets=[m.AssignTarget(target=m.Name("input_messages"))],
+            value=m.Call(func=m.Attribute(value=m.Attribute(value=m.Name("self"), attr=m.Name("_message_manager")),
+                                          attr=m.Name("get_messages"))),
+          )])
+        )):
+      import_stmt = cst.parse_statement("from browser_use.agent.history_compaction import compact_message_history")
+      compact_stmt = cst.parse_statement(
+        "# A bounded history for long runs (browser_use/agent/history_compaction.py): the message manager keeps it whole ...\n"
+        "input_messages = compact_message_history(self, self._message_manager.get_messages(), browser_state_summary)")
+      return cst.FlattenSentinel([import_stmt, compact_stmt])
+
+    # await self.step(step_info) in run => a checkpoint after every step, for resume_stealth_agent
+    if (self.function_stack and self.function_stack[-1] == "run" and self.class_stack and self.class_stack[-1] == "Agent"
+        and m.matches(
+          updated_node,
+          m.SimpleStatementLine(body=[m.Expr(value=m.Await(m.Call(func=m.Attribute(value=m.Name("self"), attr=m.Name("step")))))])
+        )):
+      checkpoint_stmt = cst.parse_statement(
+        "if getattr(self, 'checkpoint', None):\n"
+        "  # A run dying after this step resumes from here (browser_use/agent/checkpoint.py) ...\n"
+        "  await self.checkpoint.save(self)\n")
+      return cst.FlattenSentinel([updated_node, checkpoint_stmt])
+
+    # results.append(result) in multi_act => the next state starts being captured as soon as the last action is done
+    if (self.function_stack and self.function_stack[-1] == "multi_act" and self.class_stack and self.class_stack[-1] == "Agent"
+        and m.matches(updated_node, m.SimpleStatementLine(body=[m.Expr(value=m.Call(
+          func=m.Attribute(value=m.Name("results"), attr=m.Name("append")), args=[m.Arg(value=m.Name("result"))]))]))):
+      start_stmt = cst.parse_statement(
+        "# Pipelined steps (browser_use/browser/speculative_capture.py): no point in capturing after the last one ...\n"
+        "if start_speculative_capture and i == len(actions) - 1 and not result.is_done:\n"
+        "\tawait self.browser_session.start_speculative_state_capture()\n")
+      return cst.FlattenSentinel([updated_node, start_stmt])
+
+    # result: list[ActionResult] = await self.multi_act(model_output.action) => the streamed results, when there are
+    if (self.function_stack and self.function_stack[-1] == "step" and self.class_stack and self.class_stack[-1] == "Agent"
+        and m.matches(
+          updated_node,
+          m.SimpleStatementLine(body=[m.OneOf(m.Assign(value=m.Await(m.Call(func=m.Attribute(attr=m.Name("multi_act"))))),
+                                              m.AnnAssign(value=m.Await(m.Call(func=m.Attribute(attr=m.Name("multi_act"))))))])
+        )):
+      # With streamed outputs the actions may have been executed already ...
+      return cst.parse_statement(
+        cst.Module([]).code_for_node(updated_node).replace("self.multi_act(", "self.act_or_take_streamed_results(", 1))
+
+    return updated_node
+
   def leave_ClassDef(self, original_node, updated_node):
     self.class_stack.pop()
     # Filter for the class named "Agent"
     if original_node.name.value == "Agent":
-      method_node = cst.parse_statement(method_code)  # This gives you a SimpleStatementLine or FunctionDef
+      method_nodes = [cst.parse_statement(code) for code in (method_code, resume_stealth_agent_method_code,
+                                                             act_or_take_streamed_results_method_code)]  # FunctionDefs
       # Insert at the end of the class body
-      new_body = list(updated_node.body.body) + [method_node]
+      new_body = list(updated_node.body.body) + method_nodes
       return updated_node.with_changes(body=updated_node.body.with_changes(body=new_body))
 
     return updated_node
 
 method_code = '''
 @staticmethod
-async def create_stealth_agent(task, llm, headless=False):
+async def create_stealth_agent(task, llm, headless=False, browser_pool=None, request_filter=None, storage_state_cache=None,
+                              watch_challenges=False, sample_performance=False, pipelined_steps=False, stream_actions=False,
+                              history_token_budget=None, checkpoint=None, reuse_unchanged_states=False):
   """I want to bypass entirely the by default initialization method."""
+  from browser_use.agent.heap_profiler import HeapProfiler
+  from browser_use.agent.step_callbacks import chain_step_callbacks
+  from browser_use.controller.service import Controller
+  from browser_use.dom.budgeted_serializer import DOM_TOKEN_BUDGET, register_expand_action
 
-  browser_session = await BrowserSession.create_stealth_browser_session(headless=headless)
+  # With a browser_pool the session goes back to the pool when the agent closes it ...
+  browser_session = await BrowserSession.create_stealth_browser_session(headless=headless, pool=browser_pool,
+                                                                         request_filter=request_filter,
+                                                                         storage_state_cache=storage_state_cache,
+                                                                         watch_challenges=watch_challenges,
+                                                                         sample_performance=sample_performance,
+                                                                         pipelined_steps=pipelined_steps,
+                                                                         reuse_unchanged_states=reuse_unchanged_states)
+  # Opt-in through RE_BROWSER_USE_HEAP_PROFILE_EVERY ...
+  heap_profiler = HeapProfiler.from_environment(browser_session)
+  controller = Controller()
+  if DOM_TOKEN_BUDGET:
+    # The placeholders of the budgeted element list (RE_BROWSER_USE_DOM_TOKEN_BUDGET) point at this action ...
+    register_expand_action(controller)
   agent = Agent(
     task=task,
     llm=llm,
     browser_session=browser_session,
+    controller=controller,
     # I don't want vision or memory ...
     enable_memory=False,
     use_vision=False,
     # I don't want to waste calls to the LLM. I'm using ChatGoogleGenerativeAI ...
-    tool_calling_method='function_calling'
+    tool_calling_method='function_calling',
+    register_new_step_callback=chain_step_callbacks(
+      heap_profiler.on_new_step if heap_profiler else None,
+      # Saving as we go: a challenge solved in this run is reused by the next ones ...
+      storage_state_cache.as_step_callback(browser_session) if storage_state_cache else None,
+    ),
   )
+  if stream_actions:  # Or RE_BROWSER_USE_STREAM_ACTIONS=true for every agent
+    agent.stream_actions = True
+  if history_token_budget:  # Or RE_BROWSER_USE_HISTORY_TOKEN_BUDGET for every agent
+    agent.history_token_budget = history_token_budget
+  if checkpoint:  # Saved after every step: see resume_stealth_agent ...
+    agent.checkpoint = checkpoint
 
   return agent
+'''
+
+resume_stealth_agent_method_code = '''
+@staticmethod
+async def resume_stealth_agent(task, llm, checkpoint, **kwargs):
+  """create_stealth_agent(...) back at the step the checkpoint saved, so run() only does the steps left (or a new agent)."""
+  data = checkpoint.load()
+  if data is not None and data.get('task') != task:
+    logger.warning(f"Agent checkpoint {checkpoint.path} is for another task: starting from scratch ...")
+    data = None
+  agent = await Agent.create_stealth_agent(task, llm, checkpoint=checkpoint, **kwargs)
+  if data is not None:
+    await checkpoint.restore(agent, data)
+  return agent
+'''
+
+act_or_take_streamed_results_method_code = '''
+async def act_or_take_streamed_results(self, actions):
+  """multi_act(actions), unless get_next_action already executed them while streaming (browser_use/agent/streaming_actions.py)."""
+  streamed_results, self.streamed_results = getattr(self, 'streamed_results', None), None
+  if streamed_results is not None:
+    return streamed_results
+  return await self.multi_act(actions)
 '''
\ No newline at end of file
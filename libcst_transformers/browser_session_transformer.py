@@ -15,19 +15,20 @@ class BrowserSessionTransformer(cst.CSTTransformer):
   def visit_FunctionDef(self, node):
     self.function_stack.append(node.name.value)
 
-  # 1. Update typing import: add Optional
+  # 1. Update typing import: add Optional and TYPE_CHECKING
   def leave_ImportFrom(self, original_node, updated_node):
     if (
         updated_node.module.value == "typing" and
         isinstance(updated_node.names, cst.ImportStar) is False
     ):
       names = list(updated_node.names)
-      if not any(n.name.value == 'Optional' for n in names):
-        names.append(cst.ImportAlias(name=cst.Name('Optional')))
+      missing = [name for name in ('Optional', 'TYPE_CHECKING') if not any(n.name.value == name for n in names)]
+      if missing:
+        names.extend(cst.ImportAlias(name=cst.Name(name)) for name in missing)
         return updated_node.with_changes(names=names)
     return updated_node
 
-  # 2. Define types to be Union[Patchright, Playwright]"
+  # 2. Define types to be Union[Patchright, Playwright]" (only for the type checker: no driver imports at runtime)
   def leave_Module(self, original_node, updated_node):
     body = list(updated_node.body)
     insert_idx = None
@@ -63,9 +64,10 @@ class BrowserSessionTransformer(cst.CSTTransformer):
 
     # Prepare new statements
     new_stmts = [
-      cst.parse_statement("from patchright.async_api import Frame as PatchrightFrame"),
-      cst.parse_statement("from playwright.async_api import Frame as PlaywrightFrame"),
-      cst.parse_statement("Frame = PatchrightFrame | PlaywrightFrame"),
+      cst.parse_statement("if TYPE_CHECKING:\n"
+                          "\tfrom patchright.async_api import Frame as PatchrightFrame\n"
+                          "\tfrom playwright.async_api import Frame as PlaywrightFrame\n"
+                          "\tFrame = PatchrightFrame | PlaywrightFrame\n"),
     ]
     # Attach comment to first statement
     new_stmts[0] = new_stmts[0].with_changes(
@@ -79,7 +81,7 @@ class BrowserSessionTransformer(cst.CSTTransformer):
     already_present = False
     for i in range(len(body) - len(new_stmts) + 1):
       if all(
-          isinstance(body[i + j], cst.SimpleStatementLine)
+          isinstance(body[i + j], (cst.SimpleStatementLine, cst.If))
           and str(body[i + j]).strip() == str(new_stmts[j]).strip()
           for j in range(len(new_stmts))
       ):
@@ -141,6 +143,44 @@ class BrowserSessionTransformer(cst.CSTTransformer):
   # 4. Update remove_highlights method signature to accept Optional[Frame]
   def leave_FunctionDef(self, original_node, updated_node):
     self.function_stack.pop()
+    # One XPath -> CSS engine for everybody (browser_use/dom/xpath_css.py): compiled once, cached, same rules as DomUtils.xpath_to_css
+    if updated_node.name.value == "_convert_simple_xpath_to_css_selector":
+      new_body = cst.parse_module(
+        "from browser_use.dom.xpath_css import xpath_to_css\n"
+        "# Not strict: the predicates without a CSS equivalent are dropped, as this method always did ...\n"
+        "return xpath_to_css(xpath, collapse_html_body=False, strict=False)\n"
+      ).body
+      return updated_node.with_changes(body=updated_node.body.with_changes(body=new_body))
+
+    # Elements with coordinates captured inside iframes/closed shadow roots are clicked directly, the locators are the fallback.
+    # Either way the click goes through perform_click: downloads, wait_for_load_state and the allowed_domains check ...
+    if updated_node.name.value == "_click_element_node":
+      body = list(updated_node.body.body)
+      for position, statement in enumerate(body):
+        if not isinstance(statement, cst.Try):
+          continue
+        try_body = list(statement.body.body)
+        perform_click = next((s for s in try_body if m.matches(s, m.FunctionDef(name=m.Name("perform_click")))), None)
+        if perform_click is None:
+          break
+        try_body.remove(perform_click)
+        fast_path_module = cst.parse_module(
+          "# Fast path: page coordinates and frame captured with the element (browser_use/browser/coordinate_actions.py) ...\n"
+          "from browser_use.browser.coordinate_actions import prepare_coordinate_click\n"
+          "coordinate_click = await prepare_coordinate_click(element_node)\n"
+          "if coordinate_click is not None:\n"
+          "\treturn await perform_click(coordinate_click)\n"
+        )
+        fast_path = list(fast_path_module.body)
+        # Comments at the top of a parsed module end up in its header, not in the first statement ...
+        fast_path[0] = fast_path[0].with_changes(
+          leading_lines=[cst.EmptyLine(indent=False)] + list(fast_path_module.header) + list(fast_path[0].leading_lines))
+        try_body[0] = try_body[0].with_changes(leading_lines=[cst.EmptyLine(indent=False)] + list(try_body[0].leading_lines))
+        # perform_click doesn't need the located element (it gets the click function): it's defined first now ...
+        try_body = [perform_click.with_changes(leading_lines=[])] + fast_path + try_body
+        body[position] = statement.with_changes(body=statement.body.with_changes(body=try_body))
+        return updated_node.with_changes(body=updated_node.body.with_changes(body=body))
+
     if (
         updated_node.name.value == "remove_highlights" and
         isinstance(updated_node.params, cst.Parameters)
@@ -156,7 +196,7 @@ class BrowserSessionTransformer(cst.CSTTransformer):
                 value=cst.Name("Optional"),
                 slice=[
                   cst.SubscriptElement(
-                    slice=cst.Index(value=cst.Name("Frame"))
+                    slice=cst.Index(value=cst.SimpleString("'Frame'"))
                   )
                 ]
               )
@@ -205,7 +245,7 @@ class BrowserSessionTransformer(cst.CSTTransformer):
 
     return updated_node
 
-  # 7. Update get_clickable_elements to get_multitarget_clickable_elements and add remove_highlights parameter
+  # 7. Update get_clickable_elements to get_multitarget_clickable_elements and add remove_highlights and wait_for_page_ready parameters
   def leave_Call(self, original_node, updated_node):
     if (
         isinstance(updated_node.func, cst.Attribute) and
@@ -222,6 +262,13 @@ class BrowserSessionTransformer(cst.CSTTransformer):
           value=cst.Attribute(value=cst.Name("self"), attr=cst.Name("remove_highlights")),
         )
       )
+      # Only the stealth sessions wait for the page to settle: the rest keep upstream's fixed sleeps (and only those) ...
+      args.append(
+        cst.Arg(
+          keyword=cst.Name("wait_for_page_ready"),
+          value=cst.parse_expression("self.get_page_ready_waiter()"),
+        )
+      )
       return updated_node.with_changes(func=new_func, args=args)
 
     return updated_node
@@ -229,26 +276,79 @@ class BrowserSessionTransformer(cst.CSTTransformer):
   def leave_ClassDef(self, original_node, updated_node):
     # Filter for the class named "BrowserSession"
     if original_node.name.value == "BrowserSession":
-      method_node = cst.parse_statement(method_code)  # This gives you a SimpleStatementLine or FunctionDef
+      method_nodes = [cst.parse_statement(code) for code in (method_code, get_attached_method_code,
+                                                             wait_for_page_ready_method_code,
+                                                             get_page_ready_waiter_method_code,
+                                                             wait_for_challenge_resolution_method_code,
+                                                             begin_performance_step_method_code,
+                                                             measure_action_method_code,
+                                                             start_speculative_state_capture_method_code,
+                                                             get_state_summary_pipelined_method_code,
+                                                             cache_state_summary_method_code,
+                                                             capture_state_summary_method_code,
+                                                             get_state_summary_if_changed_method_code)]  # A FunctionDef for each
       # Insert at the end of the class body
-      new_body = list(updated_node.body.body) + [method_node]
+      new_body = list(updated_node.body.body) + method_nodes
       return updated_node.with_changes(body=updated_node.body.with_changes(body=new_body))
 
     return updated_node
 
 method_code ='''
 @staticmethod
-async def create_stealth_browser_session(headless=True) -> BrowserSession:
-	# Creating everything clean and pure using patchright and outside the default initialization process  ...
-	patchright = await async_patchright().start()
+async def create_stealth_browser_session(headless=True, pool=None, request_filter=None, storage_state_cache=None,
+                                        watch_challenges=False, sample_performance=False, pipelined_steps=False,
+                                        reuse_unchanged_states=False) -> BrowserSession:
+	from browser_use.browser.challenge_watcher import ChallengeWatcher
+	from browser_use.browser.page_readiness import PageReadinessDetector
+	from browser_use.browser.perf_metrics import PerformanceSampler
+	from browser_use.browser.speculative_capture import SpeculativeCapture
+	from browser_use.dom.change_detector import PageChangeDetector
+
+	# A warm session from a StealthBrowserPool (browser_use/browser/stealth_pool.py) or a context in a SharedStealthBrowser
+	# (browser_use/browser/shared_browser.py) saves the whole cold start below ...
+	browser_session = None
+	if pool:
+		browser_session = await pool.acquire()
+		browser_context = browser_session.browser_context
+	else:
+		# Creating everything clean and pure using patchright and outside the default initialization process  ...
+		patchright = await async_patchright().start()
+
+		# I don't care about what they say about CHROMIUM stealthiness, so far it's been good enough for me ...
+		browser = await patchright.chromium.launch(headless=headless)
+		browser_context = await browser.new_context()
+
+	# Listening to the network from the very beginning: wait_for_page_ready can't miss the requests already in flight ...
+	PageReadinessDetector.attach(browser_context)
+	# Challenge iframes solved/gone: Agent.step waits for them instead of thinking about them (browser_use/browser/challenge_watcher.py) ...
+	if watch_challenges:
+		ChallengeWatcher.attach(browser_context)
+	# Renderer metrics before/after every capture and action (browser_use/browser/perf_metrics.py) ...
+	if sample_performance:
+		PerformanceSampler.attach(browser_context)
+	# The next state captured while the agent closes the current step (browser_use/browser/speculative_capture.py) ...
+	if pipelined_steps:
+		SpeculativeCapture.attach(browser_context)
+	# The last state again between the actions of a step while the page hasn't changed (browser_use/dom/change_detector.py) ...
+	if reuse_unchanged_states:
+		PageChangeDetector.watch(browser_context)
+	# Stealth-safe request filtering (browser_use/browser/request_filter.py): it must be in place before the first navigation ...
+	if request_filter:
+		await request_filter.attach(browser_context)
+	# Cookies (e.g. cf_clearance) and localStorage cached by previous runs (browser_use/browser/storage_state_cache.py), before
+	# the first navigation ...
+	if storage_state_cache:
+		await storage_state_cache.apply(browser_context)
+	if browser_session:
+		return browser_session
 
-	# I don't care about what they say about CHROMIUM stealthiness, so far it's been good enough for me ...
-	browser = await patchright.chromium.launch(headless=headless)
-	browser_context = await browser.new_context()
 	page = await browser_context.new_page()
 	browser_profile = BrowserProfile(
 		channel=BrowserChannel.CHROMIUM,
-		stealth=True
+		stealth=True,
+		# No fixed sleeps before capturing the state, wait_for_page_ready decides when the page has settled ...
+		minimum_wait_page_load_time=0,
+		wait_for_network_idle_page_load_time=0,
 	)
 
 	# Passing all the objects to the session, not to create anything internally ...
@@ -261,4 +361,143 @@ async def create_stealth_browser_session(headless=True) -> BrowserSession:
 	)
 
 	return browser_session
-'''
\ No newline at end of file
+'''
+get_attached_method_code = '''
+def get_attached(self, attachment_cls: Any) -> Optional[Any]:
+	"""The attachment_cls (browser_use/attachments.py) create_stealth_browser_session attached to the context, None otherwise."""
+	return attachment_cls.get(self.browser_context) if self.browser_context else None
+'''
+
+wait_for_page_ready_method_code = '''
+async def wait_for_page_ready(self, timeout: Optional[float] = None) -> bool:
+	"""No pending navigation, network idle and no DOM mutations in any frame (browser_use/browser/page_readiness.py)."""
+	from browser_use.browser.page_readiness import PAGE_READY_TIMEOUT_SECONDS, PageReadinessDetector
+
+	page = await self.get_current_page()
+	detector = PageReadinessDetector.attach(page.context)
+	result = await detector.wait(page, timeout=PAGE_READY_TIMEOUT_SECONDS if timeout is None else timeout)
+
+	return result.ready
+'''
+
+get_page_ready_waiter_method_code = '''
+def get_page_ready_waiter(self) -> Optional[Any]:
+	"""wait_for_page_ready for the contexts create_stealth_browser_session attached a PageReadinessDetector to, None otherwise."""
+	from browser_use.browser.page_readiness import PageReadinessDetector
+
+	return self.wait_for_page_ready if self.get_attached(PageReadinessDetector) else None
+'''
+
+wait_for_challenge_resolution_method_code = '''
+async def wait_for_challenge_resolution(self, timeout: Optional[float] = None) -> bool:
+	"""True if a challenge being resolved (browser_use/browser/challenge_watcher.py) got solved while waiting for it."""
+	from browser_use.browser.challenge_watcher import CHALLENGE_TIMEOUT_SECONDS, ChallengeWatcher
+
+	watcher = self.get_attached(ChallengeWatcher)
+	if watcher is None or not watcher.pending:
+		return False
+	event = await watcher.wait_for_resolution(CHALLENGE_TIMEOUT_SECONDS if timeout is None else timeout)
+
+	return event is not None
+'''
+
+begin_performance_step_method_code = '''
+def begin_performance_step(self, step: int) -> None:
+	from browser_use.browser.perf_metrics import PerformanceSampler
+
+	sampler = self.get_attached(PerformanceSampler)
+	if sampler:
+		sampler.begin_step(step)
+'''
+
+measure_action_method_code = '''
+async def measure_action(self, action: Any, awaitable: Any) -> Any:
+	"""Awaits the action sampling the renderer metrics around it when the session is being sampled."""
+	from browser_use.browser.perf_metrics import sample_performance
+
+	action_name = next(iter(action.model_dump(exclude_unset=True)), 'unknown')
+	page = self.agent_current_page if self.browser_context else None
+	return await sample_performance(page, 'action', action_name, awaitable)
+'''
+
+start_speculative_state_capture_method_code = '''
+async def start_speculative_state_capture(self) -> bool:
+	"""Starts capturing the next state in the background when the session pipelines its steps (browser_use/browser/speculative_capture.py)."""
+	from browser_use.browser.speculative_capture import SpeculativeCapture
+
+	capture = self.get_attached(SpeculativeCapture)
+	if capture is None:
+		return False
+	page = await self.get_current_page()
+
+	async def capture_state():
+		# Leaves the caches get_state_summary updates alone (new element hashes, the last state): a discarded capture
+		# must not be what the next one is compared against, only take() accepting it makes it the last state ...
+		cached_state = self._cached_browser_state_summary
+		state = await self.capture_state_summary(cache_clickable_elements_hashes=False)
+		self._cached_browser_state_summary = cached_state
+		return state
+
+	capture.start(page, True, capture_state)
+
+	return True
+'''
+
+get_state_summary_pipelined_method_code = '''
+async def get_state_summary_pipelined(self, cache_clickable_elements_hashes: bool) -> Any:
+	"""get_state_summary, unless a speculative capture started after the last actions is still good."""
+	from browser_use.browser.speculative_capture import SpeculativeCapture
+
+	capture = self.get_attached(SpeculativeCapture)
+	if capture is not None:
+		state = await capture.take(await self.get_current_page(), cache_clickable_elements_hashes)
+		if state is not None:
+			self.cache_state_summary(state, cache_clickable_elements_hashes)
+			return state
+
+	return await self.capture_state_summary(cache_clickable_elements_hashes=cache_clickable_elements_hashes)
+'''
+
+cache_state_summary_method_code = '''
+def cache_state_summary(self, state: Any, cache_clickable_elements_hashes: bool) -> None:
+	"""What get_state_summary does with the state it captured, for a state captured without it (speculative captures)."""
+	if cache_clickable_elements_hashes:
+		if self._cached_clickable_element_hashes and self._cached_clickable_element_hashes.url == state.url:
+			for dom_element in ClickableElementProcessor.get_clickable_elements(state.element_tree):
+				dom_element.is_new = (
+					ClickableElementProcessor.hash_dom_element(dom_element) not in self._cached_clickable_element_hashes.hashes
+				)
+		self._cached_clickable_element_hashes = CachedClickableElementHashes(
+			url=state.url,
+			hashes=ClickableElementProcessor.get_clickable_elements_hashes(state.element_tree),
+		)
+	self._cached_browser_state_summary = state
+'''
+
+capture_state_summary_method_code = '''
+async def capture_state_summary(self, cache_clickable_elements_hashes: bool) -> Any:
+	"""get_state_summary, keeping the page's fingerprint at the capture (browser_use/dom/change_detector.py) when it's watched."""
+	from browser_use.dom.change_detector import PageChangeDetector
+
+	state = await self.get_state_summary(cache_clickable_elements_hashes=cache_clickable_elements_hashes)
+	page = await self.get_current_page()
+	change_detector = PageChangeDetector.for_page(page)
+	if change_detector:
+		change_detector.mark(page, state)
+
+	return state
+'''
+
+get_state_summary_if_changed_method_code = '''
+async def get_state_summary_if_changed(self, cache_clickable_elements_hashes: bool) -> Any:
+	"""Between the actions of a step: the last captured state while nothing has changed in the page, a new capture otherwise."""
+	from browser_use.dom.change_detector import PageChangeDetector
+
+	page = await self.get_current_page()
+	change_detector = PageChangeDetector.for_page(page)
+	state = await change_detector.unchanged_state(page) if change_detector else None
+	if state is not None:
+		return state
+
+	return await self.capture_state_summary(cache_clickable_elements_hashes=cache_clickable_elements_hashes)
+'''
@@ -49,13 +49,19 @@ class DomServiceTransformer(cst.CSTTransformer):
 
     # Prepare new statements
     new_stmts = [
-      cst.parse_statement("from browser_use.dom.dom_utils import DomUtils, FramesDescriptorDict"),
-      cst.parse_statement("from playwright.async_api import Frame, JSHandle"),
+      cst.parse_statement("from browser_use.dom.dom_utils import DomUtils, FramesDescriptorDict, JS_HANDLE_STATS"),
+      cst.parse_statement("from browser_use.dom.dom_tracing import get_dom_tracer"),
+      cst.parse_statement("from browser_use.dom.cdp_accounting import get_cdp_accountant"),
+      cst.parse_statement("from browser_use.browser.perf_metrics import measure_performance"),
+      cst.parse_statement("from browser_use.browser.coordinate_actions import attach_action_targets, pop_action_rects, with_action_rects"),
+      cst.parse_statement("from browser_use.dom.change_detector import PageChangeDetector"),
+      # Only needed by the annotations: importing the service mustn't load the driver ...
+      cst.parse_statement("if TYPE_CHECKING:\n  from playwright.async_api import Frame, JSHandle\n"),
     ]
     # Check if already present
     for i in range(len(body) - len(new_stmts) + 1):
       if all(
-          isinstance(body[i + j], cst.SimpleStatementLine)
+          isinstance(body[i + j], (cst.SimpleStatementLine, cst.If))
           and str(body[i + j]).strip() == str(new_stmts[j]).strip()
           for j in range(len(new_stmts))
       ):
@@ -103,7 +109,7 @@ class DomServiceTransformer(cst.CSTTransformer):
                 value=cst.Name("Optional"),
                 slice=[
                   cst.SubscriptElement(
-                    slice=cst.Index(value=cst.Name("Frame"))
+                    slice=cst.Index(value=cst.SimpleString("'Frame'"))
                   )
                 ]
               )
@@ -122,7 +128,7 @@ class DomServiceTransformer(cst.CSTTransformer):
                   value=cst.Name("Optional"),
                   slice=[
                     cst.SubscriptElement(
-                      slice=cst.Index(value=cst.Name("JSHandle"))
+                      slice=cst.Index(value=cst.SimpleString("'JSHandle'"))
                     )
                   ]
                 )
@@ -194,18 +200,21 @@ class DomServiceTransformer(cst.CSTTransformer):
           and annassign.value.expression.func.value.attr.value == "page"
           and annassign.value.expression.func.attr.value == "evaluate"
       ):
-        # Build the assignment for target_frame
+        # Build the assignment for target_frame (accounted because buildDomTree.js itself travels with each evaluation ...)
+        target_frame_call = annassign.value.expression.with_changes(
+          func=annassign.value.expression.func.with_changes(
+            value=cst.Name("target_frame")
+          )
+        )
         target_frame_eval = annassign.with_changes(
           value=cst.Await(
-            expression=annassign.value.expression.with_changes(
-              func=annassign.value.expression.func.with_changes(
-                value=cst.Name("target_frame")
-              )
+            expression=cst.parse_expression(
+              f"get_cdp_accountant().track('DomService._build_dom_tree', 'Frame.evaluate', "
+              f"{cst.Module([]).code_for_node(target_frame_call)}, self.js_code)"
             )
           )
         )
-        # Return an If node (not a list)
-        return cst.If(
+        eval_if = cst.If(
           test=cst.Name("target_frame"),
           body=cst.IndentedBlock([
             cst.SimpleStatementLine([target_frame_eval])
@@ -216,15 +225,29 @@ class DomServiceTransformer(cst.CSTTransformer):
             ])
           )
         )
+        change_detector = cst.parse_statement(
+          "# The mutation counter buildDomTree read right before this snapshot (browser_use/dom/change_detector.py) ...\n"
+          "change_detector = PageChangeDetector.for_page(self.page)\n"
+        )
+        record_snapshot = cst.parse_statement(
+          "if change_detector:\n"
+          "  change_detector.record_snapshot(target_frame or self.page.main_frame, eval_page.pop('mutationCounter', None))\n"
+        )
+        action_rects = cst.parse_statement(
+          "# The boxes the same evaluate measured for the coordinate clicks (browser_use/browser/coordinate_actions.py) ...\n"
+          "if 'actionRects' in eval_page:\n"
+          "  self.action_rects.update(pop_action_rects(eval_page))\n"
+        )
+        return cst.FlattenSentinel([eval_if, change_detector, record_snapshot, action_rects])
 
     return updated_node
 
   def leave_ClassDef(self, original_node, updated_node):
     # Filter for the class named "DomService"
     if original_node.name.value == "DomService":
-      method_node = cst.parse_statement(method_code)  # This gives you a SimpleStatementLine or FunctionDef
+      method_nodes = [cst.parse_statement(code) for code in (method_code, private_method_code)]  # This gives you a FunctionDef for each
       # Insert at the end of the class body
-      new_body = list(updated_node.body.body) + [method_node]
+      new_body = list(updated_node.body.body) + method_nodes
       return updated_node.with_changes(body=updated_node.body.with_changes(body=new_body))
 
     return updated_node
@@ -237,16 +260,56 @@ async def get_multitarget_clickable_elements(
   focus_element: int = -1,
   viewport_expansion: int = 0,
   remove_highlights: Optional[Callable[..., Awaitable[None]]] = None,
+  wait_for_page_ready: Optional[Callable[..., Awaitable[bool]]] = None,
 ) -> DOMState:
+  tracer, accountant = get_dom_tracer(), get_cdp_accountant()
+  tracer.begin_step()
+  accountant.begin_step()
+  try:
+    if wait_for_page_ready:
+      # Capturing as soon as the page has settled, not earlier (half-rendered DOM) and not later (fixed sleeps) ...
+      with tracer.span('wait_for_page_ready') as ready_span:
+        ready_span.args['ready'] = await wait_for_page_ready()
+    # Renderer CPU, heap, nodes and layouts spent by the capture itself (only for the sessions being sampled) ...
+    async with measure_performance(self.page, 'capture', 'get_multitarget_clickable_elements'):
+      with tracer.span('get_multitarget_clickable_elements') as capture_span:
+        dom_state = await self._get_multitarget_clickable_elements(highlight_elements, focus_element, viewport_expansion, remove_highlights)
+        capture_span.args['nodes'] = len(dom_state.selector_map)
+  finally:
+    tracer.end_step()
+    accountant.end_step()
+
+  return dom_state
+'''
+
+# Split from get_multitarget_clickable_elements just to keep the tracing boilerplate out of the way ...
+private_method_code = '''
+async def _get_multitarget_clickable_elements(
+  self,
+  highlight_elements: bool,
+  focus_element: int,
+  viewport_expansion: int,
+  remove_highlights: Optional[Callable[..., Awaitable[None]]],
+) -> DOMState:
+  tracer = get_dom_tracer()
   dom_utils = DomUtils()
+  # Highlight index => box, measured by the buildDomTree evaluates themselves for the coordinate click path ...
+  self.action_rects = {}
+  self.js_code = with_action_rects(self.js_code)
+  # get_state_summary_if_changed compares against the counters the buildDomTree evaluates read themselves (opt-in) ...
+  change_detector = PageChangeDetector.for_page(self.page)
+  if change_detector:
+    change_detector.begin_capture()
+    self.js_code = PageChangeDetector.wrap_build_dom_tree(self.js_code)
 
   frames_descriptor_dict:FramesDescriptorDict = await dom_utils.build_frames_descriptor_dict(self.page)
 
   if remove_highlights:
-    tasks = [] # Trying to minimize the ugly visual effect by parallelizing the execution ...
-    for frame in frames_descriptor_dict.keys():
-      tasks.append(remove_highlights(frame))
-    await asyncio.gather(*tasks)
+    with tracer.span('remove_highlights', frames=len(frames_descriptor_dict)):
+      tasks = [] # Trying to minimize the ugly visual effect by parallelizing the execution ...
+      for frame in frames_descriptor_dict.keys():
+        tasks.append(get_cdp_accountant().track('DomService.remove_highlights', 'Frame.evaluate', remove_highlights(frame)))
+      await asyncio.gather(*tasks)
 
   final_dom_element_node, dom_element_node, final_selector_map, highlight_index = None, None, {}, 0
   for frame, closed_shadow_roots in frames_descriptor_dict.items():
@@ -256,53 +319,66 @@ async def get_multitarget_clickable_elements(
       # If there is no iframe_element there is no point in doing anything ...
       # Always evaluating in document.body ...
       self.logger.info(f"Evaluating in frame with url=[{frame.url}] using document.body ...")
-      dom_element_node, selector_map = \
-        await self._build_dom_tree(highlight_elements, focus_element, viewport_expansion, frame, highlight_index)
+      with tracer.span('_build_dom_tree', frame, root='document.body') as span:
+        dom_element_node, selector_map = \
+          await self._build_dom_tree(highlight_elements, focus_element, viewport_expansion, frame, highlight_index)
+        span.args['nodes'] = len(selector_map)
       highlight_index += len(selector_map)
       final_selector_map.update(selector_map)
       if frame == self.page.main_frame:
         final_dom_element_node = dom_element_node
       else:
         assert final_dom_element_node is not None
-        if iframe_element:
-          # Verify if iframe_element has a 'html' child, which in turn has a 'body' child.
-          body = await DomUtils.traverse_and_filter(iframe_element,
-                                                    lambda node: asyncio.sleep(0, result=(node.xpath == "html/body")),
-                                                    just_first_found=True)
-        if body:
-          DomUtils.copy_children(dom_element_node, body[0])
-        else:
-          # We link here the document.body itself ... it's more elegant ;-|
-          dom_element_node.parent = iframe_element
-          iframe_element.children.append(dom_element_node)
+        # Boxes for the coordinate click path: re-resolving these elements later through locators is the slow part ...
+        attach_action_targets(frame, selector_map, self.action_rects)
+        with tracer.span('tree_stitching', frame, target='iframe'):
+          if iframe_element:
+            # Verify if iframe_element has a 'html' child, which in turn has a 'body' child.
+            body = await DomUtils.traverse_and_filter(iframe_element,
+                                                      lambda node: asyncio.sleep(0, result=(node.xpath == "html/body")),
+                                                      just_first_found=True)
+          if body:
+            DomUtils.copy_children(dom_element_node, body[0])
+          else:
+            # We link here the document.body itself ... it's more elegant ;-|
+            dom_element_node.parent = iframe_element
+            iframe_element.children.append(dom_element_node)
 
       # Dealing with closed ShadowRoot objects in the Frame ...
       for closed_shadow_root in closed_shadow_roots:
         self.logger.info(f"Evaluating in frame with url=[{frame.url}] using specific root node {closed_shadow_root.element_handle_to_shadow_root} ...")
-        dom_element_node, selector_map = \
-          await self._build_dom_tree(highlight_elements, focus_element, viewport_expansion, frame, highlight_index,
-                        closed_shadow_root.element_handle_to_shadow_root)
+        with tracer.span('_build_dom_tree', frame, root='closed_shadow_root', xpath=closed_shadow_root.xpath_to_host) as span:
+          dom_element_node, selector_map = \
+            await self._build_dom_tree(highlight_elements, focus_element, viewport_expansion, frame, highlight_index,
+                          closed_shadow_root.element_handle_to_shadow_root)
+          span.args['nodes'] = len(selector_map)
         highlight_index += len(selector_map)
         final_selector_map.update(selector_map)
+        # ... and for the closed ShadowRoot ones it's the really slow part: they can only be reached through their host
+        attach_action_targets(frame, selector_map, self.action_rects, closed_shadow_root.xpath_to_host)
         # Look in 'final_dom_element_node' for the point to link the 'dom_element_node' corresponding to the closed ShadowRoot
         # HERE THE MATCHING IS EASY: LOOK FOR A MATCHING "xpath" IN 'final_dom_element_node' AND ADD TO THE FOUND
         # DOMElementNode THE CHILDREN OF 'dom_element_node'
-        host_elements: list[DOMElementNode] = \
-          await DomUtils.traverse_and_filter(final_dom_element_node,
-                          lambda node, target_xpath: asyncio.sleep(0, result=(node.xpath == target_xpath)),
-                          # This is passed as an argument to the lambda (not needed it's here as an example)
-                          dom_element_node.xpath)
-        if host_elements and len(host_elements) > 1:
-          # If there is more than one matching xpath the Frame must match also ...
-          host_elements = [host for host in host_elements if DomUtils.is_matching_iframe(frame, await DomUtils.find_parent_iframe(host))]
-        assert len(host_elements) == 1, (
-            f"There should be one and only one element matching the xpath [{dom_element_node.xpath}] for the closed shadow root...")
-        host = host_elements[0]
-        host.shadow_root = True
-        DomUtils.copy_children(dom_element_node, host)
+        with tracer.span('tree_stitching', frame, target='closed_shadow_root'):
+          host_elements: list[DOMElementNode] = \
+            await DomUtils.traverse_and_filter(final_dom_element_node,
+                            lambda node, target_xpath: asyncio.sleep(0, result=(node.xpath == target_xpath)),
+                            # This is passed as an argument to the lambda (not needed it's here as an example)
+                            dom_element_node.xpath)
+          if host_elements and len(host_elements) > 1:
+            # If there is more than one matching xpath the Frame must match also ...
+            host_elements = [host for host in host_elements if DomUtils.is_matching_iframe(frame, await DomUtils.find_parent_iframe(host))]
+          assert len(host_elements) == 1, (
+              f"There should be one and only one element matching the xpath [{dom_element_node.xpath}] for the closed shadow root...")
+          host = host_elements[0]
+          host.shadow_root = True
+          DomUtils.copy_children(dom_element_node, host)
         await closed_shadow_root.element_handle_to_shadow_root.dispose()
+        JS_HANDLE_STATS.disposed += 1
 
   # After connecting the different element trees we return the root one ...
   assert final_dom_element_node is not None
+  if change_detector:
+    change_detector.end_capture(final_selector_map)
   return DOMState(element_tree=final_dom_element_node, selector_map=final_selector_map)
 '''
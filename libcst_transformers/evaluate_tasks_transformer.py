@@ -29,6 +29,8 @@ NEW_IMPORTS = [
 ]
 
 HEADLESS_VAR = "HEADLESS_EVALUATION = os.environ.get('HEADLESS_EVALUATION', 'True').lower() == 'true'"
+# Inherited by the task subprocesses: their agent and judge LLMs share the free tier quota through one state file ...
+RATE_LIMIT_VAR = "os.environ.setdefault('RE_BROWSER_USE_LLM_RPM', os.environ.get('EVALUATION_LLM_RPM', '15'))"
 STREAM_READER = '''
 async def _stream_reader(stream, buffer, print_stream):
     """Reads from a stream, buffers the output, and prints it in real-time."""
@@ -54,20 +56,16 @@ class EvaluateTaskTransformer(cst.CSTTransformer):
     self.function_stack.append(node.name.value)
 
   results_async_replacing_code = '''
-# Run all tasks sequentially
+# Run all tasks sequentially, without sleeping between them: the LLMs of every task subprocess share the same rate limiter (see create_llm) ...
 results = []
 TIMEOUT = 120
-for i, task_file in enumerate(TASK_FILES):
+for task_file in TASK_FILES:
     try:
         # Use a semaphore of 1 for sequential execution, with 120s timeout because this gets stuck from time to time and I removed all the internal timeouts
         result = await asyncio.wait_for(run_task_subprocess(task_file, asyncio.Semaphore(1)), TIMEOUT)
         results.append(result)
     except asyncio.TimeoutError:
         results.append({'file': os.path.basename(task_file), 'success': False, 'explanation': f'Task timed out after {TIMEOUT} seconds'})
-    if i != len(TASK_FILES) - 1:
-        SECONDS_BETWEEN_EXECUTIONS = 30 # Again: poor mouse case ...
-        print(f'[MAIN]  Waiting additional [{SECONDS_BETWEEN_EXECUTIONS}] seconds between tasks to avoid 429 errors ...')
-        await asyncio.sleep(30)
 '''
 
   def leave_FunctionDef(self, original_node, updated_node):
@@ -157,8 +155,9 @@ for i, task_file in enumerate(TASK_FILES):
         insert_idx = i + 1
         break
 
-    # 5. Build new nodes for HEADLESS_EVALUATION and _stream_reader
+    # 5. Build new nodes for HEADLESS_EVALUATION, the LLM rate limit and _stream_reader
     headless_node = cst.parse_statement(HEADLESS_VAR)
+    rate_limit_node = cst.parse_statement(RATE_LIMIT_VAR)
     stream_reader_node = cst.parse_statement(STREAM_READER)
 
     # 6. Insert new nodes after TASK_FILES
@@ -167,7 +166,7 @@ for i, task_file in enumerate(TASK_FILES):
           [new_docstring_node]
           + new_import_nodes
           + body[idx:insert_idx]
-          + [headless_node, stream_reader_node]
+          + [headless_node, rate_limit_node, stream_reader_node]
           + body[insert_idx:]
       )
     else:
@@ -175,7 +174,7 @@ for i, task_file in enumerate(TASK_FILES):
       new_body = (
           [new_docstring_node]
           + new_import_nodes
-          + [headless_node, stream_reader_node]
+          + [headless_node, rate_limit_node, stream_reader_node]
           + body[idx:]
       )
 
@@ -2,6 +2,7 @@ import libcst as cst
 from libcst.metadata import MetadataWrapper
 from libcst import Module
 from libcst_transformers.agent_service_transformer import AgentServiceTransformer
+from libcst_transformers.agent_prompts_transformer import AgentPromptsTransformer
 from libcst_transformers.browser_session_transformer import BrowserSessionTransformer
 from libcst_transformers.dom_service_transformer import DomServiceTransformer
 from libcst_transformers.test_controller_transformer import TestControllerTransformer
@@ -40,6 +41,7 @@ def patch_python_file(file_path: str, transformer: cst.CSTTransformer):
 # TODO: MOU14 THESE EXECUTIONS AREN'T IDEMPOTENT FOR THE MOMENT ...
 # Applying all the libcst transformers ...
 patch_python_file("browser_use/agent/service.py", AgentServiceTransformer())
+patch_python_file("browser_use/agent/prompts.py", AgentPromptsTransformer())
 patch_python_file("browser_use/browser/session.py", BrowserSessionTransformer())
 patch_python_file("browser_use/dom/service.py", DomServiceTransformer())
 patch_python_file("tests/ci/test_controller.py", TestControllerTransformer())
@@ -0,0 +1,132 @@
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+
+from typing import Any, Dict, Optional
+
+from browser_use.browser.storage_state_cache import apply_storage_state
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_DIR = os.environ.get('RE_BROWSER_USE_CHECKPOINT_DIR',
+                                os.path.join(os.path.expanduser('~'), '.cache', 're-browser-use', 'checkpoints'))
+CHECKPOINT_VERSION = 1
+BLANK_URL = 'about:blank'
+
+
+class AgentCheckpoint:
+  """
+  The agent as it was after its last complete step, on disk, so a run dying halfway (LLM timeout, the harness TIMEOUT, a
+  crash ...) picks up from there instead of repeating every navigation and challenge:
+    checkpoint = AgentCheckpoint.for_task(task)
+    agent = await Agent.resume_stealth_agent(task, llm, checkpoint=checkpoint)  # A brand new agent the first time
+  Saved after every step: the history (without screenshots), the step counters, the last output and results, upstream's
+  agent history description (what the model reads about the past steps), the files of the agent file system, the URL of
+  every tab and the storage state (cookies, localStorage). It's removed once the task is done.
+  """
+
+  def __init__(self, path: str):
+    self.path = path
+
+  @classmethod
+  def for_task(cls, task: str, checkpoint_dir: str = CHECKPOINT_DIR) -> 'AgentCheckpoint':
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    return cls(os.path.join(checkpoint_dir, hashlib.sha1(task.encode('utf-8')).hexdigest()[:16] + '.json'))
+
+  async def _snapshot(self, agent: Any) -> Dict[str, Any]:
+    state = agent.state
+    history = state.history.model_dump()
+    for item in history['history']:
+      item['state']['screenshot'] = None  # Most of the size and nothing the resumed agent needs ...
+    browser_session = agent.browser_session
+    pages = list(browser_session.browser_context.pages)
+    current_page = browser_session.agent_current_page
+    files_dir = agent.file_system.get_dir()
+    return {
+      'version': CHECKPOINT_VERSION,
+      'saved_at': time.time(),
+      'task': agent.task,
+      'n_steps': state.n_steps,
+      'consecutive_failures': state.consecutive_failures,
+      'history': history,
+      'last_model_output': state.last_model_output.model_dump(mode='json', exclude_unset=True) if state.last_model_output else None,
+      'last_result': [result.model_dump(mode='json') for result in state.last_result or []],
+      'agent_history_description': agent._message_manager.agent_history_description,
+      'files': {path.name: path.read_text(encoding='utf-8') for path in files_dir.iterdir() if path.is_file()},
+      'tabs': [page.url for page in pages],
+      'current_tab': pages.index(current_page) if current_page in pages else 0,
+      'storage_state': await browser_session.browser_context.storage_state(),
+    }
+
+  async def save(self, agent: Any):
+    """After a step: a finished task needs no checkpoint, anything else overwrites the previous one (atomically)."""
+    if agent.state.history.is_done():
+      self.clear()
+      return
+    try:
+      snapshot = await self._snapshot(agent)
+      fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path), suffix='.tmp')
+      try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+          json.dump(snapshot, f, default=str)
+        os.replace(tmp_path, self.path)  # A run killed while writing leaves the previous checkpoint ...
+      except BaseException:
+        with contextlib.suppress(OSError):
+          os.remove(tmp_path)
+        raise
+    except Exception as e:
+      logger.warning(f"Agent checkpoint: couldn't save step {agent.state.n_steps}: {type(e).__name__}: {e}")
+
+  def load(self) -> Optional[Dict[str, Any]]:
+    try:
+      with open(self.path, encoding='utf-8') as f:
+        data = json.load(f)
+    except (OSError, ValueError):
+      return None
+    return data if data.get('version') == CHECKPOINT_VERSION else None
+
+  async def restore(self, agent: Any, data: Dict[str, Any]):
+    """A just created agent (and its session) back to the checkpointed step."""
+    from browser_use.agent.views import ActionResult, AgentHistoryList
+
+    output_model = agent.AgentOutput
+    history = data['history']
+    for item in history['history']:  # As AgentHistoryList.load_from_file: the actions need the agent's output model ...
+      item['model_output'] = output_model.model_validate(item['model_output']) if isinstance(item.get('model_output'), dict) else None
+      item['state'].setdefault('interacted_element', None)
+
+    state = agent.state  # Mutated, not replaced: the message manager holds a reference to part of it ...
+    state.history = AgentHistoryList.model_validate(history)
+    state.n_steps = data['n_steps']
+    agent.resumed_from_step = state.n_steps - 1  # The next run() only does the steps left (and only that one) ...
+    state.consecutive_failures = data['consecutive_failures']
+    state.last_model_output = output_model.model_validate(data['last_model_output']) if data['last_model_output'] else None
+    state.last_result = [ActionResult.model_validate(result) for result in data['last_result']] or None
+    agent._message_manager.agent_history_description = data['agent_history_description']
+    files_dir = agent.file_system.get_dir()
+    for name, content in data['files'].items():
+      (files_dir / name).write_text(content, encoding='utf-8')
+
+    browser_session = agent.browser_session
+    await apply_storage_state(browser_session.browser_context, data['storage_state'])
+    for position, url in enumerate(data['tabs']):
+      url = None if url == BLANK_URL else url
+      try:
+        if position == 0:
+          if url:
+            await browser_session.navigate(url)
+        else:
+          await browser_session.create_new_tab(url)
+      except Exception as e:  # The agent sees the tab as it is and deals with it ...
+        logger.warning(f"Agent checkpoint: couldn't reopen {url}: {type(e).__name__}: {e}")
+    with contextlib.suppress(Exception):
+      await browser_session.switch_to_tab(data['current_tab'])
+    logger.info(f"Agent checkpoint: resuming at step {state.n_steps} with {len(data['tabs'])} tabs ...")
+
+  def clear(self):
+    with contextlib.suppress(OSError):
+      os.remove(self.path)
@@ -0,0 +1,156 @@
+import gc
+import json
+import logging
+import os
+import tracemalloc
+
+from dataclasses import dataclass, field, asdict
+from typing import Any, Dict, List, Optional
+
+from browser_use.dom.dom_utils import JS_HANDLE_STATS
+from browser_use.dom.views import DOMElementNode, DOMState, DOMTextNode
+
+logger = logging.getLogger(__name__)
+
+# RE_BROWSER_USE_HEAP_PROFILE_EVERY=N turns the profiler on for the stealth agents (a report every N steps) and
+# RE_BROWSER_USE_HEAP_PROFILE_REPORT=<path> appends the reports to a JSON lines file ...
+HEAP_PROFILE_EVERY_ENV_VAR = 'RE_BROWSER_USE_HEAP_PROFILE_EVERY'
+HEAP_PROFILE_REPORT_ENV_VAR = 'RE_BROWSER_USE_HEAP_PROFILE_REPORT'
+
+# Python objects whose live count is worth following: DomUtils.copy_children creates parent <-> child cycles that only gc can free
+TRACKED_TYPES = (DOMElementNode, DOMTextNode, DOMState)
+
+
+@dataclass
+class HeapReport:
+  step: int
+  python_current_kb: float
+  python_peak_kb: float
+  top_growth: List[str] = field(default_factory=list)  # Allocation sites that grew the most since the previous report
+  live_objects: Dict[str, int] = field(default_factory=dict)
+  unreachable_cycles: int = 0  # Objects that only the cycle collector could free
+  js_handles_live: int = 0
+  browser: Dict[str, float] = field(default_factory=dict)  # CDP Performance.getMetrics + Memory.getDOMCounters
+
+
+class HeapProfiler:
+  """
+  Opt-in profiler following the memory growth of long agent runs, in Python (tracemalloc) and in the renderer (CDP metrics).
+  It's meant to be used as the agent's 'register_new_step_callback':
+    profiler = HeapProfiler(browser_session, every_n_steps=5)
+    agent = Agent(..., register_new_step_callback=profiler.on_new_step)
+  """
+
+  def __init__(self, browser_session: Any, every_n_steps: int = 5, top: int = 10, report_path: Optional[str] = None,
+               traceback_frames: int = 5):
+    self.browser_session = browser_session
+    self.every_n_steps = max(1, every_n_steps)
+    self.top = top
+    self.report_path = report_path
+    self.traceback_frames = traceback_frames
+    self.reports: List[HeapReport] = []
+    self._previous_snapshot: Optional[tracemalloc.Snapshot] = None
+    self._started_tracing = False  # tracemalloc is stopped by stop() only if it wasn't already tracing (pytest, the app ...)
+
+  @staticmethod
+  def from_environment(browser_session: Any) -> Optional['HeapProfiler']:
+    every = os.environ.get(HEAP_PROFILE_EVERY_ENV_VAR)
+    if not every:
+      return None
+    return HeapProfiler(browser_session, every_n_steps=int(every), report_path=os.environ.get(HEAP_PROFILE_REPORT_ENV_VAR))
+
+  def start(self):
+    if not tracemalloc.is_tracing():
+      tracemalloc.start(self.traceback_frames)
+      self._started_tracing = True
+    self._previous_snapshot = self._take_snapshot()
+
+  def _take_snapshot(self) -> tracemalloc.Snapshot:
+    # The profiler's own allocations are noise ...
+    return tracemalloc.take_snapshot().filter_traces([
+      tracemalloc.Filter(False, tracemalloc.__file__),
+      tracemalloc.Filter(False, __file__),
+    ])
+
+  async def on_new_step(self, browser_state_summary: Any, model_output: Any, n_steps: int):
+    if self._previous_snapshot is None:
+      self.start()
+    if n_steps % self.every_n_steps == 0:
+      await self.report(n_steps)
+
+  async def report(self, step: int) -> HeapReport:
+    if self._previous_snapshot is None:
+      self.start()
+
+    unreachable = gc.collect()
+    snapshot = self._take_snapshot()
+    top_growth = [
+      f"{stat.size_diff / 1024:+.1f} KiB ({stat.count_diff:+d} blocks) {stat.traceback.format()[-1].strip() if stat.traceback else ''}"
+      for stat in snapshot.compare_to(self._previous_snapshot, 'lineno')[:self.top]
+      if stat.size_diff > 0
+    ]
+    self._previous_snapshot = snapshot
+    current, peak = tracemalloc.get_traced_memory()
+
+    heap_report = HeapReport(
+      step=step,
+      python_current_kb=round(current / 1024, 1),
+      python_peak_kb=round(peak / 1024, 1),
+      top_growth=top_growth,
+      live_objects=self._count_live_objects(),
+      unreachable_cycles=unreachable,
+      js_handles_live=JS_HANDLE_STATS.live,
+      browser=await self._browser_metrics(),
+    )
+    self.reports.append(heap_report)
+    self._log(heap_report)
+
+    return heap_report
+
+  @staticmethod
+  def _count_live_objects() -> Dict[str, int]:
+    counts = {tracked_type.__name__: 0 for tracked_type in TRACKED_TYPES}
+    for obj in gc.get_objects():
+      if isinstance(obj, TRACKED_TYPES):
+        counts[type(obj).__name__] += 1
+    return counts
+
+  async def _browser_metrics(self) -> Dict[str, float]:
+    try:
+      page = await self.browser_session.get_current_page()
+      cdp_session = await page.context.new_cdp_session(page)
+    except Exception as e:
+      logger.debug(f"Heap profiler couldn't open a CDP session: {type(e).__name__}: {e}")
+      return {}
+
+    metrics: Dict[str, float] = {}
+    try:
+      await cdp_session.send('Performance.enable')
+      for metric in (await cdp_session.send('Performance.getMetrics'))['metrics']:
+        if metric['name'] in ('JSHeapUsedSize', 'JSHeapTotalSize', 'Nodes', 'Documents', 'Frames', 'JSEventListeners', 'LayoutObjects'):
+          metrics[metric['name']] = metric['value']
+      dom_counters = await cdp_session.send('Memory.getDOMCounters')
+      metrics.update({f"dom_{name}": value for name, value in dom_counters.items()})
+    except Exception as e:
+      logger.debug(f"Heap profiler couldn't read the browser metrics: {type(e).__name__}: {e}")
+    finally:
+      await cdp_session.detach()
+
+    return metrics
+
+  def _log(self, heap_report: HeapReport):
+    logger.info(f"🧠 Heap profile at step {heap_report.step}: python={heap_report.python_current_kb} KiB "
+                f"(peak {heap_report.python_peak_kb} KiB), live JSHandles={heap_report.js_handles_live}, "
+                f"objects={heap_report.live_objects}, browser={heap_report.browser}")
+    for line in heap_report.top_growth:
+      logger.info(f"    {line}")
+
+    if self.report_path:
+      with open(self.report_path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(asdict(heap_report)) + '\n')
+
+  def stop(self):
+    self._previous_snapshot = None
+    if self._started_tracing:
+      self._started_tracing = False
+      tracemalloc.stop()
@@ -0,0 +1,159 @@
+import logging
+import os
+import re
+
+from typing import Any, Dict, List, Optional, Tuple
+
+from browser_use.attachments import Attachment
+from browser_use.dom.budgeted_serializer import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+HISTORY_TOKEN_BUDGET = int(os.environ.get('RE_BROWSER_USE_HISTORY_TOKEN_BUDGET', '0'))  # 0: the upstream history, untouched
+KEEP_RECENT_STEPS = 3  # In full, as upstream writes them ...
+MAX_GOAL_LENGTH, MAX_RESPONSE_LENGTH = 120, 100
+HISTORY_START, HISTORY_END = '<agent_history>\n', '\n</agent_history>'
+STEP_HEADER = re.compile(r'^## Step ', re.MULTILINE)
+KEPT_LINE_PREFIXES = ('User updated USER REQUEST',)  # Never compacted away: the task itself changed
+
+_Section = Tuple[Optional[int], str]  # (step number, text)
+
+
+def _cap(text: str, length: int) -> str:
+  text = ' '.join(text.split())
+  return text if len(text) <= length else text[:length] + '...'
+
+
+def _step_number(section: str) -> Optional[int]:
+  match = re.match(r'## Step (\d+)', section)
+  return int(match.group(1)) if match else None
+
+
+def _kept_lines(section: str) -> List[str]:
+  return [line.strip() for line in section.splitlines() if line.strip().startswith(KEPT_LINE_PREFIXES)]
+
+
+def _digest(section: str) -> str:
+  """A whole '## Step N' section of upstream's agent history as a single line: the goal and what the actions answered."""
+  header, goal, responses = section.splitlines()[0].lstrip('# ').strip(), '', []
+  for line in section.splitlines()[1:]:
+    line = line.strip()
+    if line.startswith('Step goal:'):
+      goal = _cap(line[len('Step goal:'):], MAX_GOAL_LENGTH)
+    elif re.match(r'Action \d+/\d+ response:', line):
+      responses.append(_cap(line.split(':', 1)[1], MAX_RESPONSE_LENGTH))
+    elif line and not line.startswith(('Step evaluation:', 'Step memory:') + KEPT_LINE_PREFIXES) and not goal:
+      goal = _cap(line, MAX_GOAL_LENGTH)  # 'No model output (parsing failed)' ...
+  return f"{header}: {goal or '-'} => {'; '.join(responses) or '-'}"
+
+
+class HistoryCompactor(Attachment):
+  """
+  Bounded agent history for long runs (memory is off in create_stealth_agent, so upstream's <agent_history> grows with
+  every step and is sent again in every state message):
+    compact_message_history(agent, messages, browser_state_summary)  # instead of the messages themselves
+  The last KEEP_RECENT_STEPS steps stay in full, the older ones become one line each (with the page only when it changed:
+  the older browser states are kept as deltas), and the oldest lines are dropped when even that doesn't fit the budget.
+  It's deterministic: the same history (and pages) always compacts into the same text, so a replayed run sends the same
+  prompts (and hits the LLM cache). Only the messages sent are compacted: the message manager keeps the whole history.
+  """
+  def __init__(self):
+    self.tokens_before = self.tokens_after = 0
+    self.full = self.compacted = self.dropped = 0
+    self._parsed = ''  # Upstream only appends to the history: the part already split in _sections ...
+    self._sections: List[_Section] = []
+    self._digests: Dict[str, str] = {}
+    self._pages: Dict[int, str] = {}  # Step number => URL the agent was at when its section showed up
+
+  def _split(self, history: str) -> Tuple[str, List[_Section]]:
+    if not history.startswith(self._parsed):
+      self._parsed, self._sections = '', []  # A new task / restored state: from scratch ...
+    starts = [match.start() for match in STEP_HEADER.finditer(history)]
+    preamble = history[:starts[0]] if starts else history
+    # The last section can still grow (add_new_task appends to it): it's always split again ...
+    complete = len(self._sections) - 1 if self._sections else 0
+    sections = self._sections[:max(complete, 0)]
+    for start, end in zip(starts[len(sections):], starts[len(sections) + 1:] + [len(history)]):
+      text = history[start:end].strip('\n')
+      sections.append((_step_number(text), text))
+    self._parsed, self._sections = history, sections
+    return preamble.strip('\n'), sections
+
+  def _digest_line(self, step: Optional[int], text: str, previous_page: Optional[str]) -> Tuple[str, Optional[str]]:
+    digest = self._digests.get(text)
+    if digest is None:
+      digest = self._digests[text] = _digest(text)
+    page = self._pages.get(step) if step is not None else None
+    if page and page != previous_page:
+      return f"{digest} [at {_cap(page, MAX_RESPONSE_LENGTH)}]", page
+    return digest, previous_page
+
+  @staticmethod
+  def _render(head: List[str], lines: List[Tuple[str, List[str]]], dropped: int, tail: List[str]) -> str:
+    rendered = list(head)
+    if dropped:
+      rendered.append(f"[{dropped} earlier steps compacted away]")
+      rendered.extend(kept for _, kept_lines in lines[:dropped] for kept in kept_lines)
+    for line, kept_lines in lines[dropped:]:
+      rendered.append(line)
+      rendered.extend(kept_lines)
+    return '\n'.join(rendered + tail)
+
+  def compact_history(self, history: str, url: Optional[str], token_budget: int) -> str:
+    preamble, sections = self._split(history)
+    if sections and sections[-1][0] is not None and url:
+      self._pages.setdefault(sections[-1][0], url)  # Written by this step's add_state_message: the page after its actions
+
+    head = [preamble] if preamble else []
+    keep = min(KEEP_RECENT_STEPS, len(sections))
+    while True:
+      older, recent = sections[:len(sections) - keep], sections[len(sections) - keep:]
+      lines, previous_page = [], None
+      for step, text in older:
+        line, previous_page = self._digest_line(step, text, previous_page)
+        lines.append((line, _kept_lines(text)))
+      tail = [text for _, text in recent]
+      dropped = 0
+      compacted = self._render(head, lines, dropped, tail)
+      while dropped < len(lines) and estimate_tokens(compacted) > token_budget:
+        dropped += 1
+        compacted = self._render(head, lines, dropped, tail)
+      if estimate_tokens(compacted) <= token_budget or keep <= 1:
+        break
+      keep -= 1  # Even without the one liners it doesn't fit: fewer steps in full ...
+
+    self.full, self.compacted, self.dropped = len(recent), len(older) - dropped, dropped
+    self.tokens_before, self.tokens_after = estimate_tokens(history), estimate_tokens(compacted)
+    return compacted
+
+  def compact(self, messages: List[Any], url: Optional[str], token_budget: int) -> List[Any]:
+    # The state message is the last one with the history (a plan or the last step warning may come after it) ...
+    for position in range(len(messages) - 1, -1, -1):
+      content = getattr(messages[position], 'content', None)
+      if isinstance(content, str) and HISTORY_START in content:
+        break
+    else:
+      return messages
+    start = content.index(HISTORY_START) + len(HISTORY_START)
+    end = content.find(HISTORY_END, start)
+    if end < 0:
+      return messages
+
+    history = self.compact_history(content[start:end], url, token_budget)
+    if self.tokens_after < self.tokens_before:
+      logger.debug(f"History compacted: {self.tokens_before} => {self.tokens_after} tokens ({self.stats()}) ...")
+    message = messages[position].model_copy(update={'content': content[:start] + history + content[end:]})
+    return messages[:position] + [message] + messages[position + 1:]
+
+  def stats(self) -> Dict[str, int]:
+    return {'full': self.full, 'compacted': self.compacted, 'dropped': self.dropped,
+            'tokens_before': self.tokens_before, 'tokens_after': self.tokens_after}
+
+
+def compact_message_history(agent: Any, messages: List[Any], browser_state_summary: Any = None) -> List[Any]:
+  """The messages of Agent.step with the history within the agent's budget (or RE_BROWSER_USE_HISTORY_TOKEN_BUDGET)."""
+  token_budget = getattr(agent, 'history_token_budget', None) or HISTORY_TOKEN_BUDGET
+  if not token_budget:
+    return messages
+  url = getattr(browser_state_summary, 'url', None)
+  return HistoryCompactor.attach(agent).compact(messages, url, token_budget)
@@ -0,0 +1,157 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import time
+
+from contextlib import closing
+from typing import Any, Dict, Optional, Sequence
+
+from langchain_core.caches import BaseCache
+from langchain_core.load import dumps, loads
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL_SECONDS = 7 * 24 * 60 * 60
+DEFAULT_MAX_ENTRIES = 10_000
+
+# Things that change between two otherwise identical prompts without changing what is asked ...
+_VOLATILE_KEYS = frozenset({'id', 'run_id', 'response_metadata', 'usage_metadata'})
+# ... and inside the text: AgentMessagePrompt puts the clock in every state message, a replayed task never asks the same twice
+_VOLATILE_TEXT = re.compile(r'(Current date and time: )\d{4}-\d{2}-\d{2} \d{2}:\d{2}')
+
+
+def _is_volatile(key: str, value: Any) -> bool:
+  # A list 'id' is langchain's serialized class path (['langchain', 'schema', 'messages', 'HumanMessage']): that one stays ...
+  return key in _VOLATILE_KEYS and not (key == 'id' and isinstance(value, list))
+
+
+def _normalize(value: Any) -> Any:
+  if isinstance(value, dict):
+    return {key: _normalize(item) for key, item in sorted(value.items()) if not _is_volatile(key, item)}
+  if isinstance(value, list):
+    return [_normalize(item) for item in value]
+  if isinstance(value, str):
+    return _VOLATILE_TEXT.sub(r'\1<now>', value.strip())
+  return value
+
+
+def _canonical(serialized: str) -> str:
+  try:
+    return json.dumps(_normalize(json.loads(serialized)), sort_keys=True, separators=(',', ':'))
+  except ValueError:
+    return serialized
+
+
+def cache_key(prompt: str, llm_string: str) -> str:
+  """
+  sha256 of the normalized messages (langchain's serialized prompt) and of the normalized llm_string (model name, parameters
+  and the bound tools/structured output schema).
+  """
+  return hashlib.sha256(f"{_canonical(llm_string)}\n{_canonical(prompt)}".encode('utf-8')).hexdigest()
+
+
+class SQLiteLLMCache(BaseCache):
+  """
+  On-disk cache of chat model answers (langchain's 'cache' of the models):
+    cache = SQLiteLLMCache('llm_cache.sqlite3')
+    llm = ChatGoogleGenerativeAI(model=..., cache=cache)
+  Eviction policy:
+    - An entry expires 'ttl_seconds' after it was written. Reading it doesn't extend it. Expired entries are misses and are
+      deleted when they are found and on every write.
+    - Above 'max_entries' the least recently read (or written) entries are deleted first.
+  A hit returns the stored answer without calling the model: only cache calls where the same input must give the same
+  output (replayed test tasks, retries, idempotent extraction/classification sub-calls) ...
+  """
+
+  def __init__(self, path: str, ttl_seconds: Optional[float] = DEFAULT_TTL_SECONDS, max_entries: Optional[int] = DEFAULT_MAX_ENTRIES):
+    self.path = path
+    self.ttl_seconds = ttl_seconds
+    self.max_entries = max_entries
+    self.hits = self.misses = self.writes = self.evictions = 0
+    if os.path.dirname(path):
+      os.makedirs(os.path.dirname(path), exist_ok=True)
+    with closing(self._connect()) as connection, connection:
+      connection.execute('PRAGMA journal_mode=WAL')  # Several evaluation subprocesses read and write the same file ...
+      connection.execute(
+        'CREATE TABLE IF NOT EXISTS llm_cache ('
+        'key TEXT PRIMARY KEY, llm_string TEXT, generations TEXT, created_at REAL, last_used_at REAL)')
+      connection.execute('CREATE INDEX IF NOT EXISTS llm_cache_last_used_at ON llm_cache (last_used_at)')
+
+  @classmethod
+  def from_environment(cls) -> Optional['SQLiteLLMCache']:
+    """RE_BROWSER_USE_LLM_CACHE (the database path) / RE_BROWSER_USE_LLM_CACHE_TTL / RE_BROWSER_USE_LLM_CACHE_MAX_ENTRIES."""
+    path = os.environ.get('RE_BROWSER_USE_LLM_CACHE')
+    if not path:
+      return None
+    return cls(
+      path,
+      ttl_seconds=float(os.environ.get('RE_BROWSER_USE_LLM_CACHE_TTL', DEFAULT_TTL_SECONDS)),
+      max_entries=int(os.environ.get('RE_BROWSER_USE_LLM_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES)),
+    )
+
+  def _connect(self) -> sqlite3.Connection:
+    # A connection per operation: langchain calls the sync methods from executor threads ...
+    return sqlite3.connect(self.path, timeout=30)
+
+  def _expired(self, created_at: float, now: float) -> bool:
+    return self.ttl_seconds is not None and now - created_at > self.ttl_seconds
+
+  def lookup(self, prompt: str, llm_string: str) -> Optional[Sequence[Any]]:
+    key, now = cache_key(prompt, llm_string), time.time()
+    with closing(self._connect()) as connection, connection:
+      row = connection.execute('SELECT generations, created_at FROM llm_cache WHERE key = ?', (key,)).fetchone()
+      if row is not None and self._expired(row[1], now):
+        connection.execute('DELETE FROM llm_cache WHERE key = ?', (key,))
+        self.evictions += 1
+        row = None
+      if row is None:
+        self.misses += 1
+        return None
+      connection.execute('UPDATE llm_cache SET last_used_at = ? WHERE key = ?', (now, key))
+
+    try:
+      generations = [loads(generation) for generation in json.loads(row[0])]
+    except Exception as e:  # Written by another langchain version ... a miss, it'll get overwritten
+      logger.debug(f"LLM cache: unreadable entry {key[:12]}: {type(e).__name__}: {e}")
+      self.misses += 1
+      return None
+    for generation in generations:
+      # Nothing was spent on a hit: the rate limiters and the token counters mustn't charge it again ...
+      if getattr(getattr(generation, 'message', None), 'usage_metadata', None):
+        generation.message.usage_metadata = None
+    self.hits += 1
+    return generations
+
+  def update(self, prompt: str, llm_string: str, return_val: Sequence[Any]):
+    key, now = cache_key(prompt, llm_string), time.time()
+    generations = json.dumps([dumps(generation) for generation in return_val])
+    with closing(self._connect()) as connection, connection:
+      connection.execute(
+        'INSERT OR REPLACE INTO llm_cache (key, llm_string, generations, created_at, last_used_at) VALUES (?, ?, ?, ?, ?)',
+        (key, llm_string, generations, now, now))
+      self.writes += 1
+      self._evict(connection, now)
+
+  def _evict(self, connection: sqlite3.Connection, now: float):
+    if self.ttl_seconds is not None:
+      self.evictions += connection.execute('DELETE FROM llm_cache WHERE created_at < ?', (now - self.ttl_seconds,)).rowcount
+    if self.max_entries is not None:
+      self.evictions += connection.execute(
+        'DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache ORDER BY last_used_at DESC LIMIT -1 OFFSET ?)',
+        (self.max_entries,)).rowcount
+
+  def clear(self, **kwargs: Any):
+    with closing(self._connect()) as connection, connection:
+      connection.execute('DELETE FROM llm_cache')
+
+  def stats(self) -> Dict[str, Any]:
+    lookups = self.hits + self.misses
+    with closing(self._connect()) as connection:
+      entries = connection.execute('SELECT COUNT(*) FROM llm_cache').fetchone()[0]
+    return {
+      'hits': self.hits, 'misses': self.misses, 'hit_rate': round(self.hits / lookups, 3) if lookups else None,
+      'writes': self.writes, 'evictions': self.evictions, 'entries': entries,
+    }
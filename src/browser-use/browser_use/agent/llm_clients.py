@@ -0,0 +1,125 @@
+import asyncio
+import logging
+import os
+import weakref
+
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+LLM_POOL_SIZE = int(os.environ.get('RE_BROWSER_USE_LLM_POOL_SIZE', '20'))  # Connections per provider endpoint
+# httpx forgets an idle connection after 5s, less than a step usually takes: every call would pay a new TLS handshake ...
+LLM_KEEPALIVE_SECONDS = float(os.environ.get('RE_BROWSER_USE_LLM_KEEPALIVE', '60'))
+
+_Key = Tuple[Hashable, ...]
+
+
+def _option_key(value: Any) -> Hashable:
+  # Rate limiters, caches, callbacks ...: the same object, not an equal one
+  try:
+    hash(value)
+  except TypeError:
+    return ('id', id(value))
+  return value if isinstance(value, (str, int, float, bool, type(None))) else ('id', id(value))
+
+
+class LLMClientRegistry:
+  """
+  One chat model per provider, model and options for all the agents of an event loop, and one pooled HTTP client per
+  provider endpoint, so they share connections instead of each opening (and handshaking) its own:
+    llm = get_llm_registry().get_llm(ChatGoogleGenerativeAI, 'gemini-2.5-flash', factory=lambda: ...)
+  Models taking httpx clients (ChatOpenAI and its relatives) get a shared pair with RE_BROWSER_USE_LLM_POOL_SIZE
+  connections kept alive RE_BROWSER_USE_LLM_KEEPALIVE seconds. The connection pooling doesn't apply to
+  ChatGoogleGenerativeAI, the model create_stealth_agent is used with: it talks gRPC through a channel (one HTTP/2
+  connection multiplexing every call) the model builds for itself, so all it gets is the model sharing: agents asking for
+  the same model and options share its channel, different models or options open their own.
+  Async clients belong to the event loop they were created in: every loop gets its own models and clients, and a model
+  asked for outside any loop (e.g. in a sync fixture) is a new one every time, with its own clients: nobody knows which
+  loop it'll end up in.
+  """
+
+  def __init__(self, pool_size: int = LLM_POOL_SIZE, keepalive_seconds: float = LLM_KEEPALIVE_SECONDS):
+    self.pool_size = pool_size
+    self.keepalive_seconds = keepalive_seconds
+    self.created = self.shared = 0
+    self._scopes: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, Dict[_Key, Any]]]' = weakref.WeakKeyDictionary()
+
+  def _scope(self) -> Optional[Dict[str, Dict[_Key, Any]]]:
+    try:
+      loop = asyncio.get_running_loop()
+    except RuntimeError:
+      return None  # Outside any loop: the async clients would bind to whichever loop uses them first ...
+    scope = self._scopes.get(loop)
+    if scope is None:
+      scope = self._scopes[loop] = {}
+    return scope
+
+  def _http_clients(self, scope: Dict[str, Dict[_Key, Any]], base_url: Optional[str]) -> Tuple[Any, Any]:
+    import httpx
+
+    clients = scope.setdefault('http_clients', {})
+    pair = clients.get((base_url,))
+    if pair is None:
+      limits = httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size,
+                            keepalive_expiry=self.keepalive_seconds)
+      pair = clients[(base_url,)] = (httpx.Client(limits=limits), httpx.AsyncClient(limits=limits))
+    return pair
+
+  def pooled_options(self, llm_class: Any, options: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    The options with the shared HTTP clients, when the model takes them and doesn't bring its own (and there's a loop).
+    Models without an 'http_async_client' field (ChatGoogleGenerativeAI's gRPC transport) get their options untouched.
+    """
+    scope = self._scope()
+    fields = getattr(llm_class, 'model_fields', {})
+    if (scope is None or 'http_async_client' not in fields or options.get('http_client') or options.get('http_async_client')
+        or options.get('openai_proxy')):
+      return options
+    http_client, http_async_client = self._http_clients(scope, options.get('base_url') or options.get('openai_api_base'))
+    return {**options, 'http_client': http_client, 'http_async_client': http_async_client}
+
+  def get_llm(self, llm_class: Any, model: str, factory: Optional[Callable[..., Any]] = None, **options) -> Any:
+    """
+    The model already created for this class, model name and options, or a new one: factory(**options) with the pooled
+    clients, llm_class(model=model, **options) without a factory. Options are compared by identity unless they're scalars.
+    """
+    scope = self._scope()
+    if scope is None:
+      self.created += 1
+      logger.debug(f"LLM client created outside an event loop, not shared: {llm_class.__name__} [{model}] ...")
+      return factory(**options) if factory else llm_class(model=model, **options)
+
+    key = (llm_class.__module__, llm_class.__qualname__, model) + tuple(
+      (name, _option_key(value)) for name, value in sorted(options.items()))
+    llms = scope.setdefault('llms', {})
+    llm = llms.get(key)
+    if llm is not None:
+      self.shared += 1
+      return llm
+
+    options = self.pooled_options(llm_class, options)
+    llm = llms[key] = factory(**options) if factory else llm_class(model=model, **options)
+    self.created += 1
+    logger.debug(f"Shared LLM client created: {llm_class.__name__} [{model}] ...")
+    return llm
+
+  async def aclose(self):
+    """Closes the HTTP clients of the running loop: the models created with them are forgotten too."""
+    scope = self._scope() or {}
+    for http_client, http_async_client in scope.pop('http_clients', {}).values():
+      http_client.close()
+      await http_async_client.aclose()
+    scope.pop('llms', None)
+
+  def stats(self) -> Dict[str, int]:
+    return {'created': self.created, 'shared': self.shared}
+
+
+_registry: Optional[LLMClientRegistry] = None
+
+
+def get_llm_registry() -> LLMClientRegistry:
+  global _registry
+  if _registry is None:
+    _registry = LLMClientRegistry()
+  return _registry
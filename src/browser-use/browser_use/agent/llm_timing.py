@@ -0,0 +1,108 @@
+import asyncio
+import logging
+import os
+import statistics
+
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+LATENCY_WINDOW = int(os.environ.get('RE_BROWSER_USE_LLM_LATENCY_WINDOW', '50'))
+MIN_SAMPLES = 5  # Below this the default timeout is used and there is no hedging
+MIN_TIMEOUT_SECONDS = 5.0
+HEDGING_ENABLED = os.environ.get('RE_BROWSER_USE_LLM_HEDGING', 'False').lower() == 'true'
+
+
+class ModelLatency:
+  """Rolling window of the latencies of one model: the timeouts and the hedging delay come out of it."""
+
+  def __init__(self, window: int = LATENCY_WINDOW):
+    self.latencies: Deque[float] = deque(maxlen=window)
+    self.calls = self.timeouts = self.hedged = self.hedge_wins = 0
+
+  def percentile(self, p: int) -> Optional[float]:
+    if len(self.latencies) < MIN_SAMPLES:
+      return None
+    return statistics.quantiles(self.latencies, n=100, method='inclusive')[p - 1]
+
+  def timeout(self, max_timeout: float) -> float:
+    # Generous over the tail (a slow answer is better than a failed step), never over the configured maximum ...
+    p50, p99 = self.percentile(50), self.percentile(99)
+    if p50 is None or p99 is None:
+      return max_timeout
+    return min(max_timeout, max(MIN_TIMEOUT_SECONDS, 2 * p99, 4 * p50))
+
+  def hedge_delay(self) -> Optional[float]:
+    return self.percentile(95)
+
+  def stats(self) -> Dict[str, Any]:
+    return {
+      'calls': self.calls, 'timeouts': self.timeouts, 'hedged': self.hedged, 'hedge_wins': self.hedge_wins,
+      'p50_s': self.percentile(50), 'p95_s': self.percentile(95), 'p99_s': self.percentile(99),
+    }
+
+
+_latencies: Dict[str, ModelLatency] = {}
+
+
+def model_key(llm: Any) -> str:
+  return str(getattr(llm, 'model_name', None) or getattr(llm, 'model', None) or type(llm).__name__)
+
+
+def model_latency(llm: Any) -> ModelLatency:
+  return _latencies.setdefault(model_key(llm), ModelLatency())
+
+
+def latency_stats() -> Dict[str, Dict[str, Any]]:
+  return {key: latency.stats() for key, latency in _latencies.items()}
+
+
+async def timed_llm_call(llm: Any, call: Callable[[], Awaitable[T]], max_timeout: float, hedging: Optional[bool] = None) -> T:
+  """
+  Awaits call() with a timeout adapted to the model's recent latencies (max_timeout until there are enough of them). With
+  hedging (RE_BROWSER_USE_LLM_HEDGING=true) a second identical call is sent once the p95 latency has passed and the first
+  answer wins. Raises asyncio.TimeoutError like the asyncio.wait_for it replaces.
+  """
+  latency = model_latency(llm)
+  hedge_delay = latency.hedge_delay() if (HEDGING_ENABLED if hedging is None else hedging) else None
+  timeout = latency.timeout(max_timeout)
+  loop = asyncio.get_running_loop()
+  start = loop.time()
+  latency.calls += 1
+
+  primary = asyncio.ensure_future(call())
+  pending = {primary}
+  try:
+    if hedge_delay is not None and hedge_delay < timeout:
+      done, _ = await asyncio.wait(pending, timeout=hedge_delay)
+      if not done:
+        logger.debug(f"LLM call to [{model_key(llm)}] over p95 ({hedge_delay:.1f}s), sending a hedged request ...")
+        latency.hedged += 1
+        pending.add(asyncio.ensure_future(call()))
+
+    error: Optional[BaseException] = None
+    while pending:
+      remaining = timeout - (loop.time() - start)
+      done, pending = await asyncio.wait(pending, timeout=max(0.0, remaining), return_when=asyncio.FIRST_COMPLETED)
+      if not done:
+        break
+      for task in done:
+        if task.exception() is None:
+          latency.latencies.append(loop.time() - start)
+          if task is not primary:
+            latency.hedge_wins += 1
+          return task.result()
+        error = task.exception()
+
+    if error is not None and not pending and loop.time() - start < timeout:
+      raise error  # Every request failed before the timeout: that's the real problem, not the time ...
+    # Timed out: counted as a sample at the timeout so a model getting slower gets more time next call ...
+    latency.timeouts += 1
+    latency.latencies.append(timeout)
+    raise asyncio.TimeoutError(f"LLM call to [{model_key(llm)}] timed out after {timeout:.1f}s")
+  finally:
+    for task in pending:
+      task.cancel()
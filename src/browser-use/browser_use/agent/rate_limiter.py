@@ -0,0 +1,176 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import re
+import tempfile
+import time
+
+from typing import Any, Dict, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.rate_limiters import BaseRateLimiter
+
+from browser_use.file_lock import file_lock
+
+logger = logging.getLogger(__name__)
+
+MAX_BACKOFF_SECONDS = 60.0
+MAX_WAIT_SLICE_SECONDS = 1.0  # Waiting in slices: another process may have freed capacity (or a 429 may have blocked it) meanwhile
+
+
+class SharedRateLimiter(BaseRateLimiter):
+  """
+  Token buckets for requests and LLM tokens per minute kept in a JSON state file under a file lock, so every process using
+  the same file (e.g. the task subprocesses of one evaluation run) shares the same quota:
+    limiter = SharedRateLimiter('gemini-2.5-flash', requests_per_minute=15, tokens_per_minute=1_000_000)
+    llm = ChatGoogleGenerativeAI(model='gemini-2.5-flash', rate_limiter=limiter, callbacks=[limiter.callback_handler])
+  The requests are taken before each call (langchain does it through 'rate_limiter'), the tokens are charged afterwards with
+  the usage the provider reports (the callback handler). A 429 blocks everybody for an exponential backoff (or Retry-After).
+  """
+
+  def __init__(self, key: str, requests_per_minute: Optional[float] = None, tokens_per_minute: Optional[float] = None,
+               burst: float = 1, state_path: Optional[str] = None):
+    self.key = key
+    self.requests_per_minute = requests_per_minute
+    self.tokens_per_minute = tokens_per_minute
+    self.burst = burst  # More than 1 lets idle time pile up, a minute-window provider limit may not like it ...
+    self.state_path = state_path or os.path.join(tempfile.gettempdir(), f"re-browser-use-rate-limit-{re.sub(r'[^a-zA-Z0-9.-]', '_', key)}.json")
+    self.callback_handler = RateLimitCallbackHandler(self)
+
+  @classmethod
+  def from_environment(cls, key: str) -> Optional['SharedRateLimiter']:
+    """RE_BROWSER_USE_LLM_RPM / RE_BROWSER_USE_LLM_TPM / RE_BROWSER_USE_RATE_LIMIT_STATE. None when no limit is set."""
+    rpm, tpm = os.environ.get('RE_BROWSER_USE_LLM_RPM'), os.environ.get('RE_BROWSER_USE_LLM_TPM')
+    if not rpm and not tpm:
+      return None
+    return cls(key, float(rpm) if rpm else None, float(tpm) if tpm else None, state_path=os.environ.get('RE_BROWSER_USE_RATE_LIMIT_STATE'))
+
+  def _read_state(self, now: float) -> Dict[str, Any]:
+    try:
+      with open(self.state_path, encoding='utf-8') as f:
+        state = json.load(f)
+    except (OSError, ValueError):
+      state = {'requests': self.burst, 'tokens': self.tokens_per_minute or 0, 'updated': now, 'blocked_until': 0, 'consecutive_429': 0}
+
+    # Refilling for the time elapsed since the last writer ...
+    elapsed = max(0.0, now - state['updated'])
+    if self.requests_per_minute:
+      state['requests'] = min(self.burst, state['requests'] + elapsed * self.requests_per_minute / 60)
+    if self.tokens_per_minute:
+      state['tokens'] = min(self.tokens_per_minute, state['tokens'] + elapsed * self.tokens_per_minute / 60)
+    state['updated'] = now
+    return state
+
+  def _write_state(self, state: Dict[str, Any]):
+    tmp_path = f"{self.state_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+      json.dump(state, f)
+    os.replace(tmp_path, self.state_path)
+
+  def _update(self, change) -> Any:
+    with file_lock(self.state_path + '.lock'):
+      now = time.time()
+      state = self._read_state(now)
+      result = change(state, now)
+      self._write_state(state)
+      return result
+
+  def _try_take(self) -> float:
+    """Takes one request when possible and returns 0, otherwise returns the seconds to wait before trying again."""
+    def take(state: Dict[str, Any], now: float) -> float:
+      waits = [state['blocked_until'] - now]
+      if self.requests_per_minute:
+        waits.append((1 - state['requests']) * 60 / self.requests_per_minute)
+      if self.tokens_per_minute:
+        waits.append(-state['tokens'] * 60 / self.tokens_per_minute)  # Overdrawn by the last answers ...
+      wait = max(waits)
+      if wait <= 0:
+        state['requests'] -= 1
+        return 0.0
+      return wait
+
+    return self._update(take)
+
+  def acquire(self, *, blocking: bool = True) -> bool:
+    while True:
+      wait = self._try_take()
+      if not wait:
+        return True
+      if not blocking:
+        return False
+      time.sleep(min(wait, MAX_WAIT_SLICE_SECONDS))
+
+  async def aacquire(self, *, blocking: bool = True) -> bool:
+    waited = 0.0
+    while True:
+      wait = self._try_take()
+      if not wait:
+        if waited:
+          logger.debug(f"Rate limiter [{self.key}]: waited {waited:.1f}s for quota ...")
+        return True
+      if not blocking:
+        return False
+      await asyncio.sleep(min(wait, MAX_WAIT_SLICE_SECONDS))
+      waited += min(wait, MAX_WAIT_SLICE_SECONDS)
+
+  def record_usage(self, tokens: int):
+    def charge(state: Dict[str, Any], now: float):
+      state['tokens'] -= tokens
+      state['consecutive_429'] = 0
+
+    self._update(charge)
+
+  def record_rate_limited(self, retry_after: Optional[float] = None) -> float:
+    def block(state: Dict[str, Any], now: float) -> float:
+      state['consecutive_429'] += 1
+      backoff = retry_after or min(MAX_BACKOFF_SECONDS, 2 ** state['consecutive_429']) * random.uniform(0.75, 1.25)
+      state['blocked_until'] = max(state['blocked_until'], now + backoff)
+      return state['blocked_until'] - now
+
+    blocked_for = self._update(block)
+    logger.info(f"Rate limiter [{self.key}]: 429 from the provider, every caller waits {blocked_for:.1f}s ...")
+    return blocked_for
+
+
+def _total_tokens(response: Any) -> int:
+  total = 0
+  for generations in response.generations:
+    for generation in generations:
+      usage = getattr(getattr(generation, 'message', None), 'usage_metadata', None)
+      if usage:
+        total += usage.get('total_tokens', 0)
+  if not total and response.llm_output:
+    total = (response.llm_output.get('token_usage') or {}).get('total_tokens', 0)
+  return total
+
+
+def _is_rate_limit_error(error: BaseException) -> bool:
+  status = getattr(error, 'status_code', None) or getattr(error, 'code', None)
+  message = f"{type(error).__name__} {error}".lower()
+  return status == 429 or '429' in message or 'resourceexhausted' in message or 'resource_exhausted' in message or 'rate limit' in message
+
+
+def _retry_after(error: BaseException) -> Optional[float]:
+  headers = getattr(getattr(error, 'response', None), 'headers', None) or {}
+  try:
+    return float(headers.get('retry-after'))
+  except (TypeError, ValueError):
+    return None
+
+
+class RateLimitCallbackHandler(BaseCallbackHandler):
+  """Charges the tokens of every answer and turns the 429s into a shared backoff."""
+
+  def __init__(self, rate_limiter: SharedRateLimiter):
+    self.rate_limiter = rate_limiter
+
+  def on_llm_end(self, response: Any, **kwargs: Any):
+    tokens = _total_tokens(response)
+    if tokens:
+      self.rate_limiter.record_usage(tokens)
+
+  def on_llm_error(self, error: BaseException, **kwargs: Any):
+    if _is_rate_limit_error(error):
+      self.rate_limiter.record_rate_limited(_retry_after(error))
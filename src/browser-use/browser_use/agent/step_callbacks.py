@@ -0,0 +1,24 @@
+import inspect
+
+from typing import Any, Callable, List, Optional
+
+StepCallback = Callable[[Any, Any, int], Any]
+
+
+def chain_step_callbacks(*callbacks: Optional[StepCallback]) -> Optional[StepCallback]:
+  """
+  Agent only accepts one 'register_new_step_callback', this one calls all the given ones (sync or async, None are skipped) in order.
+  """
+  active: List[StepCallback] = [callback for callback in callbacks if callback]
+  if not active:
+    return None
+  if len(active) == 1:
+    return active[0]
+
+  async def chained(browser_state_summary: Any, model_output: Any, n_steps: int):
+    for callback in active:
+      result = callback(browser_state_summary, model_output, n_steps)
+      if inspect.isawaitable(result):
+        await result
+
+  return chained
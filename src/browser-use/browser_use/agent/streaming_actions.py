@@ -0,0 +1,232 @@
+import asyncio
+import json
+import logging
+import os
+
+from typing import Any, Dict, List, Optional
+
+from browser_use.agent.llm_timing import model_key, model_latency
+
+logger = logging.getLogger(__name__)
+
+STREAM_ACTIONS = os.environ.get('RE_BROWSER_USE_STREAM_ACTIONS', 'False').lower() == 'true'
+ACTIONS_KEY = 'action'
+
+_END = object()  # End of the stream for the action queue
+
+
+class ActionStreamError(ValueError):
+  """The streamed model output stopped being valid JSON or one of its actions doesn't validate."""
+
+
+class IncrementalActionParser:
+  """
+  Scans a JSON object as it's being generated: every element of its top level "action" array is returned by feed() as soon
+  as it's complete, and every other top level value is kept in 'values' ('thinking', 'memory', 'next_goal' ...).
+  """
+
+  def __init__(self, actions_key: str = ACTIONS_KEY):
+    self.actions_key = actions_key
+    self.buffer = ''
+    self.values: Dict[str, Any] = {}
+    self._position = 0
+    self._depth = 0
+    self._in_string = self._escaped = False
+    self._string_start = 0
+    self._key: Optional[str] = None  # The last key closed at the top level: the one of the next value
+    self._expect_key = False  # At the top level, between '{' or ',' and ':'
+    self._value_start: Optional[int] = None
+    self._element_start: Optional[int] = None
+    self._in_actions = False
+
+  def _load(self, start: int, end: int) -> Any:
+    try:
+      return json.loads(self.buffer[start:end])
+    except ValueError as e:
+      raise ActionStreamError(f"Invalid JSON in the streamed output: {e}") from None
+
+  def feed(self, text: str) -> List[Any]:
+    self.buffer += text
+    actions: List[Any] = []
+    for position in range(self._position, len(self.buffer)):
+      char = self.buffer[position]
+      if self._in_string:
+        if self._escaped:
+          self._escaped = False
+        elif char == '\\':
+          self._escaped = True
+        elif char == '"':
+          self._in_string = False
+          if self._depth == 1:
+            string = self._load(self._string_start, position + 1)
+            if self._expect_key:
+              self._key = string
+            else:
+              self.values[self._key or ''] = string
+        continue
+
+      if self._depth == 1 and char in ',:':
+        self._expect_key = char == ','
+      elif char == '"':
+        self._in_string, self._string_start = True, position
+      elif char in '{[':
+        self._depth += 1
+        if self._depth == 1:
+          self._expect_key = True
+        elif self._depth == 2:
+          self._value_start = position
+          self._in_actions = char == '[' and self._key == self.actions_key
+        elif self._depth == 3 and self._in_actions:
+          self._element_start = position
+      elif char in '}]':
+        self._depth -= 1
+        if self._depth < 0:
+          raise ActionStreamError(f"Unbalanced '{char}' in the streamed output")
+        if self._depth == 2 and self._in_actions and self._element_start is not None:
+          actions.append(self._load(self._element_start, position + 1))
+          self._element_start = None
+        elif self._depth == 1 and self._value_start is not None:
+          self.values[self._key or ''] = self._load(self._value_start, position + 1)
+          self._value_start, self._in_actions = None, False
+    self._position = len(self.buffer)
+    return actions
+
+  @property
+  def complete(self) -> bool:
+    return self._depth == 0 and self._position > 0 and self.buffer.strip().endswith('}')
+
+
+def _chunk_text(chunk: Any) -> str:
+  # Tool call arguments (function calling) or plain content (JSON answers) ...
+  tool_call_chunks = getattr(chunk, 'tool_call_chunks', None) or []
+  if tool_call_chunks:
+    return ''.join(tool_call_chunk.get('args') or '' for tool_call_chunk in tool_call_chunks if (tool_call_chunk.get('index') or 0) == 0)
+  content = getattr(chunk, 'content', '')
+  return content if isinstance(content, str) else ''
+
+
+def _branch_path_hashes(selector_map: Dict[int, Any]) -> Dict[int, str]:
+  return {index: node.hash.branch_path_hash for index, node in selector_map.items()}
+
+
+async def _execute_actions(agent: Any, queue: 'asyncio.Queue[Any]', results: List[Any], executed: List[Any]):
+  """
+  multi_act, one action at a time as they arrive. Its 'done only first', index changed and something new appeared checks
+  are made here, against the state the model saw: every multi_act([action]) call only sees its own action ...
+  """
+  from browser_use.agent.views import ActionResult
+
+  cached_hashes = _branch_path_hashes(await agent.browser_session.get_selector_map())
+  while True:
+    action = await queue.get()
+    if action is _END:
+      return
+    position = len(executed)
+    if position != 0 and action.model_dump(exclude_unset=True).get('done') is not None:
+      return  # As in multi_act: 'done' only as a single action ...
+    if action.get_index() is not None and position != 0:
+      new_state = await agent.browser_session.get_state_summary_if_changed(cache_clickable_elements_hashes=False)
+      new_hashes = _branch_path_hashes(new_state.selector_map)
+      message = None
+      if cached_hashes.get(action.get_index()) != new_hashes.get(action.get_index()):
+        message = f"Element index changed after action {position} / {position + 1}+, because page changed."
+      elif not set(new_hashes.values()).issubset(cached_hashes.values()):
+        message = f"Something new appeared after action {position} / {position + 1}+, following actions are NOT executed and should be retried."
+      if message:
+        results.append(ActionResult(extracted_content=message, include_in_memory=True, long_term_memory=message))
+        return
+      await asyncio.sleep(agent.browser_session.browser_profile.wait_between_actions)
+
+    action_results = await agent.multi_act([action], check_for_new_elements=False, start_speculative_capture=False)
+    executed.append(action)
+    results.extend(action_results)
+    if not action_results or action_results[-1].is_done or action_results[-1].error:
+      return
+
+
+async def stream_next_action(agent: Any, input_messages: List[Any], max_timeout: float) -> Any:
+  """
+  get_next_action executing the actions while the model is still generating the rest: every action gets validated and
+  executed (multi_act, in order) as soon as it's complete in the stream. The results are left in agent.streamed_results for
+  Agent.act_or_take_streamed_results. A broken or invalid tail stops the stream: the actions already executed stay (the
+  model output only has those) and an error result explains the rest. With nothing executed it raises as get_next_action.
+  What streaming keeps and drops of the step's guarantees:
+    - stop / pause: still checked before every action, in multi_act([action]) (Agent._raise_if_stopped_or_paused).
+    - the new step callback (register_new_step_callback) runs after the streamed actions were executed, not before: the
+      model output it gets isn't complete until the stream ends. A callback vetoing actions can't with streaming on.
+    - the new element and index checks: the same as multi_act's (_execute_actions), against the state the model saw.
+  """
+  from browser_use.agent.views import ActionResult
+
+  agent.streamed_results = None
+  llm = agent.llm
+  input_messages = agent._convert_input_messages(input_messages)
+  runnable = llm.bind_tools([agent.AgentOutput], tool_choice=agent.AgentOutput.__name__)
+  parser = IncrementalActionParser()
+  queue: 'asyncio.Queue[Any]' = asyncio.Queue()
+  results: List[Any] = []
+  executed: List[Any] = []
+  latency = model_latency(llm)
+  timeout = latency.timeout(max_timeout)
+  max_actions = agent.settings.max_actions_per_step
+
+  async def read_stream():
+    queued = 0
+    async for chunk in runnable.astream(input_messages):
+      for action_dict in parser.feed(_chunk_text(chunk)):
+        try:
+          action = agent.ActionModel.model_validate(action_dict)
+        except Exception as e:
+          raise ActionStreamError(f"Invalid action {action_dict}: {e}") from None
+        if not action.model_dump(exclude_unset=True):
+          raise ActionStreamError(f"Empty action {action_dict}")
+        if queued < max_actions:
+          queue.put_nowait(action)
+          queued += 1
+    if not parser.complete:
+      raise ActionStreamError('The streamed output ended before the JSON object did')
+
+  loop = asyncio.get_running_loop()
+  start = loop.time()
+  latency.calls += 1
+  reader = asyncio.ensure_future(asyncio.wait_for(read_stream(), timeout))
+  reader.add_done_callback(lambda _: queue.put_nowait(_END))
+  executor = asyncio.ensure_future(_execute_actions(agent, queue, results, executed))
+  stream_error: Optional[BaseException] = None
+  try:
+    await asyncio.wait({reader, executor}, return_when=asyncio.FIRST_COMPLETED)
+    if executor.done() and not reader.done():
+      reader.cancel()  # Nothing else would be executed (done, error, page changed): no point in generating it ...
+    await executor  # Its exceptions (stopped, browser errors ...) are the step's, as in multi_act
+    if executed and not (results and results[-1].is_done):
+      # After the last action, as multi_act does (browser_use/browser/speculative_capture.py) ...
+      await agent.browser_session.start_speculative_state_capture()
+    outcome = (await asyncio.gather(reader, return_exceptions=True))[0]
+    if not isinstance(outcome, BaseException):
+      latency.latencies.append(loop.time() - start)
+    elif not isinstance(outcome, asyncio.CancelledError):
+      stream_error = outcome
+  finally:
+    for task in (reader, executor):
+      task.cancel()
+
+  if isinstance(stream_error, asyncio.TimeoutError):
+    latency.timeouts += 1
+    latency.latencies.append(timeout)
+  if stream_error is not None:
+    logger.warning(f"Streamed output of [{model_key(llm)}] aborted after {len(executed)} actions: {type(stream_error).__name__}: {stream_error}")
+    if not executed:
+      if isinstance(stream_error, asyncio.TimeoutError):
+        raise asyncio.TimeoutError(f"LLM call to [{model_key(llm)}] timed out after {timeout:.1f}s")
+      raise ValueError('Could not parse response.') from stream_error
+    results.append(ActionResult(error=f"The rest of the actions weren't executed: {stream_error}", include_in_memory=True))
+  elif not executed:
+    raise ValueError('Could not parse response.')
+
+  agent.streamed_results = results
+  model_output = agent.AgentOutput.model_validate({
+    **{key: value for key, value in parser.values.items() if key != parser.actions_key},
+    'action': [action.model_dump(exclude_unset=True) for action in executed],
+  })
+  logger.debug(f"Streamed output of [{model_key(llm)}]: {len(executed)} actions executed while generating ...")
+  return model_output
@@ -0,0 +1,34 @@
+import weakref
+
+from typing import Any, Optional, Type, TypeVar
+
+A = TypeVar('A', bound='Attachment')
+
+
+class Attachment:
+  """
+  Base of the helpers living alongside an object they don't own (a browser context, a page, a controller, an agent ...) and
+  forgotten with it: one instance per object and subclass.
+    watcher = ChallengeWatcher.attach(browser_context)  # Created the first time
+    watcher = ChallengeWatcher.get(browser_context)  # None when it was never attached
+  Subclasses declared with 'takes_owner=True' get the object in their constructor.
+  """
+  _attached: 'weakref.WeakKeyDictionary[Any, Attachment]'
+  _takes_owner = False
+
+  def __init_subclass__(cls, takes_owner: Optional[bool] = None, **kwargs):
+    super().__init_subclass__(**kwargs)
+    cls._attached = weakref.WeakKeyDictionary()
+    if takes_owner is not None:
+      cls._takes_owner = takes_owner
+
+  @classmethod
+  def attach(cls: Type[A], owner: Any) -> A:
+    instance = cls._attached.get(owner)
+    if instance is None:
+      instance = cls._attached[owner] = cls(owner) if cls._takes_owner else cls()
+    return instance  # type: ignore[return-value]
+
+  @classmethod
+  def get(cls: Type[A], owner: Any) -> Optional[A]:
+    return cls._attached.get(owner)  # type: ignore[return-value]
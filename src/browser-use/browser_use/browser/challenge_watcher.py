@@ -0,0 +1,136 @@
+import asyncio
+import inspect
+import logging
+import os
+import time
+
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import urlparse
+
+from browser_use.attachments import Attachment
+from browser_use.browser.request_filter import CHALLENGE_ALLOWLIST_HOSTS, host_matches
+
+logger = logging.getLogger(__name__)
+
+CHALLENGE_TIMEOUT_SECONDS = float(os.environ.get('RE_BROWSER_USE_CHALLENGE_TIMEOUT', '20'))
+# A challenge frame without any network activity for this long is waiting for somebody to click it, not resolving by itself ...
+CHALLENGE_IDLE_SECONDS = 2.0
+TOKEN_POLL_SECONDS = 0.25
+
+# The widgets leave their verified token in a hidden input of the page embedding them ...
+TOKEN_PRESENT_JS = """
+() => Array.from(document.querySelectorAll('[name="cf-turnstile-response"], [name="g-recaptcha-response"], [name="h-captcha-response"]'))
+  .some(input => !!input.value)
+"""
+
+
+@dataclass
+class ChallengeEvent:
+  kind: str  # 'detected' or 'solved'
+  reason: str  # 'frame' for 'detected'; 'token', 'navigation' or 'frame_detached' for 'solved'
+  url: str
+  timestamp: float = field(default_factory=time.time)
+
+
+class ChallengeWatcher(Attachment, takes_owner=True):
+  """
+  Watches the challenge iframes (Turnstile, reCAPTCHA, hCaptcha ...) of a stealth context and raises an event when they are
+  solved: a verified token shows up, the main frame navigates (Cloudflare's interstitial) or the challenge iframe goes away.
+    browser_session = await BrowserSession.create_stealth_browser_session(watch_challenges=True)
+    ChallengeWatcher.get(browser_session.browser_context).add_listener(print)
+  While a challenge is resolving, Agent.step waits for it (BrowserSession.wait_for_challenge_resolution) instead of capturing the
+  state and asking the LLM whether it's done yet.
+  """
+  def __init__(self, browser_context: Any):
+    self._challenge_frames: Dict[Any, Any] = {}  # challenge frame -> page
+    self._last_activity = float('-inf')
+    self._solved = asyncio.Event()
+    self._listeners: List[Callable[[ChallengeEvent], Any]] = []
+    self.pending = False
+    self.events: List[ChallengeEvent] = []
+    browser_context.on('page', self._watch_page)
+    browser_context.on('request', self._on_request)
+    for page in browser_context.pages:
+      self._watch_page(page)
+
+  def add_listener(self, listener: Callable[[ChallengeEvent], Any]):
+    """Sync or async callable receiving every ChallengeEvent."""
+    self._listeners.append(listener)
+
+  @staticmethod
+  def is_challenge_url(url: str) -> bool:
+    return host_matches(urlparse(url).hostname or '', CHALLENGE_ALLOWLIST_HOSTS)
+
+  @staticmethod
+  def _now() -> float:
+    return asyncio.get_running_loop().time()
+
+  def _watch_page(self, page: Any):
+    page.on('framenavigated', lambda frame: self._on_frame_navigated(page, frame))
+    page.on('framedetached', self._on_frame_detached)
+
+  def _on_request(self, request: Any):
+    if self.is_challenge_url(request.url):
+      self._last_activity = self._now()
+
+  def _on_frame_navigated(self, page: Any, frame: Any):
+    if frame == page.main_frame:
+      if self.pending and any(challenge_page is page for challenge_page in self._challenge_frames.values()):
+        self._resolve('navigation', frame.url)
+      return
+    if self.is_challenge_url(frame.url) and frame not in self._challenge_frames:
+      self._challenge_frames[frame] = page
+      self._last_activity = self._now()
+      if not self.pending:
+        self.pending = True
+        self._solved.clear()
+        self._emit(ChallengeEvent('detected', 'frame', frame.url))
+
+  def _on_frame_detached(self, frame: Any):
+    if self._challenge_frames.pop(frame, None) is not None and self.pending and not self._challenge_frames:
+      self._resolve('frame_detached', frame.url)
+
+  def _resolve(self, reason: str, url: str):
+    self.pending = False
+    self._solved.set()
+    self._emit(ChallengeEvent('solved', reason, url))
+
+  def _emit(self, event: ChallengeEvent):
+    logger.info(f"Challenge {event.kind} ({event.reason}) [{event.url}] ...")
+    self.events.append(event)
+    for listener in self._listeners:
+      try:
+        result = listener(event)
+        if inspect.isawaitable(result):
+          asyncio.ensure_future(result)
+      except Exception as e:
+        logger.debug(f"Challenge watcher: listener error: {type(e).__name__}: {e}")
+
+  async def check_token(self) -> bool:
+    """Looks for a verified token in the frames embedding the challenges (there is no DOM event for it)."""
+    parents = {frame.parent_frame for frame in self._challenge_frames if frame.parent_frame}
+    for parent in parents:
+      try:
+        if await parent.evaluate(TOKEN_PRESENT_JS):
+          self._resolve('token', parent.url)
+          return True
+      except Exception:  # Navigating or detached: the frame events will tell ...
+        pass
+    return False
+
+  async def wait_for_resolution(self, timeout: float = CHALLENGE_TIMEOUT_SECONDS) -> Optional[ChallengeEvent]:
+    """The 'solved' event if a pending challenge resolves within 'timeout', None if there's nothing to wait for (anymore)."""
+    if not self.pending:
+      return None
+    deadline = self._now() + timeout
+    while self.pending and not await self.check_token():
+      now = self._now()
+      if now >= deadline or now - self._last_activity >= CHALLENGE_IDLE_SECONDS:
+        return None  # Still there and not moving: the agent has something to do with it ...
+      try:
+        await asyncio.wait_for(self._solved.wait(), min(TOKEN_POLL_SECONDS, deadline - now))
+      except asyncio.TimeoutError:
+        pass
+
+    return self.events[-1]
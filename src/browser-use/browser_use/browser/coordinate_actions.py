@@ -0,0 +1,148 @@
+import logging
+
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# buildDomTree's xpaths are simple 'tag[n]/tag/...' paths relative to the document or to the shadow root they were computed in.
+# Walking them by hand works in both cases (the XPath engine doesn't like ShadowRoot context nodes) ...
+RESOLVE_XPATH_JS = """
+const resolveXPath = (root, xpath) => {
+  let node = root;
+  for (const segment of xpath.split('/').filter(Boolean)) {
+    const [, name, position] = segment.match(/^([^\\[]+)(?:\\[(\\d+)\\])?$/) || [];
+    if (!name || !node) return null;
+    const siblings = Array.from(node.children).filter(child => child.localName.toLowerCase() === name.toLowerCase());
+    node = siblings[(position ? parseInt(position) : 1) - 1] || null;
+  }
+  return node;
+};
+"""
+
+# buildDomTree.js measuring the boxes of the elements it indexed in the same evaluate, relative to the root it walked (the
+# document or a closed shadow root): no extra round trip per frame or closed shadow root ...
+ACTION_RECTS_BUILD_DOM_TREE_JS = """
+(args) => {
+  %s
+  const result = (%s)(args);
+  const root = args.initialRootNode || document;
+  result.actionRects = Object.values(result.map || {})
+    .filter(node => node.highlightIndex !== undefined && node.highlightIndex !== null)
+    .map(node => {
+      const element = resolveXPath(root, node.xpath);
+      const rect = element && element.getBoundingClientRect();
+      return rect && rect.width > 0 && rect.height > 0 ? [node.highlightIndex, rect.left, rect.top, rect.width, rect.height] : null;
+    })
+    .filter(Boolean);
+  return result;
+}
+"""
+
+# True when a click at (x, y) in this frame lands on the element (or inside it). Elements inside closed shadow roots can only be
+# checked against their host: that's where the events get retargeted ...
+HIT_TEST_JS = """
+({ x, y, xpath, hostXPath }) => {
+  %s
+  let hit = document.elementFromPoint(x, y);
+  while (hit && hit.shadowRoot) {
+    const inner = hit.shadowRoot.elementFromPoint(x, y);
+    if (!inner || inner === hit) break;
+    hit = inner;
+  }
+  const expected = resolveXPath(document, hostXPath || xpath);
+  return !!hit && !!expected && (expected === hit || expected.contains(hit));
+}
+""" % RESOLVE_XPATH_JS
+
+# Where the content of an iframe starts inside its parent frame's viewport (the border and padding of the iframe count) and
+# whether the point translated to the parent frame still hits the iframe (clipped or covered iframes don't) ...
+IFRAME_CONTENT_OFFSET_JS = """
+(iframe, [x, y]) => {
+  const rect = iframe.getBoundingClientRect();
+  const style = getComputedStyle(iframe);
+  const offsetX = rect.left + iframe.clientLeft + parseFloat(style.paddingLeft);
+  const offsetY = rect.top + iframe.clientTop + parseFloat(style.paddingTop);
+  return [offsetX, offsetY, iframe.ownerDocument.elementFromPoint(x + offsetX, y + offsetY) === iframe];
+}
+"""
+
+
+@dataclass
+class ActionTarget:
+  """Where an element was at capture time: its frame and its box in that frame's viewport."""
+  frame: Any
+  x: float
+  y: float
+  width: float
+  height: float
+  host_xpath: Optional[str] = None  # Set for elements inside a closed shadow root
+
+  @property
+  def center(self) -> Tuple[float, float]:
+    return self.x + self.width / 2, self.y + self.height / 2
+
+
+def with_action_rects(js_code: str) -> str:
+  if 'result.actionRects' in js_code:  # Already wrapped (a DomService capturing again) ...
+    return js_code
+  return ACTION_RECTS_BUILD_DOM_TREE_JS % (RESOLVE_XPATH_JS, js_code.strip().rstrip(';'))  # An expression: no trailing ';' ...
+
+
+def pop_action_rects(eval_page: Dict[str, Any]) -> Dict[int, List[float]]:
+  """Highlight index => box, taken out of the result of a with_action_rects() evaluate."""
+  return {rect[0]: rect[1:] for rect in eval_page.pop('actionRects', None) or []}
+
+
+def attach_action_targets(frame: Any, selector_map: Dict[int, Any], action_rects: Dict[int, List[float]],
+                          host_xpath: Optional[str] = None):
+  """
+  The boxes measured at capture time go to the nodes (node.action_target): clicking them later doesn't need to find them
+  again through locators.
+  """
+  for index, node in selector_map.items():
+    rect = action_rects.get(index)
+    if rect:
+      node.action_target = ActionTarget(frame, *rect, host_xpath=host_xpath)
+
+
+async def _to_page_coordinates(frame: Any, x: float, y: float) -> Optional[Tuple[float, float]]:
+  """The point in the page's (main frame) viewport, one iframe at a time. None if some iframe on the way doesn't get it."""
+  while frame.parent_frame is not None:
+    iframe = await frame.frame_element()
+    try:
+      offset_x, offset_y, hits_iframe = await iframe.evaluate(IFRAME_CONTENT_OFFSET_JS, [x, y])
+    finally:
+      await iframe.dispose()
+    if not hits_iframe:
+      return None
+    x, y, frame = x + offset_x, y + offset_y, frame.parent_frame
+  return x, y
+
+
+async def prepare_coordinate_click(element_node: Any) -> Optional[Callable[[], Awaitable[None]]]:
+  """
+  The click of the element with page mouse events at the coordinates captured with it, once checked that the point still hits
+  it, for BrowserSession._click_element_node's perform_click (downloads, navigation checks ...). None when there are no
+  coordinates or the check fails: time for the locator path.
+  """
+  target: Optional[ActionTarget] = getattr(element_node, 'action_target', None)
+  if target is None or target.frame.is_detached():
+    return None
+
+  x, y = target.center
+  try:
+    hit = await target.frame.evaluate(HIT_TEST_JS, {'x': x, 'y': y, 'xpath': element_node.xpath, 'hostXPath': target.host_xpath})
+    page_point = await _to_page_coordinates(target.frame, x, y) if hit else None
+  except Exception as e:
+    logger.debug(f"Coordinate click check failed, falling back to locators: {type(e).__name__}: {e}")
+    return None
+  if page_point is None:
+    logger.debug(f"Coordinate click: element moved or covered at ({x:.0f}, {y:.0f}), falling back to locators ...")
+    return None
+
+  async def click():
+    await target.frame.page.mouse.click(*page_point)
+    logger.debug(f"Coordinate click at ({page_point[0]:.0f}, {page_point[1]:.0f}) on {element_node.tag_name} in frame {target.frame.url}")
+
+  return click
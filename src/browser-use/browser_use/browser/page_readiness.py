@@ -0,0 +1,174 @@
+import asyncio
+import logging
+import os
+
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from browser_use.attachments import Attachment
+
+logger = logging.getLogger(__name__)
+
+PAGE_READY_TIMEOUT_SECONDS = float(os.environ.get('RE_BROWSER_USE_PAGE_READY_TIMEOUT', '10'))
+NETWORK_QUIET_SECONDS = 0.5
+DOM_QUIET_MS = 300
+# Long polling, analytics beacons, streaming ... some requests never finish and must not keep the page "busy" forever
+LONG_REQUEST_SECONDS = 5.0
+# Polling, tickers, carousels ... some pages are never quiet: after this long the quiet periods aren't required anymore
+BUSY_PAGE_SECONDS = 2.0
+MAX_RESTARTS = 2  # New activity during the DOM check starts it all over again, but only so many times
+
+# Resolves when no mutation has been seen for 'quietMs' in this frame (or when 'timeoutMs' runs out). Attribute-only mutations
+# (class toggles, animations, hover states ...) don't change what the agent would see in the element list ...
+DOM_QUIESCENCE_JS = """
+({ quietMs, timeoutMs }) => new Promise(resolve => {
+  const start = performance.now();
+  let lastMutation = start;
+  const observer = new MutationObserver(() => { lastMutation = performance.now(); });
+  observer.observe(document, { subtree: true, childList: true, characterData: true });
+  const check = () => {
+    const now = performance.now();
+    const quiet = now - lastMutation >= quietMs;
+    if (quiet || now - start >= timeoutMs) {
+      observer.disconnect();
+      resolve(quiet);
+    } else {
+      setTimeout(check, Math.max(16, quietMs - (now - lastMutation)));
+    }
+  };
+  setTimeout(check, quietMs);
+})
+"""
+
+
+@dataclass
+class ReadinessResult:
+  ready: bool
+  waited: float
+  pending: Optional[str] = None  # 'navigation', 'network' or 'dom' when not ready
+
+  def __bool__(self):
+    return self.ready
+
+
+class PageReadinessDetector(Attachment, takes_owner=True):
+  """
+  Event-driven page readiness for a browser_context: a page is ready when there is no pending navigation, the network has been
+  idle for NETWORK_QUIET_SECONDS and the DOM of every frame has stopped mutating for DOM_QUIET_MS. It replaces fixed sleeps:
+    result = await PageReadinessDetector.attach(page.context).wait(page, timeout=10)
+  After BUSY_PAGE_SECONDS a page that keeps polling or mutating is taken as it is: no request in flight is enough for the
+  network and the DOM isn't waited for anymore.
+  The network listeners live on the context, attach it as early as possible (create_stealth_browser_session does it) not to
+  miss the requests already in flight. Only the contexts attached this way are waited for (see get).
+  """
+  def __init__(self, browser_context: Any):
+    self._inflight: Dict[Any, Any] = {}  # request -> (page, start time)
+    self._last_activity: Dict[Any, float] = {}  # page -> last network event or navigation
+    self._changed = asyncio.Event()
+    browser_context.on('request', self._on_request)
+    browser_context.on('requestfinished', self._on_request_done)
+    browser_context.on('requestfailed', self._on_request_done)
+    browser_context.on('page', self._watch_page)
+    for page in browser_context.pages:
+      self._watch_page(page)
+
+  @staticmethod
+  def _now() -> float:
+    return asyncio.get_running_loop().time()
+
+  def _notify(self, page: Any):
+    self._last_activity[page] = self._now()
+    # Waking up everybody waiting on the old event, new waiters get a fresh one ...
+    self._changed.set()
+    self._changed = asyncio.Event()
+
+  def _watch_page(self, page: Any):
+    page.on('framenavigated', lambda frame: self._notify(page))
+    page.on('close', lambda _: self._forget_page(page))
+
+  def _forget_page(self, page: Any):
+    self._last_activity.pop(page, None)
+    for request in [request for request, (request_page, _) in self._inflight.items() if request_page is page]:
+      del self._inflight[request]
+
+  @staticmethod
+  def _page_of(request: Any) -> Optional[Any]:
+    try:
+      return request.frame.page
+    except Exception:  # Service workers' requests don't have a frame ...
+      return None
+
+  def _on_request(self, request: Any):
+    page = self._page_of(request)
+    if page is not None:
+      self._inflight[request] = (page, self._now())
+      self._notify(page)
+
+  def _on_request_done(self, request: Any):
+    entry = self._inflight.pop(request, None)
+    if entry is not None:
+      self._notify(entry[0])
+
+  async def _wait_network_idle(self, page: Any, deadline: float, busy_after: float) -> bool:
+    while True:
+      now = self._now()
+      starts = [started for request_page, started in self._inflight.values() if request_page is page and now - started < LONG_REQUEST_SECONDS]
+      quiet_for = now - self._last_activity.get(page, float('-inf'))
+      if not starts and (quiet_for >= NETWORK_QUIET_SECONDS or now >= busy_after):
+        return True
+      if now >= deadline:
+        return False
+      # Sleeping until something happens, the quiet period is over or the oldest request becomes a "long" one ...
+      wake_up = min(starts) + LONG_REQUEST_SECONDS if starts else min(now + NETWORK_QUIET_SECONDS - quiet_for, busy_after)
+      changed = self._changed
+      try:
+        await asyncio.wait_for(changed.wait(), max(0.0, min(wake_up, deadline) - now))
+      except asyncio.TimeoutError:
+        pass
+
+  @staticmethod
+  async def _wait_dom_quiet(page: Any, deadline: float, now: float) -> bool:
+    timeout_ms = max(0.0, deadline - now) * 1000
+
+    async def frame_quiet(frame: Any) -> bool:
+      try:
+        return await frame.evaluate(DOM_QUIESCENCE_JS, {'quietMs': DOM_QUIET_MS, 'timeoutMs': timeout_ms})
+      except Exception:  # Detached or navigating frames: the navigation check takes care of them ...
+        return True
+
+    return all(await asyncio.gather(*[frame_quiet(frame) for frame in page.frames]))
+
+  async def wait(self, page: Any, timeout: float = PAGE_READY_TIMEOUT_SECONDS) -> ReadinessResult:
+    start = self._now()
+    deadline = start + timeout
+    busy_after = start + min(BUSY_PAGE_SECONDS, timeout)
+    pending = None
+    restarts = 0
+    while True:
+      try:
+        await page.wait_for_load_state('domcontentloaded', timeout=max(1.0, (deadline - self._now()) * 1000))
+      except Exception:
+        pending = 'navigation'
+        break
+      if not await self._wait_network_idle(page, deadline, busy_after):
+        pending = 'network'
+        break
+      activity_mark = self._last_activity.get(page)
+      now = self._now()
+      # At least one quiet period to observe, but a busy page isn't waited for beyond BUSY_PAGE_SECONDS ...
+      dom_deadline = min(deadline, max(busy_after, now + 2 * DOM_QUIET_MS / 1000))
+      if not await self._wait_dom_quiet(page, dom_deadline, now):
+        pending = 'dom'
+        break
+      # The DOM check takes a while: a navigation or a new request during it means starting all over again ...
+      if self._last_activity.get(page) == activity_mark:
+        break
+      restarts += 1
+      if restarts > MAX_RESTARTS or self._now() >= deadline:
+        pending = 'network'
+        break
+
+    result = ReadinessResult(ready=pending is None, waited=self._now() - start, pending=pending)
+    logger.debug(f"Page readiness: {'ready' if result.ready else 'NOT ready (' + pending + ')'} after {result.waited:.2f}s [{page.url}]")
+
+    return result
@@ -0,0 +1,161 @@
+import json
+import logging
+import time
+import weakref
+
+from contextlib import asynccontextmanager
+from dataclasses import asdict, dataclass
+from typing import Any, AsyncIterator, Awaitable, Dict, List, Optional, TypeVar
+from urllib.parse import urlparse
+
+from browser_use.attachments import Attachment
+from browser_use.dom.cdp_accounting import get_cdp_accountant
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+# CDP Performance.getMetrics names: durations are in seconds, sizes in bytes, the rest are counters
+TASK_DURATION, SCRIPT_DURATION, LAYOUT_DURATION = 'TaskDuration', 'ScriptDuration', 'LayoutDuration'
+JS_HEAP_USED, NODES, LAYOUT_COUNT, RECALC_STYLE_COUNT = 'JSHeapUsedSize', 'Nodes', 'LayoutCount', 'RecalcStyleCount'
+
+
+@dataclass
+class PerformanceSample:
+  """Browser-side cost of one state capture or action: deltas between the metrics sampled before and after it."""
+  step: int
+  kind: str  # 'capture' or 'action'
+  label: str  # the action name for actions
+  site: str
+  wall_ms: float
+  cpu_ms: float  # renderer main thread busy time (TaskDuration)
+  script_ms: float
+  layout_ms: float
+  layouts: int
+  style_recalcs: int
+  js_heap_mb: float  # after
+  js_heap_delta_mb: float
+  nodes: int  # after
+  nodes_delta: int
+
+
+class PerformanceSampler(Attachment):
+  """
+  Samples the renderer metrics (CDP Performance.getMetrics) before and after every state capture and every action of the
+  stealth sessions it watches, so a slow step can be blamed on the page or on us:
+    browser_session = await BrowserSession.create_stealth_browser_session(sample_performance=True)
+    ...
+    sampler = PerformanceSampler.get(browser_session.browser_context)
+    print(sampler.aggregates())
+    sampler.save_history(agent.state.history, 'history_with_metrics.json')
+  """
+  def __init__(self):
+    self.samples: List[PerformanceSample] = []
+    self.current_step = 0
+    self._cdp_sessions: 'weakref.WeakKeyDictionary[Any, Any]' = weakref.WeakKeyDictionary()  # page -> CDPSession
+
+  def begin_step(self, step: int):
+    self.current_step = step
+
+  async def _metrics(self, page: Any) -> Optional[Dict[str, float]]:
+    track = get_cdp_accountant().track
+    call_site = 'PerformanceSampler._metrics'
+    try:
+      cdp_session = self._cdp_sessions.get(page)
+      if cdp_session is None:
+        cdp_session = await track(call_site, 'Target.attachToTarget', page.context.new_cdp_session(page))
+        await track(call_site, 'Performance.enable', cdp_session.send('Performance.enable'))
+        self._cdp_sessions[page] = cdp_session
+      result = await track(call_site, 'Performance.getMetrics', cdp_session.send('Performance.getMetrics'))
+      return {metric['name']: metric['value'] for metric in result['metrics']}
+    except Exception as e:  # Closed page, navigation in progress ... no sample this time
+      self._cdp_sessions.pop(page, None)
+      logger.debug(f"Performance sampler: couldn't get the metrics of {page.url}: {type(e).__name__}: {e}")
+      return None
+
+  @asynccontextmanager
+  async def measure(self, page: Any, kind: str, label: str) -> AsyncIterator[None]:
+    before, start = await self._metrics(page), time.perf_counter()
+    try:
+      yield
+    finally:
+      wall_ms = (time.perf_counter() - start) * 1000
+      after = await self._metrics(page)
+      if before and after:
+        self._add_sample(page, kind, label, wall_ms, before, after)
+
+  def _add_sample(self, page: Any, kind: str, label: str, wall_ms: float, before: Dict[str, float], after: Dict[str, float]):
+    def delta(name: str) -> float:
+      return after.get(name, 0.0) - before.get(name, 0.0)
+
+    self.samples.append(PerformanceSample(
+      step=self.current_step,
+      kind=kind,
+      label=label,
+      site=urlparse(page.url).hostname or page.url,
+      wall_ms=round(wall_ms, 1),
+      cpu_ms=round(delta(TASK_DURATION) * 1000, 1),
+      script_ms=round(delta(SCRIPT_DURATION) * 1000, 1),
+      layout_ms=round(delta(LAYOUT_DURATION) * 1000, 1),
+      layouts=int(delta(LAYOUT_COUNT)),
+      style_recalcs=int(delta(RECALC_STYLE_COUNT)),
+      js_heap_mb=round(after.get(JS_HEAP_USED, 0.0) / 1024 / 1024, 2),
+      js_heap_delta_mb=round(delta(JS_HEAP_USED) / 1024 / 1024, 2),
+      nodes=int(after.get(NODES, 0)),
+      nodes_delta=int(delta(NODES)),
+    ))
+
+  def step_samples(self, step: int) -> List[Dict[str, Any]]:
+    return [asdict(sample) for sample in self.samples if sample.step == step]
+
+  def aggregates(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+    """Totals and means by site and by 'kind:label' (e.g. 'action:click_element_by_index'), most expensive (CPU) first."""
+    def aggregate(key_of) -> Dict[str, Dict[str, float]]:
+      groups: Dict[str, List[PerformanceSample]] = {}
+      for sample in self.samples:
+        groups.setdefault(key_of(sample), []).append(sample)
+      rows = {key: {
+        'count': len(samples),
+        'cpu_ms_total': round(sum(s.cpu_ms for s in samples), 1),
+        'cpu_ms_mean': round(sum(s.cpu_ms for s in samples) / len(samples), 1),
+        'wall_ms_mean': round(sum(s.wall_ms for s in samples) / len(samples), 1),
+        'layouts_mean': round(sum(s.layouts for s in samples) / len(samples), 1),
+        'js_heap_mb_max': max(s.js_heap_mb for s in samples),
+        'nodes_max': max(s.nodes for s in samples),
+      } for key, samples in groups.items()}
+      return dict(sorted(rows.items(), key=lambda item: item[1]['cpu_ms_total'], reverse=True))
+
+    return {'by_site': aggregate(lambda s: s.site), 'by_operation': aggregate(lambda s: f"{s.kind}:{s.label}")}
+
+  def history_with_metrics(self, history: Any) -> Dict[str, Any]:
+    """AgentHistoryList dump where every step carries its 'performance' samples (matched by metadata.step_number)."""
+    dump = history.model_dump()
+    for item, history_item in zip(dump['history'], history.history):
+      step = history_item.metadata.step_number if history_item.metadata else None
+      item['performance'] = self.step_samples(step) if step is not None else []
+    dump['performance_aggregates'] = self.aggregates()
+    return dump
+
+  def save_history(self, history: Any, path: str):
+    with open(path, 'w', encoding='utf-8') as f:
+      json.dump(self.history_with_metrics(history), f, indent=2, default=str)
+
+  def export(self, path: str):
+    with open(path, 'w', encoding='utf-8') as f:
+      json.dump({'samples': [asdict(sample) for sample in self.samples], 'aggregates': self.aggregates()}, f, indent=2)
+
+
+@asynccontextmanager
+async def measure_performance(page: Any, kind: str, label: str) -> AsyncIterator[None]:
+  """Samples around the block when the page's context is being watched, does nothing otherwise."""
+  sampler = PerformanceSampler.get(page.context) if page is not None else None
+  if sampler is None:
+    yield
+    return
+  async with sampler.measure(page, kind, label):
+    yield
+
+
+async def sample_performance(page: Any, kind: str, label: str, awaitable: Awaitable[T]) -> T:
+  async with measure_performance(page, kind, label):
+    return await awaitable
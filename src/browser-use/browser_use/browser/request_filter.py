@@ -0,0 +1,155 @@
+import logging
+import re
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Tuple
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+# Challenge providers check resources of their own (images, fonts, scripts, beacons ...) and blocking any of them is the quickest way of
+# failing the challenge. Everything coming from these hosts (or requested by a frame loaded from them) is never filtered ...
+CHALLENGE_ALLOWLIST_HOSTS: Tuple[str, ...] = (
+  'challenges.cloudflare.com',
+  'turnstile.cloudflare.com',
+  'hcaptcha.com',
+  'recaptcha.net',
+  'arkoselabs.com',
+  'funcaptcha.com',
+  'geetest.com',
+  'datadome.co',
+  'perimeterx.net',
+)
+# ... and neither are the challenge endpoints served from the protected site itself
+CHALLENGE_ALLOWLIST_URL_PATTERN = re.compile(r'/cdn-cgi/|/recaptcha/|/turnstile/|captcha', re.IGNORECASE)
+
+# Blocked requests never download anything: the bytes saved are estimated with typical sizes per resource type ...
+ESTIMATED_BYTES_BY_RESOURCE_TYPE: Dict[str, int] = {
+  'image': 40_000,
+  'media': 500_000,
+  'font': 50_000,
+  'stylesheet': 30_000,
+  'script': 60_000,
+}
+DEFAULT_ESTIMATED_BYTES = 5_000
+
+TRACKER_HOSTS: Tuple[str, ...] = (
+  'google-analytics.com',
+  'googletagmanager.com',
+  'doubleclick.net',
+  'googlesyndication.com',
+  'facebook.net',
+  'connect.facebook.net',
+  'hotjar.com',
+  'segment.io',
+  'segment.com',
+  'mixpanel.com',
+  'amplitude.com',
+  'clarity.ms',
+  'scorecardresearch.com',
+  'taboola.com',
+  'outbrain.com',
+)
+
+
+def host_matches(host: str, suffixes: Iterable[str]) -> bool:
+  return any(host == suffix or host.endswith('.' + suffix) for suffix in suffixes)
+
+
+@dataclass
+class FilterRule:
+  """Blocks the requests matching ALL the criteria given (resource types, host suffixes and/or a URL regex)."""
+  name: str
+  resource_types: FrozenSet[str] = frozenset()
+  hosts: Tuple[str, ...] = ()
+  url_pattern: Optional[str] = None
+  blocked: int = 0
+  bytes_saved: int = 0
+  _compiled_pattern: Optional[re.Pattern] = field(default=None, init=False, repr=False)
+
+  def __post_init__(self):
+    self.resource_types = frozenset(self.resource_types)
+    self.hosts = tuple(self.hosts)
+    self._compiled_pattern = re.compile(self.url_pattern) if self.url_pattern else None
+
+  def matches(self, resource_type: str, host: str, url: str) -> bool:
+    if not (self.resource_types or self.hosts or self._compiled_pattern):
+      return False  # A rule without criteria would block everything, that's never what you want ...
+    if self.resource_types and resource_type not in self.resource_types:
+      return False
+    if self.hosts and not host_matches(host, self.hosts):
+      return False
+    if self._compiled_pattern and not self._compiled_pattern.search(url):
+      return False
+    return True
+
+
+def default_rules() -> List[FilterRule]:
+  return [
+    FilterRule('images', resource_types=frozenset({'image'})),
+    FilterRule('media', resource_types=frozenset({'media'})),
+    FilterRule('fonts', resource_types=frozenset({'font'})),
+    FilterRule('trackers', hosts=TRACKER_HOSTS),
+  ]
+
+
+class RequestFilter:
+  """
+  Request filtering for the stealth contexts: images, media, fonts and third-party trackers are aborted (by default) except when
+  they belong to a challenge provider. Documents, scripts and XHR/fetch are only blocked by rules that explicitly target them.
+    request_filter = RequestFilter()  # or RequestFilter(rules=[FilterRule('no-css', resource_types={'stylesheet'})])
+    agent = await Agent.create_stealth_agent(task, llm, request_filter=request_filter)
+    ...
+    print(request_filter.stats())
+  """
+
+  def __init__(self, rules: Optional[List[FilterRule]] = None, allowlist_hosts: Iterable[str] = (),
+               allowlist_url_pattern: Optional[str] = None):
+    self.rules = default_rules() if rules is None else rules
+    self.allowlist_hosts = CHALLENGE_ALLOWLIST_HOSTS + tuple(allowlist_hosts)
+    self.allowlist_url_pattern = re.compile(allowlist_url_pattern) if allowlist_url_pattern else None
+    self.allowed = 0
+
+  def is_allowlisted(self, url: str, host: str, frame_url: Optional[str] = None) -> bool:
+    if host_matches(host, self.allowlist_hosts) or CHALLENGE_ALLOWLIST_URL_PATTERN.search(url):
+      return True
+    if self.allowlist_url_pattern and self.allowlist_url_pattern.search(url):
+      return True
+    # Whatever a challenge frame asks for is part of the challenge ...
+    return bool(frame_url) and host_matches(urlparse(frame_url).hostname or '', self.allowlist_hosts)
+
+  def match(self, url: str, resource_type: str, frame_url: Optional[str] = None) -> Optional[FilterRule]:
+    host = urlparse(url).hostname or ''
+    if self.is_allowlisted(url, host, frame_url):
+      return None
+    return next((rule for rule in self.rules if rule.matches(resource_type, host, url)), None)
+
+  async def attach(self, browser_context: Any):
+    await browser_context.route('**/*', self._handle_route)
+
+  async def detach(self, browser_context: Any):
+    await browser_context.unroute('**/*', self._handle_route)
+
+  async def _handle_route(self, route: Any):
+    request = route.request
+    try:
+      frame_url = request.frame.url
+    except Exception:  # Service workers' requests don't have a frame ...
+      frame_url = None
+
+    rule = self.match(request.url, request.resource_type, frame_url)
+    if rule is None:
+      self.allowed += 1
+      await route.fallback()
+      return
+
+    rule.blocked += 1
+    rule.bytes_saved += ESTIMATED_BYTES_BY_RESOURCE_TYPE.get(request.resource_type, DEFAULT_ESTIMATED_BYTES)
+    logger.debug(f"Request blocked by rule [{rule.name}]: {request.resource_type} {request.url}")
+    await route.abort('blockedbyclient')
+
+  def stats(self) -> Dict[str, Any]:
+    return {
+      'allowed': self.allowed,
+      'rules': {rule.name: {'blocked': rule.blocked, 'estimated_bytes_saved': rule.bytes_saved} for rule in self.rules},
+    }
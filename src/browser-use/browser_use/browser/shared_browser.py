@@ -0,0 +1,236 @@
+import asyncio
+import logging
+
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import psutil
+
+from browser_use.browser.session import BrowserSession
+from browser_use.browser.stealth_pool import PooledBrowserSession, stealth_browser_profile
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _SharedBrowser:
+  browser: Any
+  contexts_created: int = 0
+  open_contexts: int = 0
+  draining: bool = False  # No new contexts: it'll be closed as soon as its last context is released
+  # Last JS heap measured for each open context (bytes), keyed by lease
+  context_memory: Dict[object, float] = field(default_factory=dict)
+  rss: float = 0.0  # Resident memory of all the browser's processes (bytes) at the last acquire()
+
+  @property
+  def memory(self) -> float:
+    return sum(self.context_memory.values())
+
+
+@dataclass
+class _Lease:
+  shared_browser: _SharedBrowser
+  browser_context: Any
+
+
+class SharedStealthBrowser:
+  """
+  Many isolated stealth sessions on a single patchright Chromium process, each one with its own browser_context:
+    shared = SharedStealthBrowser(max_concurrent_contexts=10)
+    agents = [await Agent.create_stealth_agent(task, llm, browser_pool=shared) for task in tasks]
+  - Admission control: at most 'max_concurrent_contexts' sessions at a time, the rest wait in acquire().
+  - Memory accounting: the JS heap of the pages of every context (CDP Performance.getMetrics), see measure()/memory_report().
+  - Recycling: after 'max_contexts_per_browser' contexts or when the resident memory of the browser's processes (browser,
+    renderers, GPU ...) goes over 'memory_limit_mb' the browser is drained (new sessions go to a fresh one) and closed when its
+    last context is released. The memory is sampled by every acquire(), right before deciding where the new context goes.
+  """
+
+  def __init__(self, max_concurrent_contexts: int = 8, max_contexts_per_browser: int = 50, memory_limit_mb: Optional[float] = 4096,
+               headless: bool = True, **browser_profile_kwargs: Any):
+    self.max_concurrent_contexts = max_concurrent_contexts
+    self.max_contexts_per_browser = max_contexts_per_browser
+    self.memory_limit_mb = memory_limit_mb
+    self.headless = headless
+    self.browser_profile_kwargs = browser_profile_kwargs
+    self._patchright: Any = None
+    self._current: Optional[_SharedBrowser] = None
+    self._browsers: List[_SharedBrowser] = []
+    self._leases: Dict[object, _Lease] = {}  # PooledBrowserSession._lease => _Lease
+    self._admission = asyncio.Semaphore(max_concurrent_contexts)
+    self._lock = asyncio.Lock()
+
+  async def _browser_for_new_context(self) -> _SharedBrowser:
+    async with self._lock:
+      if self._patchright is None:
+        from patchright.async_api import async_playwright as async_patchright
+        self._patchright = await async_patchright().start()
+
+      current = self._current
+      if current and not current.draining and current.browser.is_connected() and self.memory_limit_mb:
+        rss = await self._sample_rss(current)
+        if rss > self.memory_limit_mb * 1024 * 1024:
+          self._drain(current, f"{rss / 1024 / 1024:.0f} MB resident")
+          if current.open_contexts == 0:  # No release() left to close it ...
+            await self._close_browser(current)
+      if current and (current.draining or not current.browser.is_connected()):
+        current = None
+      if current is None:
+        current = _SharedBrowser(await self._patchright.chromium.launch(headless=self.headless))
+        self._browsers.append(current)
+        self._current = current
+        logger.info(f"Shared stealth browser: launched browser #{len(self._browsers)} ...")
+
+      current.contexts_created += 1
+      current.open_contexts += 1
+      if current.contexts_created >= self.max_contexts_per_browser:
+        self._drain(current, f"{current.contexts_created} contexts created")
+
+      return current
+
+  def _drain(self, shared_browser: _SharedBrowser, reason: str):
+    if not shared_browser.draining:
+      logger.info(f"Shared stealth browser: recycling browser ({reason}) ...")
+      shared_browser.draining = True
+    if self._current is shared_browser:
+      self._current = None
+
+  @staticmethod
+  async def _sample_rss(shared_browser: _SharedBrowser) -> float:
+    """Resident memory (bytes) of every process of the browser: what the machine runs out of, not just the pages' JS heap."""
+    try:
+      cdp_session = await shared_browser.browser.new_browser_cdp_session()
+      try:
+        processes = (await cdp_session.send('SystemInfo.getProcessInfo'))['processInfo']
+      finally:
+        await cdp_session.detach()
+    except Exception as e:
+      logger.debug(f"Shared stealth browser: couldn't list the browser processes: {type(e).__name__}: {e}")
+      return shared_browser.rss
+
+    rss = 0.0
+    for process in processes:
+      try:
+        rss += psutil.Process(process['id']).memory_info().rss
+      except psutil.Error:  # Gone already, or someone else's ...
+        pass
+    shared_browser.rss = rss
+    return rss
+
+  async def acquire(self) -> BrowserSession:
+    await self._admission.acquire()
+    try:
+      shared_browser = await self._browser_for_new_context()
+      try:
+        browser_context = await shared_browser.browser.new_context()
+        page = await browser_context.new_page()
+      except Exception:
+        shared_browser.open_contexts -= 1
+        raise
+    except Exception:
+      self._admission.release()
+      raise
+
+    browser_session = PooledBrowserSession(
+      playwright=self._patchright,
+      browser=shared_browser.browser,
+      browser_context=browser_context,
+      agent_current_page=page,
+      # keep_alive: the browser is shared, a session must never close it ...
+      browser_profile=stealth_browser_profile(keep_alive=True, **self.browser_profile_kwargs),
+    )
+    browser_session._pool, browser_session._lease = self, object()
+    self._leases[browser_session._lease] = _Lease(shared_browser, browser_context)
+    try:
+      # Agent() refuses keep_alive sessions that aren't initialized: it's connected to the new context here ...
+      await browser_session.start()
+    except BaseException:
+      await self.release(browser_session)
+      raise
+
+    return browser_session
+
+  @staticmethod
+  def _lease_key(browser_session: BrowserSession) -> Optional[object]:
+    # The agent's model_copy() of the session carries the same lease ...
+    return getattr(browser_session, '_lease', None)
+
+  async def measure(self, browser_session: BrowserSession) -> float:
+    """JS heap used (bytes) by the pages of the session's context (the recycling goes by the processes' resident memory)."""
+    key = self._lease_key(browser_session)
+    lease = self._leases.get(key)
+    if lease is None:
+      return 0.0
+    return await self._measure_lease(key, lease)
+
+  async def _measure_lease(self, key: object, lease: _Lease) -> float:
+    used = 0.0
+    for page in list(lease.browser_context.pages):
+      try:
+        cdp_session = await lease.browser_context.new_cdp_session(page)
+        try:
+          await cdp_session.send('Performance.enable')
+          metrics = (await cdp_session.send('Performance.getMetrics'))['metrics']
+          used += next((metric['value'] for metric in metrics if metric['name'] == 'JSHeapUsedSize'), 0.0)
+        finally:
+          await cdp_session.detach()
+      except Exception as e:
+        logger.debug(f"Shared stealth browser: couldn't measure page {page.url}: {type(e).__name__}: {e}")
+
+    lease.shared_browser.context_memory[key] = used
+
+    return used
+
+  def memory_report(self) -> List[Dict[str, Any]]:
+    return [{
+      'browser': i,
+      'open_contexts': shared_browser.open_contexts,
+      'contexts_created': shared_browser.contexts_created,
+      'draining': shared_browser.draining,
+      'memory_mb': round(shared_browser.memory / 1024 / 1024, 1),
+      'rss_mb': round(shared_browser.rss / 1024 / 1024, 1),
+    } for i, shared_browser in enumerate(self._browsers)]
+
+  async def release(self, browser_session: BrowserSession):
+    key = self._lease_key(browser_session)
+    lease = self._leases.pop(key, None)  # Popped first: the session and its copies release it only once ...
+    if lease is None:
+      return
+
+    shared_browser = lease.shared_browser
+    try:
+      await lease.browser_context.close()
+    except Exception as e:
+      logger.debug(f"Shared stealth browser: error closing a context: {type(e).__name__}: {e}")
+    finally:
+      shared_browser.open_contexts -= 1
+      shared_browser.context_memory.pop(key, None)
+      self._admission.release()
+
+    if shared_browser.draining and shared_browser.open_contexts == 0:
+      await self._close_browser(shared_browser)
+
+  async def _close_browser(self, shared_browser: _SharedBrowser):
+    if shared_browser in self._browsers:
+      self._browsers.remove(shared_browser)
+    try:
+      await shared_browser.browser.close()
+    except Exception as e:
+      logger.debug(f"Shared stealth browser: error closing a browser: {type(e).__name__}: {e}")
+
+  @asynccontextmanager
+  async def session(self) -> AsyncIterator[BrowserSession]:
+    browser_session = await self.acquire()
+    try:
+      yield browser_session
+    finally:
+      await browser_session.stop()
+
+  async def close(self):
+    for shared_browser in list(self._browsers):
+      await self._close_browser(shared_browser)
+    self._leases.clear()
+    self._current = None
+    if self._patchright:
+      await self._patchright.stop()
+      self._patchright = None
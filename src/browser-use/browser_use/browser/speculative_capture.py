@@ -0,0 +1,83 @@
+import asyncio
+import logging
+import weakref
+
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from browser_use.attachments import Attachment
+
+logger = logging.getLogger(__name__)
+
+
+class SpeculativeCapture(Attachment):
+  """
+  Pipelined steps: the state of step N+1 starts being captured (page settling included) as soon as the actions of step N
+  are done, while the agent is still closing step N (history, step callbacks, storage state ...):
+    browser_session = await BrowserSession.create_stealth_browser_session(pipelined_steps=True)
+  A speculative capture is thrown away when any frame of its page navigates after it started (the state may be from
+  before the navigation), when the agent's page changes or when it fails: the step then captures as usual.
+  The LLM call of a step needs that step's state, so the capture can't overlap with it: only the work around it can.
+  """
+  def __init__(self):
+    self.navigations = 0
+    self.started = self.used = self.discarded = 0
+    self._task: Optional['asyncio.Future[Any]'] = None
+    self._page: Any = None
+    self._key: Any = None
+    self._navigations_at_start = 0
+    self._listened_pages: 'weakref.WeakSet[Any]' = weakref.WeakSet()
+
+  def _on_frame_navigated(self, frame: Any):
+    self.navigations += 1
+
+  def start(self, page: Any, key: Any, capture: Callable[[], Awaitable[Any]]):
+    """Starts capture() in the background. 'key' (the capture options) must match the one take() gets."""
+    self.discard()
+    if page not in self._listened_pages:
+      page.on('framenavigated', self._on_frame_navigated)
+      self._listened_pages.add(page)
+    self._page, self._key, self._navigations_at_start = page, key, self.navigations
+    self._task = asyncio.ensure_future(capture())
+    # Nobody may ever await it (the agent is done, the browser closes ...): no 'exception was never retrieved' noise
+    self._task.add_done_callback(lambda task: task.cancelled() or task.exception())
+    self.started += 1
+
+  def _stale(self, page: Any, key: Any) -> Optional[str]:
+    if page is not self._page:
+      return 'the page changed'
+    if key != self._key:
+      return 'captured with other options'
+    if self.navigations != self._navigations_at_start:
+      return 'navigation after it started'
+    return None
+
+  async def take(self, page: Any, key: Any) -> Optional[Any]:
+    """The speculative state if it's still good (waiting for it to finish), None otherwise."""
+    task = self._task
+    if task is None:
+      return None
+    reason = self._stale(page, key)
+    if reason is None:
+      try:
+        state = await task
+      except Exception as e:
+        reason = f"{type(e).__name__}: {e}"
+      else:
+        reason = self._stale(page, key)  # Navigating while it was being captured ...
+        if reason is None:
+          self._task = None
+          self.used += 1
+          return state
+
+    self.discard()
+    logger.debug(f"Speculative state capture thrown away: {reason} ...")
+    return None
+
+  def discard(self):
+    task, self._task = self._task, None
+    if task is not None:
+      task.cancel()
+      self.discarded += 1
+
+  def stats(self) -> Dict[str, int]:
+    return {'started': self.started, 'used': self.used, 'discarded': self.discarded}
@@ -0,0 +1,204 @@
+import asyncio
+import logging
+
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Union
+
+from pydantic import PrivateAttr
+
+from browser_use.browser.profile import BrowserChannel, BrowserProfile
+from browser_use.browser.session import BrowserSession
+
+logger = logging.getLogger(__name__)
+
+ACQUIRE_TIMEOUT = 300  # Seconds waiting for a free browser before giving up
+
+
+def stealth_browser_profile(**kwargs: Any) -> BrowserProfile:
+  # No fixed sleeps before capturing the state, BrowserSession.wait_for_page_ready decides when the page has settled ...
+  kwargs = {'minimum_wait_page_load_time': 0, 'wait_for_network_idle_page_load_time': 0, **kwargs}
+  # I don't care about what they say about CHROMIUM stealthiness, so far it's been good enough for me ...
+  return BrowserProfile(channel=BrowserChannel.CHROMIUM, stealth=True, **kwargs)
+
+
+@dataclass
+class _WarmSlot:
+  browser: Any
+  browser_context: Any
+  page: Any
+
+
+class PooledBrowserSession(BrowserSession):
+  """
+  A BrowserSession borrowed from a StealthBrowserPool (or a SharedStealthBrowser): stopping it (Agent.close() does it) gives it back
+  to its pool.
+  Agent() works on a model_copy() of the session: the lease (a plain token, copied along with it) is what identifies the
+  borrowed browser/context, not the session object.
+  """
+  _pool: Optional[Any] = PrivateAttr(default=None)  # Anything with an async release(browser_session)
+  _lease: Optional[object] = PrivateAttr(default=None)
+
+  async def stop(self, *args: Any, **kwargs: Any) -> None:
+    if self._pool:
+      pool, self._pool = self._pool, None
+      await pool.release(self)
+
+  async def kill(self, *args: Any, **kwargs: Any) -> None:
+    await self.stop()
+
+
+class StealthBrowserPool:
+  """
+  Keeps 'size' patchright Chromium instances warm, each one with a ready context and page, so handing out a stealth session
+  costs milliseconds instead of a cold browser start:
+    pool = StealthBrowserPool(size=2)
+    await pool.start()
+    agent = await Agent.create_stealth_agent(task, llm, browser_pool=pool)
+  Released sessions get their context closed (cookies, storage and pages go with it) and a fresh one is prepared in the background.
+  """
+
+  def __init__(self, size: int = 2, headless: bool = True, acquire_timeout: Optional[float] = ACQUIRE_TIMEOUT,
+               **browser_profile_kwargs: Any):
+    self.size = size
+    self.headless = headless
+    self.acquire_timeout = acquire_timeout
+    self.browser_profile_kwargs = browser_profile_kwargs
+    self._patchright: Any = None
+    # A warm slot or the error that prevented warming one up: acquire() raises it instead of waiting forever ...
+    self._ready: asyncio.Queue[Union[_WarmSlot, Exception]] = asyncio.Queue()
+    self._in_use: Dict[object, _WarmSlot] = {}  # Lease => slot
+    self._browsers: List[Any] = []
+    self._background_tasks: Set[asyncio.Task] = set()
+    self._start_lock = asyncio.Lock()
+    self._closed = False
+
+  @property
+  def started(self) -> bool:
+    return self._patchright is not None
+
+  async def start(self, wait: bool = False) -> 'StealthBrowserPool':
+    async with self._start_lock:
+      if not self.started:
+        from patchright.async_api import async_playwright as async_patchright
+        self._patchright = await async_patchright().start()
+        for _ in range(self.size):
+          self._spawn(self._launch_slot())
+
+    if wait:
+      await asyncio.gather(*self._background_tasks)
+    return self
+
+  def _spawn(self, coroutine) -> asyncio.Task:
+    task = asyncio.create_task(coroutine)
+    self._background_tasks.add(task)
+    task.add_done_callback(self._background_tasks.discard)
+    return task
+
+  async def _launch_slot(self, browser: Any = None):
+    """A warm slot on 'browser' (a new one by default) for the ready queue, or the error for whoever waits for it."""
+    try:
+      if browser is None:
+        browser = await self._patchright.chromium.launch(headless=self.headless)
+        self._browsers.append(browser)
+      slot = await self._prepare_slot(browser)
+    except Exception as e:
+      logger.warning(f"Stealth browser pool: couldn't warm up a browser: {type(e).__name__}: {e}")
+      await self._ready.put(e)
+      return
+    await self._ready.put(slot)
+    logger.debug(f"Stealth browser pool: browser warmed up ({self._ready.qsize()} ready) ...")
+
+  @staticmethod
+  async def _prepare_slot(browser) -> _WarmSlot:
+    browser_context = await browser.new_context()
+    page = await browser_context.new_page()
+    return _WarmSlot(browser, browser_context, page)
+
+  async def acquire(self) -> BrowserSession:
+    if self._closed:
+      raise RuntimeError("The stealth browser pool is closed ...")
+    if not self.started:
+      await self.start()
+
+    while True:
+      try:
+        slot = await asyncio.wait_for(self._ready.get(), self.acquire_timeout)
+      except asyncio.TimeoutError:
+        raise TimeoutError(f"Stealth browser pool: no browser free after {self.acquire_timeout}s ...") from None
+      if isinstance(slot, Exception):
+        self._spawn(self._launch_slot())  # The slot isn't lost: the next acquire() gets another try ...
+        raise RuntimeError(f"Stealth browser pool: couldn't warm up a browser: {type(slot).__name__}: {slot}") from slot
+      if slot.browser.is_connected():
+        break
+      # The browser crashed/was closed while waiting in the pool, replacing it ...
+      logger.warning("Stealth browser pool: discarding a disconnected browser ...")
+      self._forget_browser(slot.browser)
+      self._spawn(self._launch_slot())
+
+    browser_session = PooledBrowserSession(
+      playwright=self._patchright,
+      browser=slot.browser,
+      browser_context=slot.browser_context,
+      agent_current_page=slot.page,
+      # keep_alive: the browser belongs to the pool, nobody else should close it ...
+      browser_profile=stealth_browser_profile(keep_alive=True, **self.browser_profile_kwargs),
+    )
+    browser_session._pool, browser_session._lease = self, object()
+    self._in_use[browser_session._lease] = slot
+    try:
+      # Agent() refuses keep_alive sessions that aren't initialized: it's connected to the warm objects here ...
+      await browser_session.start()
+    except BaseException:
+      await self.release(browser_session)
+      raise
+
+    return browser_session
+
+  async def release(self, browser_session: BrowserSession):
+    slot = self._in_use.pop(getattr(browser_session, '_lease', None), None)
+    if slot is None:
+      return
+    self._spawn(self._recycle_slot(slot))
+
+  async def _recycle_slot(self, slot: _WarmSlot):
+    try:
+      await slot.browser_context.close()  # Cookies, storage and pages are thrown away with the context ...
+    except Exception as e:
+      logger.debug(f"Stealth browser pool: error closing a released context: {type(e).__name__}: {e}")
+
+    if self._closed:
+      return
+    if slot.browser.is_connected():
+      await self._launch_slot(slot.browser)
+    else:
+      self._forget_browser(slot.browser)
+      await self._launch_slot()
+
+  def _forget_browser(self, browser):
+    if browser in self._browsers:
+      self._browsers.remove(browser)
+
+  @asynccontextmanager
+  async def session(self) -> AsyncIterator[BrowserSession]:
+    browser_session = await self.acquire()
+    try:
+      yield browser_session
+    finally:
+      await browser_session.stop()
+
+  async def close(self):
+    self._closed = True
+    for task in list(self._background_tasks):
+      task.cancel()
+    await asyncio.gather(*self._background_tasks, return_exceptions=True)
+    for browser in self._browsers:
+      try:
+        await browser.close()
+      except Exception as e:
+        logger.debug(f"Stealth browser pool: error closing a browser: {type(e).__name__}: {e}")
+    self._browsers.clear()
+    self._in_use.clear()
+    if self._patchright:
+      await self._patchright.stop()
+      self._patchright = None
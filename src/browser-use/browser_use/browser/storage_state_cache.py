@@ -0,0 +1,146 @@
+import contextlib
+import json
+import logging
+import os
+import re
+import tempfile
+import time
+
+from typing import Any, Dict, Iterable, List, Optional
+from urllib.parse import urlparse
+
+from browser_use.file_lock import file_lock
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 're-browser-use', 'storage-state')
+DEFAULT_MAX_AGE_SECONDS = 12 * 60 * 60
+
+# Restores the cached localStorage before any page script runs. Existing keys win: the site may have refreshed them already ...
+LOCAL_STORAGE_INIT_SCRIPT = """
+(entriesByOrigin => {
+  const entries = entriesByOrigin[location.origin];
+  if (!entries) return;
+  try {
+    for (const { name, value } of entries)
+      if (localStorage.getItem(name) === null) localStorage.setItem(name, value);
+  } catch (e) {}
+})(%s);
+"""
+
+
+def _host_key(domain_or_url: str) -> str:
+  host = urlparse(domain_or_url).hostname if '://' in domain_or_url else domain_or_url
+  return (host or '').lstrip('.').lower()
+
+
+async def apply_storage_state(browser_context: Any, storage_state: Dict[str, Any]) -> int:
+  """A Playwright storage_state dict into an already created context. Returns the cookies added."""
+  cookies, origins = storage_state.get('cookies', []), storage_state.get('origins', [])
+  if cookies:
+    await browser_context.add_cookies(cookies)
+  if origins:
+    entries_by_origin = {origin['origin']: origin.get('localStorage', []) for origin in origins}
+    await browser_context.add_init_script(LOCAL_STORAGE_INIT_SCRIPT % json.dumps(entries_by_origin))
+  logger.debug(f"Storage state: {len(cookies)} cookies and {len(origins)} origins restored ...")
+
+  return len(cookies)
+
+
+class StorageStateCache:
+  """
+  On-disk cache of the browser storage state (cookies, e.g. Cloudflare's cf_clearance, and localStorage) keyed by host, so a
+  challenge solved in one run doesn't have to be solved again in the next ones:
+    cache = StorageStateCache()
+    agent = await Agent.create_stealth_agent(task, llm, storage_state_cache=cache)
+  A stealth session restores the valid entries when it's created, before its first navigation. Nothing has to intercept the
+  requests for that (which would take Chromium's HTTP cache away): the cookies are domain-scoped and the localStorage is
+  restored only on its own origin, each site only ever sees its own entries. Expired cookies are dropped when loading and
+  whole entries are ignored after 'max_age_seconds'. Every entry is written atomically under a file lock, the last writer wins.
+  """
+
+  def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_age_seconds: float = DEFAULT_MAX_AGE_SECONDS):
+    self.cache_dir = cache_dir
+    self.max_age_seconds = max_age_seconds
+    os.makedirs(cache_dir, exist_ok=True)
+
+  def _path(self, key: str) -> str:
+    return os.path.join(self.cache_dir, re.sub(r'[^a-z0-9.-]', '_', key) + '.json')
+
+  def _read_entry(self, path: str) -> Optional[Dict[str, Any]]:
+    try:
+      with open(path, encoding='utf-8') as f:
+        entry = json.load(f)
+    except (OSError, ValueError):
+      return None
+    if time.time() - entry.get('saved_at', 0) > self.max_age_seconds:
+      return None
+    return entry
+
+  def _write_entry(self, key: str, entry: Dict[str, Any]):
+    path = self._path(key)
+    with file_lock(path + '.lock'):
+      fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+      try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+          json.dump(entry, f)
+        os.replace(tmp_path, path)  # Readers never see a half written entry ...
+      except BaseException:
+        with contextlib.suppress(OSError):
+          os.remove(tmp_path)
+        raise
+
+  def _keys(self, hosts: Optional[Iterable[str]]) -> List[str]:
+    keys = [name[:-len('.json')] for name in os.listdir(self.cache_dir) if name.endswith('.json')]
+    if hosts is None:
+      return keys
+    wanted = [_host_key(host) for host in hosts]
+    # 'www.example.com' needs the cookies of 'example.com' as well ...
+    return [key for key in keys if any(host == key or host.endswith('.' + key) for host in wanted)]
+
+  def load(self, hosts: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+    """Playwright storage_state dict with the valid entries (all of them or the ones applying to 'hosts')."""
+    now = time.time()
+    cookies, origins = [], []
+    for key in self._keys(hosts):
+      entry = self._read_entry(self._path(key))
+      if not entry:
+        continue
+      # expires == -1 is a session cookie, bounded by max_age_seconds like the rest of the entry
+      cookies.extend(cookie for cookie in entry.get('cookies', []) if cookie.get('expires', -1) == -1 or cookie['expires'] > now)
+      origins.extend(entry.get('origins', []))
+
+    return {'cookies': cookies, 'origins': origins}
+
+  async def apply(self, browser_context: Any, hosts: Optional[Iterable[str]] = None) -> int:
+    """Adds the cached cookies to the context and restores the cached localStorage on page load. Returns the cookies added."""
+    return await apply_storage_state(browser_context, self.load(hosts))
+
+  async def save(self, browser_context: Any):
+    storage_state = await browser_context.storage_state()
+    entries: Dict[str, Dict[str, Any]] = {}
+    for cookie in storage_state.get('cookies', []):
+      entries.setdefault(_host_key(cookie['domain']), {'cookies': [], 'origins': []})['cookies'].append(cookie)
+    for origin in storage_state.get('origins', []):
+      entries.setdefault(_host_key(origin['origin']), {'cookies': [], 'origins': []})['origins'].append(origin)
+
+    saved_at = time.time()
+    for key, entry in entries.items():
+      if key:
+        self._write_entry(key, {'saved_at': saved_at, **entry})
+
+  def as_step_callback(self, browser_session: Any):
+    """Agent 'register_new_step_callback' saving the storage state at every step (a solved challenge gets cached right away)."""
+    async def save_storage_state(browser_state_summary: Any, model_output: Any, n_steps: int):
+      try:
+        await self.save(browser_session.browser_context)
+      except Exception as e:
+        logger.debug(f"Storage state cache: couldn't save the storage state: {type(e).__name__}: {e}")
+
+    return save_storage_state
+
+  def clear(self):
+    for name in os.listdir(self.cache_dir):
+      if name.endswith('.json') or name.endswith('.lock'):
+        with contextlib.suppress(OSError):
+          os.remove(os.path.join(self.cache_dir, name))
@@ -0,0 +1,336 @@
+import contextvars
+import hashlib
+import logging
+import os
+
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from browser_use.attachments import Attachment
+from browser_use.dom.views import DOMElementNode, DOMTextNode
+
+logger = logging.getLogger(__name__)
+
+DOM_TOKEN_BUDGET = int(os.environ.get('RE_BROWSER_USE_DOM_TOKEN_BUDGET', '0'))  # 0: the upstream serialization, untouched
+CHARS_PER_TOKEN = 4  # Rough, but the budget is about orders of magnitude, not exact counts ...
+PLACEHOLDER_RESERVE = 0.1  # Budget fraction kept for the placeholders and the footer
+REPEAT_MIN, REPEAT_KEEP = 4, 2  # In runs of at least REPEAT_MIN similar siblings, the ones after REPEAT_KEEP ...
+REPEAT_PENALTY = 3  # ... only make it when there's budget left
+MAX_TEXT_LENGTH, MAX_ATTRIBUTE_LENGTH = 100, 50
+MAX_EXPANDED_SECTIONS = 64
+PINNED_BUDGET_FRACTION = 0.5  # The expanded sections never take more than this of the budget: the rest of the page has to fit too
+MAX_FITTING_PASSES = 4
+STRONG_INTERACTIVE_TAGS = frozenset({'a', 'button', 'input', 'select', 'textarea', 'option', 'summary', 'label'})
+
+
+class ExpandedSections(Attachment):
+  """
+  The sections the agent asked to see in full with expand_dom_section: one set per controller (the one the action is
+  registered on), emptied when the agent working with it starts another task. The agent's steps activate them for the
+  serializations of their prompts (the asyncio task's context, like cdp_accounting's accountant):
+    ExpandedSections.activate(controller, task_key)
+  """
+  def __init__(self):
+    self._section_ids: 'OrderedDict[str, None]' = OrderedDict()
+    self._task_key: Any = None
+
+  @classmethod
+  def activate(cls, controller: Any, task_key: Any) -> Optional['ExpandedSections']:
+    """The controller's sections for the next serializations, emptied first when 'task_key' isn't the last one's."""
+    sections = cls.get(controller)
+    if sections is not None and sections._task_key != task_key:
+      sections.clear()
+      sections._task_key = task_key
+    _active_sections.set(sections)
+    return sections
+
+  def expand(self, section_id: str):
+    """The section is shown in full (and first) in the next serializations."""
+    self._section_ids.pop(section_id, None)
+    self._section_ids[section_id] = None
+    while len(self._section_ids) > MAX_EXPANDED_SECTIONS:
+      self._section_ids.popitem(last=False)
+
+  def clear(self):
+    self._section_ids.clear()
+
+  def __contains__(self, section_id: str) -> bool:
+    return section_id in self._section_ids
+
+
+_active_sections: contextvars.ContextVar[Optional[ExpandedSections]] = contextvars.ContextVar('active_expanded_sections', default=None)
+_NO_SECTIONS = ExpandedSections()
+
+
+def estimate_tokens(text: str) -> int:
+  return len(text) // CHARS_PER_TOKEN + 1
+
+
+def _section_id(key: str) -> str:
+  return 's' + hashlib.sha1(key.encode('utf-8')).hexdigest()[:6]
+
+
+def _cap(text: str, length: int) -> str:
+  return text if len(text) <= length else text[:length] + '...'
+
+
+@dataclass
+class _Entry:
+  order: int
+  depth: int
+  line: str
+  score: float
+  section: Optional[Tuple[str, str]]  # (section id, what it is) the entry gets hidden into
+  repeated: Optional[Tuple[str, str]] = None  # (section id, tag) when part of a repeated structure, after the first ones
+  repeated_item: int = 0  # Which of the repeated siblings
+  interactive: bool = False
+  frame_key: str = ''
+  frames_deep: int = 0
+  pinned: bool = False  # In an expanded section: always shown
+
+  @property
+  def hidden_as(self) -> Tuple[str, str]:
+    return self.repeated or self.section or (_section_id('|'), '<body>')
+
+
+_Repeat = Tuple[Tuple[str, str], int]  # ((section id, tag), item)
+
+
+def _element_line(node: DOMElementNode, include_attributes: Optional[List[str]], depth: int, text: str,
+                  capped: bool = True) -> str:
+  # Same shape as upstream's clickable_elements_to_string lines (exactly those when not capped): the agent doesn't have to
+  # learn two formats ...
+  text = _cap(text, MAX_TEXT_LENGTH) if capped else text
+  attributes: Dict[str, str] = {}
+  if include_attributes:
+    for name, value in node.attributes.items():
+      value = str(value)
+      if name not in include_attributes or (name == 'role' and value == node.tag_name):
+        continue
+      if name in ('aria-label', 'placeholder') and value.strip() == text.strip():
+        continue
+      attributes[name] = _cap(value, MAX_ATTRIBUTE_LENGTH) if capped else value
+  attributes_str = ' '.join(f"{name}='{value}'" for name, value in attributes.items())
+
+  indicator = f'*[{node.highlight_index}]*' if node.is_new else f'[{node.highlight_index}]'
+  line = f"{chr(9) * depth}{indicator}<{node.tag_name}"
+  if attributes_str:
+    line += f' {attributes_str}'
+  if text:
+    line += f"{'' if attributes_str else ' '}>{text}"
+  elif not attributes_str:
+    line += ' '
+  return line + ' />'
+
+
+def _signature(node: DOMElementNode) -> Tuple[Any, ...]:
+  return (node.tag_name, node.attributes.get('class'), node.attributes.get('role'),
+          tuple(child.tag_name for child in node.children if isinstance(child, DOMElementNode)))
+
+
+def _repeated_children(node: DOMElementNode, frame_key: str, expanded: ExpandedSections) -> Dict[int, '_Repeat']:
+  """id(child) -> the repeat section of the children that can collapse as 'more of the same' (runs of similar siblings)."""
+  collapsed: Dict[int, _Repeat] = {}
+  children = [child for child in node.children if isinstance(child, DOMElementNode)]
+  start = 0
+  while start < len(children):
+    end = start
+    while end + 1 < len(children) and _signature(children[end + 1]) == _signature(children[start]):
+      end += 1
+    run = children[start:end + 1]
+    if len(run) >= REPEAT_MIN:
+      section_id = _section_id(f"{frame_key}|{node.xpath}|repeat|{run[0].xpath}")
+      if section_id not in expanded:
+        for item, child in enumerate(run[REPEAT_KEEP:]):
+          collapsed[id(child)] = ((section_id, run[0].tag_name), item)
+    start = end + 1
+  return collapsed
+
+
+class _Collector:
+
+  def __init__(self, include_attributes: Optional[List[str]], expanded: ExpandedSections):
+    self.include_attributes = include_attributes
+    self.expanded = expanded
+    self.entries: List[_Entry] = []
+    self.upstream_lines: List[str] = []  # clickable_elements_to_string's, from the same walk
+    self.frame_sizes: Dict[str, int] = {}  # frame key -> interactive elements
+
+  def walk(self, root: DOMElementNode):
+    # (node, depth, frame key, frames deep, section, repeated section, pinned, dom depth) ... no recursion limit to worry about
+    stack: List[Tuple[Any, ...]] = [(root, 0, '', 0, None, None, False, 0)]
+    while stack:
+      node, depth, frame_key, frames_deep, section, repeated, pinned, dom_depth = stack.pop()
+      context = (frame_key, frames_deep, section, repeated, pinned)
+      if isinstance(node, DOMTextNode):
+        parent = node.parent
+        if parent and parent.highlight_index is None and parent.is_visible and parent.is_top_element:
+          self.upstream_lines.append(f"{chr(9) * depth}{node.text}")
+          if node.text.strip():
+            in_viewport = bool(getattr(node.parent, 'is_in_viewport', False))
+            self._add(depth, f"{chr(9) * depth}{_cap(node.text.strip(), MAX_TEXT_LENGTH)}", 2 if in_viewport else 0, context, False)
+        continue
+
+      child_depth = depth
+      if node.highlight_index is not None:
+        child_depth += 1
+        score = (4 if node.is_in_viewport else 0) + (2 if node.tag_name in STRONG_INTERACTIVE_TAGS or node.attributes.get('role') else 1)
+        score += 1 if node.is_new else 0
+        text = node.get_all_text_till_next_clickable_element(max_depth=1)
+        self.upstream_lines.append(_element_line(node, self.include_attributes, depth, text, capped=False))
+        self._add(depth, _element_line(node, self.include_attributes, depth, text), score, context, True)
+
+      child_frame_key, child_frames_deep, child_section = frame_key, frames_deep, section
+      if node.tag_name == 'iframe':
+        child_frame_key, child_frames_deep = f"{frame_key}/{node.xpath}", frames_deep + 1
+        child_section = (_section_id(f"{frame_key}|{node.xpath}"), f"<iframe{self._describe(node)}>")
+      elif node.shadow_root:
+        child_section = (_section_id(f"{frame_key}|{node.xpath}|shadow"), f"<{node.tag_name}> shadow root")
+      elif dom_depth == 1 and section is None:
+        # The regions of the page (header, nav, main, footer ...) are the sections of the top document ...
+        child_section = (_section_id(f"{frame_key}|{node.xpath}"), f"<{node.tag_name}{self._describe(node)}>")
+      child_pinned = pinned or (child_section is not None and child_section[0] in self.expanded)
+
+      collapsed = {} if child_pinned else _repeated_children(node, frame_key, self.expanded)
+      for child in reversed(node.children):
+        stack.append((child, child_depth, child_frame_key, child_frames_deep, child_section,
+                      collapsed.get(id(child), repeated), child_pinned, dom_depth + 1))
+
+  @staticmethod
+  def _describe(node: DOMElementNode) -> str:
+    for name in ('id', 'title', 'aria-label', 'role', 'src'):
+      if node.attributes.get(name):
+        return f" {name}={_cap(str(node.attributes[name]), MAX_ATTRIBUTE_LENGTH)}"
+    return ''
+
+  def _add(self, depth: int, line: str, score: float, context: Tuple[Any, ...], interactive: bool):
+    frame_key, frames_deep, section, repeated, pinned = context
+    if frames_deep and interactive:
+      self.frame_sizes[frame_key] = self.frame_sizes.get(frame_key, 0) + 1
+    score -= REPEAT_PENALTY if repeated else 0
+    self.entries.append(_Entry(len(self.entries), depth, line, score, section, repeated[0] if repeated else None,
+                               repeated[1] if repeated else 0, interactive, frame_key, frames_deep, pinned))
+
+
+def _frame_relevance(entry: _Entry, frame_sizes: Dict[str, int]) -> float:
+  if not entry.frames_deep:
+    return 0
+  # Small frames are widgets (a challenge checkbox, a login form): worth keeping. Big ones are embedded apps and ads ...
+  return 2 if frame_sizes.get(entry.frame_key, 0) <= 5 else -entry.frames_deep
+
+
+def _select(entries: List[_Entry], budget: float) -> set:
+  # Greedy by score (document order between equals): the expanded sections up to their share of the budget, the rest of
+  # the page, and what's left of the expanded sections if there's still room ...
+  shown = set()
+  used = 0
+  ranked = sorted(entries, key=lambda entry: (-entry.score, entry.order))
+  for pinned, limit in ((True, budget * PINNED_BUDGET_FRACTION), (False, budget), (True, budget)):
+    for entry in ranked:
+      cost = estimate_tokens(entry.line)
+      if entry.pinned != pinned or entry.order in shown or used + cost > limit:
+        continue
+      shown.add(entry.order)
+      used += cost
+  return shown
+
+
+def _render(entries: List[_Entry], shown: set) -> Tuple[List[str], int]:
+  lines: List[str] = []
+  hidden_elements = 0
+  index = 0
+  while index < len(entries):
+    entry = entries[index]
+    if entry.order in shown:
+      lines.append(entry.line)
+      index += 1
+      continue
+    # A run of hidden entries of the same section becomes one placeholder line ...
+    section = entry.hidden_as
+    end = index
+    while end + 1 < len(entries) and entries[end + 1].order not in shown and entries[end + 1].hidden_as == section:
+      end += 1
+    interactive = sum(1 for hidden in entries[index:end + 1] if hidden.interactive)
+    hidden_elements += interactive
+    if entry.repeated:
+      items = len({hidden.repeated_item for hidden in entries[index:end + 1]})
+      what = f"{items} more <{section[1]}> like the above ({interactive} interactive elements)"
+    else:
+      what = f"{section[1]}: {end + 1 - index} lines hidden ({interactive} interactive elements)"
+    lines.append(f"{chr(9) * entry.depth}[+{section[0]}] ... {what}")
+    index = end + 1
+
+  if hidden_elements:
+    total = sum(1 for entry in entries if entry.interactive)
+    lines.append(f"[{hidden_elements} of {total} interactive elements hidden to fit the prompt: the expand_dom_section action "
+                 f"shows a '[+section_id]' in full]")
+  return lines, hidden_elements
+
+
+def budgeted_clickable_elements_to_string(element_tree: DOMElementNode, include_attributes: Optional[List[str]], token_budget: int,
+                                          expanded_sections: Optional[ExpandedSections] = None) -> str:
+  """
+  The element list of the prompt fitting 'token_budget' (roughly): repeated siblings collapse into one placeholder and the
+  lines ranked lower (out of the viewport, weakly interactive, deep in big iframes) become '[+section]' placeholders. The
+  sections asked for with the expand_dom_section action are shown in full, up to PINNED_BUDGET_FRACTION of the budget.
+  """
+  collector = _Collector(include_attributes, expanded_sections or _NO_SECTIONS)
+  collector.walk(element_tree)
+  return _fit(collector, token_budget)
+
+
+def _fit(collector: _Collector, token_budget: int) -> str:
+  entries = collector.entries
+  for entry in entries:
+    entry.score += _frame_relevance(entry, collector.frame_sizes)
+
+  # The placeholders cost too: whatever they take over the reserve comes out of the next pass's budget ...
+  budget = token_budget * (1 - PLACEHOLDER_RESERVE)
+  for _ in range(MAX_FITTING_PASSES):
+    lines, hidden_elements = _render(entries, _select(entries, budget))
+    text = '\n'.join(lines)
+    overflow = estimate_tokens(text) - token_budget
+    if overflow <= 0 or budget <= 0:
+      break
+    budget -= overflow
+
+  logger.debug(f"Budgeted DOM serialization: {len(entries)} lines, {hidden_elements} interactive elements hidden, "
+               f"~{estimate_tokens(text)} tokens (budget {token_budget})")
+  return text
+
+
+def serialize_dom_state(element_tree: DOMElementNode, include_attributes: Optional[List[str]] = None,
+                        token_budget: Optional[int] = None, expanded_sections: Optional[ExpandedSections] = None) -> str:
+  """
+  Drop-in for element_tree.clickable_elements_to_string(include_attributes=...) in the agent prompt: the upstream string
+  when it fits the budget (RE_BROWSER_USE_DOM_TOKEN_BUDGET, off by default), the budgeted one otherwise. One walk of the
+  tree either way: the budgeted serializer's builds the upstream string too. The expanded sections are the active ones
+  (ExpandedSections.activate) unless given.
+  """
+  token_budget = DOM_TOKEN_BUDGET if token_budget is None else token_budget
+  if not token_budget:
+    return element_tree.clickable_elements_to_string(include_attributes=include_attributes)
+  expanded_sections = _active_sections.get() if expanded_sections is None else expanded_sections
+  collector = _Collector(include_attributes, expanded_sections or _NO_SECTIONS)
+  collector.walk(element_tree)
+  full = '\n'.join(collector.upstream_lines)
+  if estimate_tokens(full) <= token_budget:
+    return full
+  return _fit(collector, token_budget)
+
+
+def register_expand_action(controller: Any) -> ExpandedSections:
+  """Adds expand_dom_section to the controller: only useful when the budget is on, the placeholders point at it."""
+  from browser_use.agent.views import ActionResult
+
+  sections = ExpandedSections.attach(controller)
+
+  @controller.action("Show in full a part of the page hidden in the interactive elements list as '[+section_id]' (e.g. 's1a2b3c')")
+  async def expand_dom_section(section_id: str):
+    section_id = section_id.strip().lstrip('[+').rstrip(']')
+    sections.expand(section_id)
+    message = f"Section {section_id} will be shown in full in the next browser state"
+    return ActionResult(extracted_content=message, include_in_memory=True)
+
+  return sections
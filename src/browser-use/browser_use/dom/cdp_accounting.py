@@ -0,0 +1,174 @@
+import contextvars
+import json
+import logging
+import os
+
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Dict, Iterator, List, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+# Any non empty value logs a per-step summary of the protocol work done by the state capture (DEBUG level) ...
+CDP_ACCOUNTING_ENV_VAR = 'RE_BROWSER_USE_CDP_ACCOUNTING'
+
+T = TypeVar('T')
+
+
+@dataclass
+class CallSiteStats:
+  round_trips: int = 0
+  bytes: int = 0
+  methods: Dict[str, int] = field(default_factory=dict)
+
+
+@dataclass
+class StepStats:
+  step: int
+  call_sites: Dict[str, CallSiteStats] = field(default_factory=dict)
+
+  @property
+  def round_trips(self) -> int:
+    return sum(stats.round_trips for stats in self.call_sites.values())
+
+  @property
+  def bytes(self) -> int:
+    return sum(stats.bytes for stats in self.call_sites.values())
+
+
+def payload_size(payload: Any) -> int:
+  """Best effort size of a protocol payload: handles and other opaque objects count as 0 bytes."""
+  if payload is None:
+    return 0
+  if isinstance(payload, (bytes, bytearray)):
+    return len(payload)
+  if isinstance(payload, str):
+    return len(payload.encode('utf-8'))
+  if isinstance(payload, (dict, list, tuple, int, float, bool)):
+    try:
+      return len(json.dumps(payload))
+    except (TypeError, ValueError):
+      return 0
+  return 0
+
+
+class CdpAccountant:
+  """
+  Counts the CDP/Playwright protocol calls (round trips) and the payload bytes of every state capture, broken down by call site.
+  The calls are routed through 'track()' which awaits them and does the bookkeeping.
+  """
+  enabled = True
+
+  def __init__(self, max_kept_steps: Optional[int] = None):
+    self.max_kept_steps = max_kept_steps
+    self.steps: List[StepStats] = [StepStats(step=0)]
+    self._step_count = 0
+
+  @property
+  def current_step(self) -> StepStats:
+    return self.steps[-1]
+
+  def begin_step(self) -> int:
+    # Step 0 collects whatever happens outside a capture, there's no point in keeping it if it's empty ...
+    if len(self.steps) == 1 and not self.steps[0].call_sites:
+      self.steps.clear()
+    self._step_count += 1
+    self.steps.append(StepStats(step=self._step_count))
+    if self.max_kept_steps and len(self.steps) > self.max_kept_steps:
+      del self.steps[:-self.max_kept_steps]
+    return self.current_step.step
+
+  def end_step(self):
+    if os.environ.get(CDP_ACCOUNTING_ENV_VAR) and logger.isEnabledFor(logging.DEBUG):
+      step = self.current_step
+      logger.debug(f"CDP accounting step [{step.step}]: round_trips={step.round_trips} bytes={step.bytes} "
+                   f"by call site={ {site: stats.round_trips for site, stats in step.call_sites.items()} }")
+
+  def record(self, call_site: str, method: str, request: Any = None, response: Any = None):
+    stats = self.current_step.call_sites.setdefault(call_site, CallSiteStats())
+    stats.round_trips += 1
+    stats.bytes += payload_size(request) + payload_size(response)
+    stats.methods[method] = stats.methods.get(method, 0) + 1
+
+  async def track(self, call_site: str, method: str, awaitable: Awaitable[T], request: Any = None) -> T:
+    response = None
+    try:
+      response = await awaitable
+      return response
+    finally:
+      # Failed calls (e.g. new_cdp_session on a frame without its own target) are round trips as well ...
+      self.record(call_site, method, request, response)
+
+  def max_round_trips_per_step(self) -> int:
+    return max((step.round_trips for step in self.steps), default=0)
+
+  def max_bytes_per_step(self) -> int:
+    return max((step.bytes for step in self.steps), default=0)
+
+  def budget_violations(self, max_round_trips: Optional[int] = None, max_bytes: Optional[int] = None) -> List[str]:
+    violations = []
+    for step in self.steps:
+      if max_round_trips is not None and step.round_trips > max_round_trips:
+        violations.append(f"step {step.step}: {step.round_trips} round trips > budget of {max_round_trips} ({self._top_call_sites(step)})")
+      if max_bytes is not None and step.bytes > max_bytes:
+        violations.append(f"step {step.step}: {step.bytes} bytes > budget of {max_bytes} ({self._top_call_sites(step)})")
+
+    return violations
+
+  @staticmethod
+  def _top_call_sites(step: StepStats, top: int = 3) -> str:
+    call_sites = sorted(step.call_sites.items(), key=lambda item: item[1].round_trips, reverse=True)[:top]
+    return ', '.join(f"{site}={stats.round_trips} calls/{stats.bytes} bytes" for site, stats in call_sites)
+
+  def summary(self) -> Dict[int, Dict[str, Dict[str, Any]]]:
+    return {
+      step.step: {site: {'round_trips': stats.round_trips, 'bytes': stats.bytes, 'methods': dict(stats.methods)}
+                  for site, stats in step.call_sites.items()}
+      for step in self.steps
+    }
+
+
+class _NullAccountant(CdpAccountant):
+  enabled = False
+
+  def begin_step(self) -> int:
+    return 0
+
+  def end_step(self):
+    pass
+
+  def record(self, call_site: str, method: str, request: Any = None, response: Any = None):
+    pass
+
+  async def track(self, call_site: str, method: str, awaitable: Awaitable[T], request: Any = None) -> T:
+    return await awaitable
+
+
+_NULL_ACCOUNTANT = _NullAccountant()
+_active_accountant: contextvars.ContextVar[Optional[CdpAccountant]] = contextvars.ContextVar('active_cdp_accountant', default=None)
+_env_accountant: Optional[CdpAccountant] = None
+
+
+def get_cdp_accountant() -> CdpAccountant:
+  global _env_accountant
+  accountant = _active_accountant.get()
+  if accountant:
+    return accountant
+
+  if os.environ.get(CDP_ACCOUNTING_ENV_VAR):
+    if _env_accountant is None:
+      _env_accountant = CdpAccountant(max_kept_steps=100)  # Long production runs shouldn't accumulate stats forever ...
+    return _env_accountant
+
+  return _NULL_ACCOUNTANT
+
+
+@contextmanager
+def account_cdp() -> Iterator[CdpAccountant]:
+  """Activates a CdpAccountant for the code running inside the block (and the asyncio tasks created from it)."""
+  accountant = CdpAccountant()
+  token = _active_accountant.set(accountant)
+  try:
+    yield accountant
+  finally:
+    _active_accountant.reset(token)
@@ -0,0 +1,149 @@
+import asyncio
+import logging
+import weakref
+
+from typing import Any, Dict, List, Optional, Tuple
+
+from browser_use.attachments import Attachment
+from browser_use.dom.cdp_accounting import get_cdp_accountant
+
+logger = logging.getLogger(__name__)
+
+# Mutations seen in this document since the counter was installed, and a random id for the document itself: a reload at the
+# same URL starts a new count that could match the old one. Patchright evaluates in an isolated world, the page never sees it.
+# The highlight overlay buildDomTree draws (and the next capture removes) isn't a change of the page: it's not counted ...
+INSTALL_COUNTER_JS = """
+const options = { subtree: true, childList: true, attributes: true, characterData: true };
+const overlayId = 'playwright-highlight-container';
+const isOverlay = node => {
+  const element = node && (node.nodeType === Node.ELEMENT_NODE ? node : node.parentElement);
+  return !!element && (element.id === overlayId || !!element.closest('#' + overlayId));
+};
+const counts = record => !(record.attributeName === 'browser-user-highlight-id' || isOverlay(record.target) ||
+  (record.type === 'childList' && [...record.addedNodes, ...record.removedNodes].every(isOverlay)));
+let counter = window.__reBrowserUseMutations;
+if (!counter) {
+  counter = window.__reBrowserUseMutations = { document: Math.random().toString(36).slice(2), count: 0, roots: new WeakSet() };
+  counter.observer = new MutationObserver(records => { counter.count += records.filter(counts).length; });
+  counter.observer.observe(document, options);
+}
+counter.count += counter.observer.takeRecords().filter(counts).length;
+"""
+MUTATION_COUNTER_JS = """
+() => {
+  %s
+  return [counter.document, counter.count];
+}
+""" % INSTALL_COUNTER_JS
+# buildDomTree.js with the counter read in the same (synchronous) evaluate, right before the snapshot: nothing the page does
+# can slip in between. Mutations inside a closed ShadowRoot never reach the document's observer: the root being walked is
+# added to it here as well ...
+COUNTED_BUILD_DOM_TREE_JS = """
+(args) => {
+  %s
+  const root = args.initialRootNode;
+  if (root instanceof ShadowRoot && !counter.roots.has(root)) {
+    counter.roots.add(root);
+    counter.observer.observe(root, options);
+  }
+  const mutationCounter = [counter.document, counter.count];
+  const result = (%s)(args);
+  result.mutationCounter = mutationCounter;
+  return result;
+}
+"""
+
+# (page url, frames (name, url) of the page, ((frame name, frame url, (document, mutations)) ...) for the captured frames)
+Fingerprint = Tuple[str, Tuple[Tuple[str, str], ...], Tuple[Tuple[str, str, Tuple[Any, ...]], ...]]
+
+
+class PageChangeDetector(Attachment):
+  """
+  Cheap "has anything changed since the last capture" for a page: its URL, its set of frames and a mutation counter in every
+  captured frame, one evaluate per frame (in parallel) instead of a whole get_multitarget_clickable_elements pass. Only for the
+  sessions opting in:
+    browser_session = await BrowserSession.create_stealth_browser_session(reuse_unchanged_states=True)
+  The capture runs buildDomTree.js through wrap_build_dom_tree() and gives every result to record_snapshot(): the counters are
+  the ones of the snapshot itself, not read after it (nor after the screenshot). Then:
+    detector.mark(page, state)  # right after capturing 'state'
+    ...
+    state = await detector.unchanged_state(page)  # 'state' again, or None when something changed
+  """
+  _watched: 'weakref.WeakSet[Any]' = weakref.WeakSet()
+
+  def __init__(self):
+    self.reused = self.recaptured = 0
+    self._fingerprint: Optional[Fingerprint] = None
+    self._state: Any = None
+    self._frames_marked: List[Any] = []
+    self._snapshots: Optional[Dict[Any, Tuple[Any, ...]]] = {}  # Frame => counter read by its first snapshot, None: one missing
+    self._selector_map: Any = None  # The one of the last complete capture
+
+  @classmethod
+  def watch(cls, browser_context: Any):
+    cls._watched.add(browser_context)
+
+  @classmethod
+  def for_page(cls, page: Any) -> Optional['PageChangeDetector']:
+    """The page's detector when its context is watched, None otherwise."""
+    return cls.attach(page) if page.context in cls._watched else None
+
+  @staticmethod
+  def wrap_build_dom_tree(js_code: str) -> str:
+    if '__reBrowserUseMutations' in js_code:  # Already wrapped (a DomService capturing again) ...
+      return js_code
+    return COUNTED_BUILD_DOM_TREE_JS % (INSTALL_COUNTER_JS, js_code.strip().rstrip(';'))  # An expression: no trailing ';' ...
+
+  def begin_capture(self):
+    self._snapshots, self._selector_map = {}, None
+
+  def record_snapshot(self, frame: Any, mutation_counter: Optional[List[Any]]):
+    """The counter a buildDomTree evaluate read in 'frame': the first one of every frame is the one to compare against."""
+    if self._snapshots is None:
+      return
+    if mutation_counter is None:  # Not counted: mark() won't reuse the state ...
+      self._snapshots = None
+      return
+    self._snapshots.setdefault(frame, tuple(mutation_counter))
+
+  def end_capture(self, selector_map: Any):
+    self._selector_map = selector_map
+
+  @staticmethod
+  def _frames(page: Any) -> Tuple[Tuple[str, str], ...]:
+    return tuple((frame.name, frame.url) for frame in page.frames)
+
+  async def _fingerprint_of(self, page: Any, frames: List[Any]) -> Optional[Fingerprint]:
+    track = get_cdp_accountant().track
+    try:
+      counters = await asyncio.gather(*[track('PageChangeDetector.fingerprint', 'Frame.evaluate', frame.evaluate(MUTATION_COUNTER_JS))
+                                        for frame in frames])
+    except Exception as e:  # Some frame can't be asked (detached, navigating ...): that counts as a change
+      logger.debug(f"Page change detector: couldn't fingerprint {page.url}: {type(e).__name__}: {e}")
+      return None
+    return page.url, self._frames(page), tuple((frame.name, frame.url, tuple(counter)) for frame, counter in zip(frames, counters))
+
+  def mark(self, page: Any, state: Any):
+    """'state' was captured just now: it's good for as long as the counters of its snapshots don't change."""
+    snapshots, self._snapshots = self._snapshots, {}
+    # get_state_summary falls back to the previous state when the capture fails: these snapshots aren't that state's ...
+    if not snapshots or self._selector_map is None or state.selector_map is not self._selector_map:
+      self._fingerprint = self._state = None
+      return
+    self._frames_marked = list(snapshots)
+    self._fingerprint = (page.url, self._frames(page),
+                         tuple((frame.name, frame.url, counter) for frame, counter in snapshots.items()))
+    self._state = state
+
+  async def unchanged_state(self, page: Any) -> Optional[Any]:
+    if self._state is None:
+      return None
+    fingerprint = await self._fingerprint_of(page, self._frames_marked)
+    if fingerprint is None or fingerprint != self._fingerprint:
+      self.recaptured += 1
+      return None
+    self.reused += 1
+    return self._state
+
+  def stats(self) -> Dict[str, int]:
+    return {'reused': self.reused, 'recaptured': self.recaptured}
@@ -0,0 +1,197 @@
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import time
+
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Setting this to a file path turns on tracing for every state capture of the process. The file is rewritten (Chrome trace-event format)
+# after each step with the last 100 steps and a '<path>.summary.json' with the aggregated numbers is written next to it ...
+DOM_TRACE_ENV_VAR = 'RE_BROWSER_USE_DOM_TRACE'
+
+
+@dataclass
+class TraceSpan:
+  name: str
+  step: int
+  start_ns: int
+  frame: Optional[str] = None
+  depth: int = 0
+  tid: int = 0
+  end_ns: Optional[int] = None
+  args: Dict[str, Any] = field(default_factory=dict)
+
+  @property
+  def duration_ms(self) -> float:
+    return ((self.end_ns or self.start_ns) - self.start_ns) / 1_000_000
+
+
+class DomTracer:
+  """
+  Records nested spans (phase + frame) for the multitarget state capture. Spans are opened with 'span()' and they can carry
+  counters ('bytes', 'nodes', ...) that are summed in the per-step summary. With 'max_kept_steps' only the spans of the last
+  steps are kept (and exported).
+  """
+  enabled = True
+
+  def __init__(self, export_path: Optional[str] = None, max_kept_steps: Optional[int] = None):
+    self.export_path = export_path
+    self.max_kept_steps = max_kept_steps
+    self.spans: List[TraceSpan] = []
+    self.step = 0
+    self._origin_ns = time.perf_counter_ns()
+    self._depth: contextvars.ContextVar[int] = contextvars.ContextVar(f'dom_tracer_depth_{id(self)}', default=0)
+    self._tids: Dict[int, int] = {}
+
+  def begin_step(self) -> int:
+    self.step += 1
+    if self.max_kept_steps:
+      self.spans = [trace_span for trace_span in self.spans if trace_span.step > self.step - self.max_kept_steps]
+    return self.step
+
+  def end_step(self):
+    if self.export_path:
+      self.export_chrome_trace(self.export_path)
+      self.export_summary(f"{self.export_path}.summary.json")
+
+  # Every asyncio task gets its own 'thread' in the trace viewer, otherwise the spans created inside asyncio.gather overlap badly ...
+  def _current_tid(self) -> int:
+    try:
+      task = asyncio.current_task()
+    except RuntimeError:
+      task = None
+    key = id(task) if task else 0
+    if key not in self._tids:
+      self._tids[key] = len(self._tids) + 1
+    return self._tids[key]
+
+  @contextmanager
+  def span(self, name: str, frame: Any = None, **args: Any) -> Iterator[TraceSpan]:
+    depth = self._depth.get()
+    trace_span = TraceSpan(name=name, step=self.step, start_ns=time.perf_counter_ns(), depth=depth, tid=self._current_tid(),
+                           frame=getattr(frame, 'url', frame), args=dict(args))
+    token = self._depth.set(depth + 1)
+    try:
+      yield trace_span
+    finally:
+      self._depth.reset(token)
+      trace_span.end_ns = time.perf_counter_ns()
+      self.spans.append(trace_span)
+
+  def to_chrome_trace(self) -> Dict[str, Any]:
+    events = []
+    for trace_span in sorted(self.spans, key=lambda s: s.start_ns):
+      args = {'step': trace_span.step, **trace_span.args}
+      if trace_span.frame is not None:
+        args['frame'] = trace_span.frame
+      events.append({
+        'name': trace_span.name,
+        'cat': 'dom',
+        'ph': 'X',  # Complete event: 'ts' and 'dur' are both in microseconds
+        'ts': (trace_span.start_ns - self._origin_ns) / 1000,
+        'dur': ((trace_span.end_ns or trace_span.start_ns) - trace_span.start_ns) / 1000,
+        'pid': os.getpid(),
+        'tid': trace_span.tid,
+        'args': args,
+      })
+
+    return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+  def export_chrome_trace(self, path: str):
+    with open(path, 'w', encoding='utf-8') as f:
+      json.dump(self.to_chrome_trace(), f)
+
+  def step_summary(self) -> Dict[int, Dict[str, Dict[str, Any]]]:
+    """Aggregates the spans by step and phase: count, total/max milliseconds and the sum of every numeric counter."""
+    summary: Dict[int, Dict[str, Dict[str, Any]]] = {}
+    for trace_span in self.spans:
+      phase = summary.setdefault(trace_span.step, {}).setdefault(trace_span.name, {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+      phase['count'] += 1
+      phase['total_ms'] += trace_span.duration_ms
+      phase['max_ms'] = max(phase['max_ms'], trace_span.duration_ms)
+      for key, value in trace_span.args.items():
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+          phase[key] = phase.get(key, 0) + value
+
+    return summary
+
+  def export_summary(self, path: str):
+    with open(path, 'w', encoding='utf-8') as f:
+      json.dump({str(step): phases for step, phases in self.step_summary().items()}, f, indent=2)
+
+
+class _NullTracer(DomTracer):
+  enabled = False
+
+  def __init__(self):
+    super().__init__()
+
+  def begin_step(self) -> int:
+    return 0
+
+  def end_step(self):
+    pass
+
+  @contextmanager
+  def span(self, name: str, frame: Any = None, **args: Any) -> Iterator[TraceSpan]:
+    # Nothing is recorded, but callers can still write their counters in span.args ...
+    yield TraceSpan(name=name, step=0, start_ns=0)
+
+
+_NULL_TRACER = _NullTracer()
+_active_tracer: contextvars.ContextVar[Optional[DomTracer]] = contextvars.ContextVar('active_dom_tracer', default=None)
+_env_tracer: Optional[DomTracer] = None
+
+
+def get_dom_tracer() -> DomTracer:
+  global _env_tracer
+  tracer = _active_tracer.get()
+  if tracer:
+    return tracer
+
+  export_path = os.environ.get(DOM_TRACE_ENV_VAR)
+  if export_path:
+    if _env_tracer is None or _env_tracer.export_path != export_path:
+      logger.info(f"DOM tracing enabled through {DOM_TRACE_ENV_VAR}, exporting to [{export_path}] ...")
+      _env_tracer = DomTracer(export_path, max_kept_steps=100)  # Long production runs shouldn't accumulate spans forever ...
+    return _env_tracer
+
+  return _NULL_TRACER
+
+
+@contextmanager
+def trace_dom(export_path: Optional[str] = None) -> Iterator[DomTracer]:
+  """
+  Activates a DomTracer for the code running inside the block:
+    with trace_dom('capture.trace.json') as tracer:
+      await agent.run()
+  """
+  tracer = DomTracer(export_path)
+  token = _active_tracer.set(tracer)
+  try:
+    yield tracer
+  finally:
+    _active_tracer.reset(token)
+    tracer.end_step()
+
+
+def count_cdp_nodes(node: Dict) -> int:
+  """Counts the nodes of a DOM.getDocument result, including shadow roots and iframe documents."""
+  count, pending = 0, [node]
+  while pending:
+    current = pending.pop()
+    if not isinstance(current, dict):
+      continue
+    count += 1
+    pending.extend(current.get('children') or [])
+    pending.extend(current.get('shadowRoots') or [])
+    if current.get('contentDocument'):
+      pending.append(current['contentDocument'])
+
+  return count
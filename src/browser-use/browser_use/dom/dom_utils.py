@@ -1,14 +1,22 @@
+from __future__ import annotations
+
 import asyncio
+import json
 import logging
-import re
 
+from browser_use.dom.cdp_accounting import get_cdp_accountant
+from browser_use.dom.dom_tracing import get_dom_tracer, count_cdp_nodes
 from browser_use.dom.views import DOMElementNode, DOMBaseNode
+from browser_use.dom.xpath_css import XPathConversionError, xpath_to_css, xpaths_to_css
 from browser_use.logging_config import addLoggingLevel
 from dataclasses import dataclass
-from patchright.async_api import Error, Frame, Page, CDPSession, JSHandle
-from typing import List, Tuple, Dict, Any, Protocol, Optional
+from typing import TYPE_CHECKING, List, Tuple, Dict, Any, Protocol, Optional
 from urllib.parse import urlparse
 
+# Only for the annotations: the driver gets imported by whoever creates the pages, not by importing this module ...
+if TYPE_CHECKING:
+  from patchright.async_api import Frame, Page, CDPSession, JSHandle
+
 addLoggingLevel('TRACE', logging.DEBUG - 5) # to see TRACE level: pytest -v -rA -s --log-cli-level=5 tests\test_boot_detection.py
 
 logger = logging.getLogger(__name__)
@@ -19,7 +27,21 @@ class ClosedShadowRootDescriptor:
   element_handle_to_shadow_root: JSHandle
 
 
-FramesDescriptorDict = Dict[Frame, List[ClosedShadowRootDescriptor]]
+FramesDescriptorDict = Dict['Frame', List[ClosedShadowRootDescriptor]]
+
+
+@dataclass
+class JSHandleStats:
+  """Process-wide count of the JSHandles created and disposed by the multitarget DOM path (the heap profiler reports the live ones)."""
+  created: int = 0
+  disposed: int = 0
+
+  @property
+  def live(self) -> int:
+    return self.created - self.disposed
+
+
+JS_HANDLE_STATS = JSHandleStats()
 
 
 class FilterCallable(Protocol):
@@ -108,52 +130,10 @@ class DomUtils:
     await _traverse(root_node)
     return filtered_elements
 
-  # There is a pretty similar function _convert_simple_xpath_to_css_selector
+  # BrowserSession._convert_simple_xpath_to_css_selector is patched to use the same engine (browser_use/dom/xpath_css.py) ...
   def xpath_to_css(self, xpath: str) -> str:
-    if not xpath:  # Handles None or empty string
-      return ""
-
-    stripped_xpath = xpath.strip('/')
-    if not stripped_xpath:  # Handles cases like "/" or "//" which become empty after strip
-      return ""
-
-    segments = stripped_xpath.split('/')
-    css_parts = []
-
-    start_index = 0
-    # Handle leading /html and /html/body based on the example's desired output
-    if segments[0].lower() == 'html':
-      if len(segments) > 1 and segments[1].lower() == 'body':
-        css_parts.append('body')  # Add 'body' literally
-        start_index = 2
-      else:
-        css_parts.append('html')  # Add 'html' literally
-        start_index = 1
-
-    # If xpath was just "/html" or "/html/body", the loop below will not run,
-    # and css_parts will correctly be ['html'] or ['body'].
-    # ' > '.join will then return 'html' or 'body'.
-
-    # Process the remaining segments
-    for i in range(start_index, len(segments)):
-      segment_str = segments[i]
-      # Regex to capture tag_name and optional [index]
-      match = re.match(r'([a-zA-Z0-9_-]+)(?:\[(\d+)])?', segment_str)
-
-      if not match:
-        # This segment is not in 'tag' or 'tag[index]' format. TODO: I don't like it
-        return f"Error: Unparseable XPath segment '{segment_str}' in '{xpath}'"
-
-      tag_name = match.group(1)
-      index_str = match.group(2)
-
-      # Construct the CSS part for the current segment
-      current_css_part = tag_name
-      if index_str:
-        current_css_part += f":nth-of-type({index_str})"
-      css_parts.append(current_css_part)
-
-    return ' > '.join(css_parts)
+    """Raises XPathConversionError when there is no CSS equivalent."""
+    return xpath_to_css(xpath)
 
   def _get_all_frames_recursively(self, initial_frame: Frame) -> List[Frame]:
     frames = [initial_frame]
@@ -181,9 +161,13 @@ class DomUtils:
     return target_frames_and_cdp_sessions
 
   async def _get_cdp_session_for_frame(self, page: Page, frame: Frame) -> CDPSession | None:
+    from patchright.async_api import Error  # Already loaded: there is a page ...
+
     logger.trace(f"Trying to create CDPSession for frame={frame} ...")
     try:
-      cdp_session = await page.context.new_cdp_session(frame)
+      with get_dom_tracer().span('cdp_session_setup', frame):
+        cdp_session = await get_cdp_accountant().track('DomUtils._get_cdp_session_for_frame', 'Target.attachToTarget',
+                                                       page.context.new_cdp_session(frame))
       logger.trace(f"{type(cdp_session)} object created for Frame={frame} ...")
       return cdp_session
     except Error as e:
@@ -194,19 +178,28 @@ class DomUtils:
       return None
 
   async def _get_xpaths_to_closed_shadow_roots_from_frame(self, cdp_session: CDPSession, frame: Frame) -> List[str]:
+    tracer, accountant = get_dom_tracer(), get_cdp_accountant()
+    call_site = 'DomUtils._get_xpaths_to_closed_shadow_roots_from_frame'
     # Get all in one go ...
-    document_result = await cdp_session.send('DOM.getDocument', {
-      'depth': -1,
-      'pierce': True  # This 'true' really pierces through closed shadowRoots but not through iframes security
-    })
+    with tracer.span('DOM.getDocument', frame) as span:
+      params = {
+        'depth': -1,
+        'pierce': True  # This 'true' really pierces through closed shadowRoots but not through iframes security
+      }
+      document_result = await accountant.track(call_site, 'DOM.getDocument', cdp_session.send('DOM.getDocument', params), params)
+      if tracer.enabled:  # Serializing the whole document only makes sense when somebody is looking at the numbers ...
+        span.args['bytes'] = len(json.dumps(document_result))
+        span.args['nodes'] = count_cdp_nodes(document_result['root'])
     # print(f"document_result=\n {json.dumps(document_result, indent=2)}")
-    await cdp_session.detach()  # You don't need the CDPSession anymore ...
+    await accountant.track(call_site, 'Target.detachFromTarget', cdp_session.detach())  # You don't need the CDPSession anymore ...
 
     # Get closed ShadowRoot from the document
     xpaths = []
     # Initial call: document_result['root'] is the document node (e.g. #document).
     # Its XPath is effectively empty string, children will build from "/"
-    self._get_closed_shadow_roots_from_node(document_result['root'], "", xpaths)
+    with tracer.span('closed_shadow_root_scan', frame) as span:
+      self._get_closed_shadow_roots_from_node(document_result['root'], "", xpaths)
+      span.args['closed_shadow_roots'] = len(xpaths)
     if xpaths:
       for xpath_item in xpaths:
         logger.debug(f"Found closed ShadowRoot using CDP at XPath: {xpath_item} in frame {frame}")
@@ -215,16 +208,19 @@ class DomUtils:
 
     return xpaths
 
-  async def _find_shadow_root_in_frames_recursively(self, frame: Frame, xpath_of_host: str) -> Tuple[JSHandle | None, Frame | None]:
+  async def _find_shadow_root_in_frames_recursively(self, frame: Frame, xpath_of_host: str,
+                                                    css_of_host: Optional[str] = None) -> Tuple[JSHandle | None, Frame | None]:
+    track, call_site = get_cdp_accountant().track, 'DomUtils._find_shadow_root_in_frames_recursively'
     # First we look for the host in the current frame ...
-    css_of_host = self.xpath_to_css(xpath_of_host)
+    css_of_host = css_of_host or self.xpath_to_css(xpath_of_host)
     host_locator = frame.locator(css_of_host)
     children = []  # Initialize to ensure it's defined for disposal logic later
-    if await host_locator.count() > 0:  # Check if the host element exists in the current frame
+    if await track(call_site, 'Locator.count', host_locator.count()) > 0:  # Check if the host element exists in the current frame
       # You don't want the host, you need one of its direct children ...
       element_locator_for_host_children = frame.locator(css_of_host + " > *")
       # It seems the returned handles are usable ...
-      children = await element_locator_for_host_children.element_handles()
+      children = await track(call_site, 'Locator.element_handles', element_locator_for_host_children.element_handles())
+      JS_HANDLE_STATS.created += len(children)
       # Proceed to child frames if handles can't be obtained
       if children:
         logger.trace(f"  (Frame: {frame}) Found [{len(children)}] children for host xpath = [{xpath_of_host}] ... ")
@@ -232,31 +228,37 @@ class DomUtils:
           if logger.isEnabledFor(logging.TRACE):
             logger.trace(await self.get_js_handle_description(child_handle, f"    Child Node"))
           # I'm trying to get the closed ShadowRoot by using element => element.getRootNode()
-          shadow_root_candidate = await child_handle.evaluate_handle("element => element.getRootNode()")
-          node_type_js_handle = await shadow_root_candidate.get_property('nodeType')
-          node_type = await node_type_js_handle.json_value()
-          await node_type_js_handle.dispose()  # Dispose the nodeType handle
+          shadow_root_candidate = await track(call_site, 'JSHandle.evaluate_handle',
+                                              child_handle.evaluate_handle("element => element.getRootNode()"))
+          node_type_js_handle = await track(call_site, 'JSHandle.get_property', shadow_root_candidate.get_property('nodeType'))
+          JS_HANDLE_STATS.created += 2
+          node_type = await track(call_site, 'JSHandle.json_value', node_type_js_handle.json_value())
+          await track(call_site, 'JSHandle.dispose', node_type_js_handle.dispose())  # Dispose the nodeType handle
+          JS_HANDLE_STATS.disposed += 1
           if node_type == 11:  # ShadowRoot nodes are #document-fragment
             if logger.isEnabledFor(logging.TRACE):
               logger.trace(await self.get_js_handle_description(shadow_root_candidate, f"    ShadowRoot"))
             # Found the shadow root. Dispose all child_handles obtained in this frame.
             for child in children:
-              await child.dispose()
+              await track(call_site, 'JSHandle.dispose', child.dispose())
+            JS_HANDLE_STATS.disposed += len(children)
             return shadow_root_candidate, frame
           else:
             # Not the shadow root, dispose this candidate
-            await shadow_root_candidate.dispose()
+            await track(call_site, 'JSHandle.dispose', shadow_root_candidate.dispose())
+            JS_HANDLE_STATS.disposed += 1
 
     # If this point is reached, no shadow root was returned from the current frame's direct children.
     # Dispose all child_handles obtained in this frame (if any).
     for child_handle_to_dispose in children:
-      await child_handle_to_dispose.dispose()
+      await track(call_site, 'JSHandle.dispose', child_handle_to_dispose.dispose())
+    JS_HANDLE_STATS.disposed += len(children)
 
     for child_frame in frame.child_frames:
       if child_frame.url == 'about:blank':  # Skip blank iframes
         continue
 
-      found_in_descendant = await self._find_shadow_root_in_frames_recursively(child_frame, xpath_of_host)
+      found_in_descendant = await self._find_shadow_root_in_frames_recursively(child_frame, xpath_of_host, css_of_host)
       if found_in_descendant:
         return found_in_descendant
 
@@ -267,10 +269,19 @@ class DomUtils:
     # to get a JSHandle/ElementHandle. I need to locate all the children of the host using a piercing CSS locator (TODO: Xpath doesn't seem to work)
     # and from that children a little bit of trickery to get the ElementHandle to the parent closed shadow root ...
     frames_descriptor_dict[frame] = []
-    for xpath in await self._get_xpaths_to_closed_shadow_roots_from_frame(cdp_session, frame):
+    xpaths = await self._get_xpaths_to_closed_shadow_roots_from_frame(cdp_session, frame)
+    # All the hosts at once (shared prefixes compiled once). A path that can't be converted only costs its own host ...
+    conversion_errors: Dict[str, XPathConversionError] = {}
+    css_of_hosts = xpaths_to_css(xpaths, errors=conversion_errors)
+    for xpath, error in conversion_errors.items():
+      logger.error(f"Skipping the closed shadow root with host XPath: [{xpath}] (frame {frame.url}): {error}")
+    for xpath in xpaths:
+      if xpath in conversion_errors:
+        continue
       logger.trace(f"Attempting to find ShadowRoot for host XPath: [{xpath}] (identified in frame: {frame.url})")
       # Start search in the frame whose associated CDPSession found the shadow root and computed its XPath ...
-      shadow_root_handle, frame_container = await self._find_shadow_root_in_frames_recursively(frame, xpath)
+      with get_dom_tracer().span('shadow_root_resolution', frame, xpath=xpath):
+        shadow_root_handle, frame_container = await self._find_shadow_root_in_frames_recursively(frame, xpath, css_of_hosts.get(xpath))
       if shadow_root_handle:
         assert frame_container is not None, "If shadow_root_handle is found, frame_container must also be a valid Frame."
         closed_shadow_root_descriptor = ClosedShadowRootDescriptor(xpath, shadow_root_handle)
@@ -423,7 +434,10 @@ class DomUtils:
 
   async def build_frames_descriptor_dict(self, page: Page) -> FramesDescriptorDict:
     frames_descriptor_dict = {}
-    for frame, cdp_session in await self._get_target_frames_and_cdp_sessions(page):
-      await self._get_closed_shadow_root_descriptor_list(frame, cdp_session, frames_descriptor_dict)
+    with get_dom_tracer().span('build_frames_descriptor_dict') as span:
+      for frame, cdp_session in await self._get_target_frames_and_cdp_sessions(page):
+        with get_dom_tracer().span('frame_descriptor', frame):
+          await self._get_closed_shadow_root_descriptor_list(frame, cdp_session, frames_descriptor_dict)
+      span.args['frames'] = len(frames_descriptor_dict)
 
     return frames_descriptor_dict
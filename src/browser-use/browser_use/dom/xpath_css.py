@@ -0,0 +1,140 @@
+import os
+import re
+
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+XPATH_CACHE_SIZE = int(os.environ.get('RE_BROWSER_USE_XPATH_CACHE_SIZE', '4096'))
+
+_SEGMENT = re.compile(r'^(?P<tag>[a-zA-Z_*][\w.:-]*)(?P<predicates>(?:\[[^\]]*])*)$')
+_PREDICATE = re.compile(r'\[([^\]]*)]')
+
+
+class XPathConversionError(ValueError):
+  """The XPath uses something that has no CSS equivalent (attributes, axes, functions ...)."""
+
+  def __init__(self, xpath: str, segment: str, reason: str):
+    super().__init__(f"Unconvertible XPath segment '{segment}' in '{xpath}': {reason}")
+    self.xpath = xpath
+    self.segment = segment
+    self.reason = reason
+
+
+@lru_cache(maxsize=XPATH_CACHE_SIZE)
+def _compile_segment(segment: str, strict: bool) -> str:
+  # The exceptions aren't cached, only the successful compilations ...
+  match = _SEGMENT.match(segment)
+  if not match:
+    if not strict:
+      return segment  # Passed through, as upstream's _convert_simple_xpath_to_css_selector always did ...
+    raise XPathConversionError('', segment, 'not a tag[predicate] step')
+
+  css = match.group('tag').replace(':', r'\:')  # Namespaced custom elements ...
+  for predicate in _PREDICATE.findall(match.group('predicates')):
+    predicate = predicate.strip()
+    if predicate.isdigit():
+      css += f':nth-of-type({predicate})'
+    elif predicate == 'last()':
+      css += ':last-of-type'
+    elif predicate.replace(' ', '') == 'position()>1':
+      css += ':nth-of-type(n+2)'
+    elif strict:
+      raise XPathConversionError('', segment, f"unsupported predicate [{predicate}]")
+    # Not strict: the predicate is ignored, as upstream's _convert_simple_xpath_to_css_selector always did ...
+
+  return css
+
+
+def _split(xpath: str) -> List[str]:
+  return [segment for segment in xpath.strip().strip('/').split('/') if segment]
+
+
+def _head(segments: List[str], collapse_html_body: bool) -> Tuple[List[str], int]:
+  # 'html/body/...' becomes 'body > ...', buildDomTree's and the CDP computed xpaths always start there ...
+  if collapse_html_body and segments and segments[0].lower() == 'html':
+    if len(segments) > 1 and segments[1].lower() == 'body':
+      return ['body'], 2
+    return ['html'], 1
+  return [], 0
+
+
+def _compile_segments(xpath: str, segments: List[str], strict: bool) -> List[str]:
+  try:
+    return [_compile_segment(segment, strict) for segment in segments]
+  except XPathConversionError as e:
+    raise XPathConversionError(xpath, e.segment, e.reason) from None
+
+
+@lru_cache(maxsize=XPATH_CACHE_SIZE)
+def _xpath_to_css(xpath: str, collapse_html_body: bool, strict: bool) -> str:
+  segments = _split(xpath)
+  css_parts, start = _head(segments, collapse_html_body)
+  return ' > '.join(css_parts + _compile_segments(xpath, segments[start:], strict))
+
+
+def xpath_to_css(xpath: Optional[str], collapse_html_body: bool = True, strict: bool = True) -> str:
+  """
+  CSS selector equivalent to a simple absolute XPath ('html/body/div[2]/my:widget[last()]' -> 'body > div:nth-of-type(2) > my\\:widget:last-of-type').
+  Raises XPathConversionError for anything that isn't tag[index|last()|position()>1] steps (unless strict=False: unknown
+  predicates are then dropped). Results are kept in a bounded LRU cache: the same host paths come back on every step and frame.
+  """
+  if not xpath:
+    return ''
+  return _xpath_to_css(xpath, collapse_html_body, strict)
+
+
+def xpaths_to_css(xpaths: Iterable[str], collapse_html_body: bool = True, strict: bool = True,
+                  errors: Optional[Dict[str, XPathConversionError]] = None) -> Dict[str, str]:
+  """
+  Converts a set of paths sharing prefixes walking them as a trie: every distinct prefix gets compiled once. The failures
+  raise (the first one) or, when an 'errors' dict is given, are collected there. The compiled segments stay cached for
+  xpath_to_css.
+  """
+  trie: Dict[str, dict] = {}
+  ends: Dict[int, List[str]] = {}  # id(trie node) -> xpaths ending there
+  for xpath in dict.fromkeys(xpaths):
+    if not xpath:
+      continue
+    node = trie
+    for segment in _split(xpath):
+      node = node.setdefault(segment, {})
+    ends.setdefault(id(node), []).append(xpath)
+
+  results: Dict[str, str] = {}
+  # (trie node, css parts so far, segments so far) ... depth first, no recursion limit to worry about
+  stack = [(trie, [], [])]
+  while stack:
+    node, css_parts, segments = stack.pop()
+    for xpath in ends.get(id(node), []):
+      head, start = _head(segments, collapse_html_body)
+      results[xpath] = ' > '.join(head + css_parts[start:])
+    for segment, child in node.items():
+      try:
+        compiled = _compile_segment(segment, strict)
+      except XPathConversionError as e:
+        failed = _collect_ends(child, ends)
+        if errors is None:
+          raise XPathConversionError(failed[0], e.segment, e.reason) from None
+        errors.update({xpath: XPathConversionError(xpath, e.segment, e.reason) for xpath in failed})
+        continue
+      stack.append((child, css_parts + [compiled], segments + [segment]))
+
+  return results
+
+
+def _collect_ends(node: dict, ends: Dict[int, List[str]]) -> List[str]:
+  collected, stack = [], [node]
+  while stack:
+    current = stack.pop()
+    collected.extend(ends.get(id(current), []))
+    stack.extend(current.values())
+  return collected
+
+
+def cache_info():
+  return _xpath_to_css.cache_info()
+
+
+def cache_clear():
+  _xpath_to_css.cache_clear()
+  _compile_segment.cache_clear()
@@ -0,0 +1,29 @@
+import contextlib
+import os
+
+from typing import Iterator
+
+
+@contextlib.contextmanager
+def file_lock(path: str) -> Iterator[None]:
+  """
+  Exclusive lock on 'path' (created if missing) for as long as the block runs. Several agents (or evaluation subprocesses) can
+  write the same file at the same time: same origin in the storage state cache, shared rate limits ...
+  """
+  with open(path, 'a+b') as lock_file:
+    if os.name == 'nt':
+      import msvcrt
+      lock_file.seek(0)
+      msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+      try:
+        yield
+      finally:
+        lock_file.seek(0)
+        msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+    else:
+      import fcntl
+      fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+      try:
+        yield
+      finally:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
@@ -0,0 +1,143 @@
+# Synthetic pages exercising the multitarget DOM path (nested iframes, cross-origin frames and closed ShadowRoots) served locally,
+# so the benchmarks don't depend on nopecha.com or any other live site ...
+import threading
+
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs, urlencode
+
+# '127.0.0.1' and 'localhost' are different origins (and different sites) for the browser: that's all we need to get cross-origin
+# frames, which Chromium puts in their own process/target, using a single server ...
+SAME_ORIGIN_HOST = '127.0.0.1'
+CROSS_ORIGIN_HOST = 'localhost'
+
+
+@dataclass(frozen=True)
+class FixturePageSpec:
+  nested_iframes: int = 0  # Depth of the chain of same-origin iframes hanging from the main page
+  cross_origin_frames: int = 0  # Cross-origin iframes in the main page
+  closed_shadow_roots: int = 0  # Closed ShadowRoots per document (main page and every frame)
+  interactive_elements: int = 10  # Interactive elements per document (some of them inside the closed ShadowRoots)
+
+  @property
+  def name(self) -> str:
+    return (f"iframes{self.nested_iframes}-cross{self.cross_origin_frames}-"
+            f"shadow{self.closed_shadow_roots}-elements{self.interactive_elements}")
+
+  @property
+  def total_frames(self) -> int:
+    return 1 + self.nested_iframes + self.cross_origin_frames
+
+  @property
+  def total_closed_shadow_roots(self) -> int:
+    return self.total_frames * self.closed_shadow_roots
+
+  def query(self, depth: int = 0) -> str:
+    return urlencode({
+      'iframes': self.nested_iframes, 'cross': self.cross_origin_frames, 'shadow': self.closed_shadow_roots,
+      'elements': self.interactive_elements, 'depth': depth,
+    })
+
+  @staticmethod
+  def from_query(query: str) -> 'FixturePageSpec':
+    params = {key: int(values[0]) for key, values in parse_qs(query).items()}
+    return FixturePageSpec(params.get('iframes', 0), params.get('cross', 0), params.get('shadow', 0), params.get('elements', 10))
+
+
+def _interactive_element(label: str, i: int) -> str:
+  kind = i % 4
+  if kind == 0:
+    return f'<button id="{label}-button-{i}">{label} button {i}</button>'
+  if kind == 1:
+    return f'<input id="{label}-input-{i}" type="text" placeholder="{label} input {i}">'
+  if kind == 2:
+    return f'<a id="{label}-link-{i}" href="#{label}-{i}">{label} link {i}</a>'
+  return f'<select id="{label}-select-{i}"><option>{label} option {i}</option></select>'
+
+
+def render_document(spec: FixturePageSpec, port: int, depth: int = 0, cross_origin: bool = False) -> str:
+  label = f"cross{depth}" if cross_origin else f"doc{depth}"
+  # A part of the interactive elements goes inside the closed ShadowRoots, the rest stays in the light DOM ...
+  shadow_elements = spec.interactive_elements // 2 if spec.closed_shadow_roots else 0
+  light_elements = [_interactive_element(label, i) for i in range(spec.interactive_elements - shadow_elements)]
+
+  shadow_hosts, shadow_script = [], []
+  for s in range(spec.closed_shadow_roots):
+    contents = ''.join(_interactive_element(f"{label}-shadow{s}", i)
+                       for i in range(s, shadow_elements, spec.closed_shadow_roots)) or f'<button>{label} shadow {s}</button>'
+    # The closed ShadowRoot needs at least one light DOM child: DomUtils reaches the root through element.getRootNode() of a slotted child
+    shadow_hosts.append(f'<div id="{label}-host-{s}" class="shadow-host"><span>slotted {s}</span></div>')
+    shadow_script.append(
+      f"document.getElementById('{label}-host-{s}').attachShadow({{mode: 'closed'}}).innerHTML = "
+      f"{contents!r} + '<slot></slot>';"
+    )
+
+  frames = []
+  if not cross_origin and depth < spec.nested_iframes:
+    frames.append(f'<iframe name="nested-{depth + 1}" src="http://{SAME_ORIGIN_HOST}:{port}/frame?{spec.query(depth + 1)}" '
+                  f'width="800" height="600"></iframe>')
+  if not cross_origin and depth == 0:
+    for c in range(spec.cross_origin_frames):
+      frames.append(f'<iframe name="cross-{c}" src="http://{CROSS_ORIGIN_HOST}:{port}/cross?{spec.query(c + 1)}" '
+                    f'width="800" height="400"></iframe>')
+
+  return f"""<!DOCTYPE html>
+<html>
+<head><title>Fixture {spec.name} ({label})</title></head>
+<body>
+<h1>{label}</h1>
+<div>{''.join(light_elements)}</div>
+{''.join(shadow_hosts)}
+{''.join(frames)}
+<script>{''.join(shadow_script)}</script>
+</body>
+</html>"""
+
+
+class _FixtureRequestHandler(BaseHTTPRequestHandler):
+  def do_GET(self):
+    parsed = urlparse(self.path)
+    if parsed.path not in ('/fixture', '/frame', '/cross'):
+      self.send_error(404)
+      return
+
+    spec = FixturePageSpec.from_query(parsed.query)
+    depth = int(parse_qs(parsed.query).get('depth', ['0'])[0])
+    body = render_document(spec, self.server.server_address[1], depth, cross_origin=parsed.path == '/cross').encode('utf-8')
+    self.send_response(200)
+    self.send_header('Content-Type', 'text/html; charset=utf-8')
+    self.send_header('Content-Length', str(len(body)))
+    self.end_headers()
+    self.wfile.write(body)
+
+  def log_message(self, format, *args):
+    pass  # Keeping the benchmark output clean ...
+
+
+class FixtureServer:
+  """Serves the fixture pages on a random local port: with FixtureServer() as server: await page.goto(server.url_for(spec))"""
+
+  def __init__(self):
+    self._server = ThreadingHTTPServer((SAME_ORIGIN_HOST, 0), _FixtureRequestHandler)
+    self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+  @property
+  def port(self) -> int:
+    return self._server.server_address[1]
+
+  def url_for(self, spec: FixturePageSpec) -> str:
+    return f"http://{SAME_ORIGIN_HOST}:{self.port}/fixture?{spec.query()}"
+
+  def start(self) -> 'FixtureServer':
+    self._thread.start()
+    return self
+
+  def stop(self):
+    self._server.shutdown()
+    self._server.server_close()
+
+  def __enter__(self) -> 'FixtureServer':
+    return self.start()
+
+  def __exit__(self, *exc_info):
+    self.stop()
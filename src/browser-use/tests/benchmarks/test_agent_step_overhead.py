@@ -0,0 +1,39 @@
+"""
+Agent step overhead (state capture + action execution + message building) on the local fixture pages, with the scripted chat model
+standing in for the LLM so the numbers don't include any model latency:
+  pytest -s tests/benchmarks/test_agent_step_overhead.py
+"""
+import statistics
+
+import pytest
+
+from browser_use.agent.views import AgentHistoryList
+from patchright.async_api import async_playwright as async_patchright
+from tests.benchmarks.fixture_pages import FixturePageSpec, FixtureServer
+from tests.scripted_llm import ScriptedChatModel, action, agent_output, click_element_containing, done
+from tests.utils_for_tests import create_browser_session, create_agent
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('spec', [
+  FixturePageSpec(interactive_elements=20),
+  FixturePageSpec(nested_iframes=2, cross_origin_frames=1, closed_shadow_roots=2, interactive_elements=50),
+], ids=lambda spec: spec.name)
+async def test_agent_step_overhead(spec):
+  with FixtureServer() as server:
+    async with async_patchright() as patchright:
+      browser_session = await create_browser_session(patchright, headless=True)
+      llm = ScriptedChatModel(script=[
+        agent_output(action('go_to_url', url=server.url_for(spec)), next_goal='Open the fixture page'),
+        click_element_containing('doc0 button 0'),
+        done('Clicked the first button'),
+      ])
+      agent = await create_agent(task='Open the fixture page and click its first button', llm=llm, browser_session=browser_session)
+
+      history: AgentHistoryList = await agent.run(max_steps=5)
+      await browser_session.kill()
+
+  assert history.is_done() and history.is_successful()
+  durations = [item.metadata.duration_seconds * 1000 for item in history.history if item.metadata]
+  print(f"{spec.name}: {len(durations)} steps, p50={statistics.median(durations):.1f} ms, max={max(durations):.1f} ms, "
+        f"LLM calls={llm.calls}")
@@ -0,0 +1,164 @@
+"""
+Offline benchmarks of the multitarget DOM path against the synthetic pages in fixture_pages.py (no network, no LLM):
+  pytest -s tests/benchmarks/test_dom_benchmark.py
+Setting UPDATE_DOM_BENCHMARK_BASELINE=true stores the measured numbers as the new baseline (dom_benchmark_baseline.json, next
+to this file) instead of comparing against it. The numbers depend on the machine, so the baseline is recorded on the one
+running the benchmarks: locally a benchmark missing from it is skipped (saying so), in CI (CI=true) it fails.
+"""
+import json
+import os
+import statistics
+import time
+import tracemalloc
+
+import pytest
+import pytest_asyncio
+
+from browser_use.dom.dom_utils import DomUtils
+from browser_use.dom.service import DomService
+from patchright.async_api import async_playwright as async_patchright
+from tests.benchmarks.fixture_pages import FixturePageSpec, FixtureServer
+from tests.utils_for_tests import cdp_budget
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'dom_benchmark_baseline.json')
+UPDATE_BASELINE = os.environ.get('UPDATE_DOM_BENCHMARK_BASELINE', 'False').lower() == 'true'
+ITERATIONS = int(os.environ.get('DOM_BENCHMARK_ITERATIONS', '10'))
+# A regression is a p50 latency (or peak memory) above the baseline times this factor: CI machines are noisy ...
+TOLERANCE = float(os.environ.get('DOM_BENCHMARK_TOLERANCE', '1.5'))
+# A CI job comparing against nothing would pass forever: it must record (or restore) the baseline first ...
+REQUIRE_BASELINE = os.environ.get('CI', 'False').lower() == 'true'
+
+SPECS = [
+  FixturePageSpec(interactive_elements=50),
+  FixturePageSpec(nested_iframes=2, interactive_elements=50),
+  FixturePageSpec(cross_origin_frames=2, interactive_elements=50),
+  FixturePageSpec(closed_shadow_roots=3, interactive_elements=50),
+  FixturePageSpec(nested_iframes=2, cross_origin_frames=2, closed_shadow_roots=2, interactive_elements=200),
+]
+
+
+@pytest.fixture(scope='module')
+def fixture_server():
+  with FixtureServer() as server:
+    yield server
+
+
+@pytest.fixture(scope='module')
+def results():
+  # Collected by every benchmark and written at the end when the baseline is being updated ...
+  collected = {}
+  yield collected
+  if UPDATE_BASELINE and collected:
+    baseline = _load_baseline()
+    baseline.update(collected)
+    with open(BASELINE_PATH, 'w', encoding='utf-8') as f:
+      json.dump(baseline, f, indent=2, sort_keys=True)
+
+
+def _load_baseline() -> dict:
+  if not os.path.exists(BASELINE_PATH):
+    return {}
+  with open(BASELINE_PATH, encoding='utf-8') as f:
+    return json.load(f)
+
+
+async def _dispose_descriptors(frames_descriptor_dict):
+  for closed_shadow_roots in frames_descriptor_dict.values():
+    for closed_shadow_root in closed_shadow_roots:
+      await closed_shadow_root.element_handle_to_shadow_root.dispose()
+
+
+async def _measure(operation, iterations: int) -> dict:
+  await operation()  # Warming up: the first run pays for the script compilation and the CDP domains initialization ...
+  latencies_ms = []
+  tracemalloc.start()
+  try:
+    for _ in range(iterations):
+      start = time.perf_counter()
+      await operation()
+      latencies_ms.append((time.perf_counter() - start) * 1000)
+    _, peak_bytes = tracemalloc.get_traced_memory()
+  finally:
+    tracemalloc.stop()
+
+  percentiles = statistics.quantiles(latencies_ms, n=100, method='inclusive')
+  return {
+    'p50_ms': round(statistics.median(latencies_ms), 2),
+    'p90_ms': round(percentiles[89], 2),
+    'p99_ms': round(percentiles[98], 2),
+    'peak_memory_kb': round(peak_bytes / 1024, 1),
+  }
+
+
+def _compare_with_baseline(key: str, measured: dict):
+  print(f"{key}: {measured}")
+  if UPDATE_BASELINE:
+    return
+  expected = _load_baseline().get(key)
+  if not expected:
+    message = f"No DOM benchmark baseline for {key} in {BASELINE_PATH}: record one with UPDATE_DOM_BENCHMARK_BASELINE=true"
+    if REQUIRE_BASELINE:
+      pytest.fail(message)
+    pytest.skip(message)
+  for metric in ('p50_ms', 'peak_memory_kb'):
+    assert measured[metric] <= expected[metric] * TOLERANCE, (
+      f"{key}: {metric}={measured[metric]} is over the baseline {expected[metric]} x {TOLERANCE}")
+
+
+@pytest_asyncio.fixture
+async def page():
+  async with async_patchright() as patchright:
+    browser = await patchright.chromium.launch(headless=True)
+    page = await browser.new_page()
+    yield page
+    await browser.close()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('spec', SPECS, ids=lambda spec: spec.name)
+async def test_build_frames_descriptor_dict(spec, page, fixture_server, results):
+  await page.goto(fixture_server.url_for(spec), wait_until='load')
+
+  async def operation():
+    frames_descriptor_dict = await DomUtils().build_frames_descriptor_dict(page)
+    assert sum(len(roots) for roots in frames_descriptor_dict.values()) == spec.total_closed_shadow_roots
+    await _dispose_descriptors(frames_descriptor_dict)
+
+  key = f"build_frames_descriptor_dict[{spec.name}]"
+  results[key] = await _measure(operation, ITERATIONS)
+  _compare_with_baseline(key, results[key])
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('spec', SPECS, ids=lambda spec: spec.name)
+async def test_get_multitarget_clickable_elements(spec, page, fixture_server, results):
+  await page.goto(fixture_server.url_for(spec), wait_until='load')
+  dom_service = DomService(page)
+
+  async def operation():
+    dom_state = await dom_service.get_multitarget_clickable_elements(highlight_elements=False, viewport_expansion=-1)
+    assert len(dom_state.selector_map) >= spec.interactive_elements
+
+  key = f"get_multitarget_clickable_elements[{spec.name}]"
+  results[key] = await _measure(operation, ITERATIONS)
+  _compare_with_baseline(key, results[key])
+
+
+def _declared_round_trip_budget(spec: FixturePageSpec) -> int:
+  # Per frame: the CDP session attempt, DOM.getDocument, detach and the buildDomTree evaluation (the mutation counters and the
+  # coordinate click boxes travel with it: any extra evaluate per frame shows up here).
+  # Per closed ShadowRoot: locator count, element handles, 4 calls for the (single) slotted child, its disposal and its own
+  # buildDomTree evaluation, plus a locator count in every frame searched before the one containing the host.
+  per_closed_shadow_root = 8 + (spec.total_frames - 1)
+  return 4 * spec.total_frames + per_closed_shadow_root * spec.total_closed_shadow_roots
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('spec', SPECS, ids=lambda spec: spec.name)
+async def test_cdp_round_trip_budget(spec, page, fixture_server):
+  await page.goto(fixture_server.url_for(spec), wait_until='load')
+
+  with cdp_budget(max_round_trips=_declared_round_trip_budget(spec)) as accountant:
+    await DomService(page).get_multitarget_clickable_elements(highlight_elements=False, viewport_expansion=-1)
+
+  print(f"{spec.name}: {accountant.max_round_trips_per_step()} round trips, {accountant.max_bytes_per_step()} bytes")
@@ -0,0 +1,125 @@
+"""
+Import-time benchmarks (every measurement in a fresh interpreter, python -X importtime):
+  pytest -s tests/benchmarks/test_import_time.py
+Setting UPDATE_IMPORT_TIME_BASELINE=true stores the measured numbers as the new baseline (import_time_baseline.json, next to
+this file) instead of comparing against it. A module missing from the baseline is skipped, saying so.
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+import pytest
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'import_time_baseline.json')
+UPDATE_BASELINE = os.environ.get('UPDATE_IMPORT_TIME_BASELINE', 'False').lower() == 'true'
+RUNS = int(os.environ.get('IMPORT_TIME_RUNS', '5'))
+TOLERANCE = float(os.environ.get('IMPORT_TIME_TOLERANCE', '1.5'))
+
+# LLM providers: whoever uses them imports them, importing our modules mustn't ... The driver stacks (patchright,
+# playwright) aren't here: 'import browser_use' loads them already
+DEFERRED_PACKAGES = ('langchain_google_genai', 'langchain_openai', 'langchain_anthropic')
+MODULES = ['browser_use', 'browser_use.agent.service', 'browser_use.browser.session', 'browser_use.dom.service']
+# Modules of ours that must be importable on top of 'browser_use' without loading any of DEFERRED_PACKAGES
+LAZY_MODULES = [
+  'browser_use.attachments',
+  'browser_use.file_lock',
+  'browser_use.dom.dom_utils',
+  'browser_use.dom.budgeted_serializer',
+  'browser_use.dom.dom_tracing',
+  'browser_use.dom.cdp_accounting',
+  'browser_use.dom.change_detector',
+  'browser_use.dom.xpath_css',
+  'browser_use.agent.checkpoint',
+  'browser_use.agent.history_compaction',
+  'browser_use.agent.llm_cache',
+  'browser_use.agent.llm_clients',
+  'browser_use.agent.llm_timing',
+  'browser_use.agent.rate_limiter',
+  'browser_use.agent.step_callbacks',
+  'browser_use.agent.streaming_actions',
+  'browser_use.browser.page_readiness',
+  'browser_use.browser.perf_metrics',
+  'browser_use.browser.request_filter',
+  'browser_use.browser.speculative_capture',
+  'browser_use.browser.challenge_watcher',
+  'browser_use.browser.coordinate_actions',
+  'browser_use.browser.storage_state_cache',
+  'tests.utils_for_tests',
+]
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+
+
+def _python(code: str, *flags: str) -> subprocess.CompletedProcess:
+  return subprocess.run([sys.executable, *flags, '-c', code], cwd=PROJECT_ROOT, capture_output=True, text=True, check=True)
+
+
+def _import_times_us(module: str) -> dict:
+  """Cumulative import time (microseconds) of 'module' and of the deferred packages it loaded, from -X importtime."""
+  times = {}
+  for line in _python(f'import {module}', '-X', 'importtime').stderr.splitlines():
+    if not line.startswith('import time:') or 'cumulative' in line:
+      continue
+    _, cumulative, name = (part.strip() for part in line[len('import time:'):].split('|'))
+    if name == module or name in DEFERRED_PACKAGES:
+      times.setdefault(name, int(cumulative))  # The first (outermost) time a package gets imported is the one that costs ...
+  return times
+
+
+def _load_baseline() -> dict:
+  if not os.path.exists(BASELINE_PATH):
+    return {}
+  with open(BASELINE_PATH, encoding='utf-8') as f:
+    return json.load(f)
+
+
+@pytest.fixture(scope='module')
+def results():
+  collected = {}
+  yield collected
+  if UPDATE_BASELINE and collected:
+    baseline = _load_baseline()
+    baseline.update(collected)
+    with open(BASELINE_PATH, 'w', encoding='utf-8') as f:
+      json.dump(baseline, f, indent=2, sort_keys=True)
+
+
+@pytest.mark.parametrize('module', MODULES)
+def test_import_time(module, results):
+  runs = [_import_times_us(module) for _ in range(RUNS)]
+  measured = {'median_ms': round(statistics.median(run.get(module, 0) for run in runs) / 1000, 1)}
+  for package in DEFERRED_PACKAGES:
+    package_runs = [run[package] for run in runs if package in run]
+    if package_runs:
+      measured[f'{package}_ms'] = round(statistics.median(package_runs) / 1000, 1)
+
+  print(f"import {module}: {measured}")
+  results[module] = measured
+  if UPDATE_BASELINE:
+    return
+  expected = _load_baseline().get(module)
+  if not expected:
+    pytest.skip(f"No import time baseline for {module} in {BASELINE_PATH}: record one with UPDATE_IMPORT_TIME_BASELINE=true")
+  assert measured['median_ms'] <= expected['median_ms'] * TOLERANCE, (
+    f"import {module}: {measured['median_ms']} ms is over the baseline {expected['median_ms']} ms x {TOLERANCE}")
+
+
+def test_deferred_packages_are_deferred():
+  """'import browser_use' loads none of DEFERRED_PACKAGES: otherwise there'd be nothing left to check in the modules below."""
+  loaded = _python("import sys, browser_use\nprint('\\n'.join(sys.modules))").stdout.split()
+  eager = sorted({name.split('.')[0] for name in loaded if name.split('.')[0] in DEFERRED_PACKAGES})
+  assert not eager, f"import browser_use loads {eager}: they aren't deferred"
+
+
+@pytest.mark.parametrize('module', LAZY_MODULES)
+def test_no_eager_driver_or_provider_imports(module):
+  code = (
+    "import sys, browser_use\n"
+    "before = set(sys.modules)\n"
+    f"import {module}\n"
+    "print('\\n'.join(sorted(set(sys.modules) - before)))\n"
+  )
+  loaded = _python(code).stdout.split()
+  eager = sorted({name.split('.')[0] for name in loaded if name.split('.')[0] in DEFERRED_PACKAGES})
+  assert not eager, f"import {module} loads {eager} eagerly"
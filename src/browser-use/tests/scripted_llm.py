@@ -0,0 +1,112 @@
+# A chat model that doesn't talk to anybody: it replays a predefined sequence of agent outputs (or picks them with a rule applied
+# to the DOM state in the last message) so agent runs are deterministic, free and network-free ...
+import asyncio
+import re
+
+from typing import Any, Callable, Dict, List, Optional, Sequence, Union
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from pydantic import Field, PrivateAttr
+
+# A rule receives the text of the last HumanMessage (the browser state) and returns an agent output or None if it doesn't apply
+ScriptRule = Callable[[str], Optional[Dict[str, Any]]]
+ScriptEntry = Union[Dict[str, Any], ScriptRule]
+
+
+def action(name: str, **params: Any) -> Dict[str, Any]:
+  return {name: params}
+
+
+def agent_output(*actions: Dict[str, Any], next_goal: str = '', memory: str = '') -> Dict[str, Any]:
+  # AgentOutput is flat in 0.3.2: no 'current_state' object ...
+  return {
+    'thinking': 'Scripted',
+    'evaluation_previous_goal': 'Unknown - scripted',
+    'memory': memory,
+    'next_goal': next_goal,
+    'action': list(actions),
+  }
+
+
+def done(text: str = 'Done', success: bool = True) -> Dict[str, Any]:
+  return agent_output(action('done', text=text, success=success), next_goal='Finish')
+
+
+def click_element_containing(text: str) -> ScriptRule:
+  """Rule clicking the first interactive element whose line in the serialized DOM state contains 'text' ..."""
+  pattern = re.compile(r'^\s*\[(\d+)\]<[^\n]*' + re.escape(text), re.MULTILINE)
+
+  def rule(state: str) -> Optional[Dict[str, Any]]:
+    match = pattern.search(state)
+    if not match:
+      return None
+    return agent_output(action('click_element_by_index', index=int(match.group(1))), next_goal=f"Click '{text}'")
+
+  return rule
+
+
+class ScriptedChatModel(BaseChatModel):
+  """
+  Stand-in for a real chat model in agent runs:
+    llm = ScriptedChatModel(script=[agent_output(action('go_to_url', url=url)), click_element_containing('Submit'), done()])
+    agent = await create_agent(task='...', llm=llm, browser_session=browser_session)
+  Entries are consumed in order; a rule that doesn't match the current state is retried in the next step. Once the script is
+  exhausted the model answers 'done'. 'latency' simulates the model thinking time (seconds).
+  """
+  script: List[ScriptEntry] = Field(default_factory=list)
+  fallback_rules: List[ScriptRule] = Field(default_factory=list)
+  latency: float = 0.0
+  model_name: str = 'scripted-chat-model'
+  calls: int = 0
+
+  _position: int = PrivateAttr(default=0)
+  _tool_name: str = PrivateAttr(default='AgentOutput')
+  # The agent doesn't need to check the API keys of a model without API ...
+  _verified_api_keys: bool = PrivateAttr(default=True)
+
+  @property
+  def _llm_type(self) -> str:
+    return 'scripted'
+
+  def bind_tools(self, tools: Sequence[Any], **kwargs: Any) -> 'ScriptedChatModel':
+    # with_structured_output() binds the AgentOutput schema as the only tool, its name is what the output parser looks for ...
+    if tools:
+      self._tool_name = convert_to_openai_tool(tools[0])['function']['name']
+    return self
+
+  def _next_output(self, messages: List[BaseMessage]) -> Dict[str, Any]:
+    state = next((str(m.content) for m in reversed(messages) if isinstance(m, HumanMessage)), '')
+    self.calls += 1
+    while self._position < len(self.script):
+      entry = self.script[self._position]
+      if isinstance(entry, dict):
+        self._position += 1
+        return entry
+      output = entry(state)
+      if output is None:
+        break  # The page isn't ready for this rule yet, the fallback rules (or a wait) get a chance ...
+      self._position += 1
+      return output
+
+    for rule in self.fallback_rules:
+      output = rule(state)
+      if output is not None:
+        return output
+
+    if self._position < len(self.script):
+      return agent_output(action('wait', seconds=1), next_goal='Wait for the page')
+    return done()
+
+  def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None,
+                **kwargs: Any) -> ChatResult:
+    tool_call = {'name': self._tool_name, 'args': self._next_output(messages), 'id': f"call_{self.calls}", 'type': 'tool_call'}
+    return ChatResult(generations=[ChatGeneration(message=AIMessage(content='', tool_calls=[tool_call]))])
+
+  async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None,
+                       **kwargs: Any) -> ChatResult:
+    if self.latency:
+      await asyncio.sleep(self.latency)
+    return self._generate(messages, stop, run_manager, **kwargs)
@@ -0,0 +1,50 @@
+import asyncio
+
+import pytest
+
+from browser_use.agent.service import Agent
+from browser_use.agent.views import AgentHistoryList
+from browser_use.browser.shared_browser import SharedStealthBrowser
+from browser_use.browser.stealth_pool import StealthBrowserPool
+from tests.scripted_llm import ScriptedChatModel, done
+
+
+@pytest.mark.asyncio
+async def test_stealth_pool_slot_comes_back_after_agent_close():
+  """
+  A pooled agent runs on a copy of the borrowed session (Agent() model_copy()s it): closing the agent must still give the
+  browser back to the pool, with a fresh context.
+  """
+  pool = await StealthBrowserPool(size=1, acquire_timeout=30).start(wait=True)
+  try:
+    agent = await Agent.create_stealth_agent(task='Nothing to do, just finish', llm=ScriptedChatModel(script=[done()]),
+                                             browser_pool=pool)
+    history: AgentHistoryList = await agent.run(max_steps=2)
+    browser_context = agent.browser_session.browser_context
+    await agent.close()
+    assert history.is_done() and history.is_successful()
+
+    # The only browser of the pool: it times out if the slot was never recycled ...
+    browser_session = await pool.acquire()
+    assert browser_session.initialized
+    assert browser_session.browser_context is not browser_context
+    await browser_session.stop()
+  finally:
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_shared_browser_context_released_after_agent_close():
+  """Same with a SharedStealthBrowser: the agent's context is closed and its admission slot freed for the next one."""
+  shared = SharedStealthBrowser(max_concurrent_contexts=1)
+  try:
+    for _ in range(2):  # With a single admission slot the second agent waits forever if the first one didn't release it ...
+      agent = await asyncio.wait_for(
+        Agent.create_stealth_agent(task='Nothing to do, just finish', llm=ScriptedChatModel(script=[done()]),
+                                   browser_pool=shared), timeout=30)
+      history: AgentHistoryList = await agent.run(max_steps=2)
+      await agent.close()
+      assert history.is_done() and history.is_successful()
+      assert [report['open_contexts'] for report in shared.memory_report()] == [0]
+  finally:
+    await shared.close()
@@ -0,0 +1,66 @@
+from browser_use.controller.service import Controller
+from browser_use.dom.budgeted_serializer import (PINNED_BUDGET_FRACTION, ExpandedSections, _section_id,
+                                                 budgeted_clickable_elements_to_string, estimate_tokens,
+                                                 register_expand_action, serialize_dom_state)
+from browser_use.dom.views import DOMElementNode, DOMTextNode
+
+
+def _page(regions: int, buttons: int) -> DOMElementNode:
+  # <body> with 'regions' <section>s of 'buttons' buttons each (the sections of the budgeted list) ...
+  body = DOMElementNode(tag_name='body', xpath='/body', attributes={}, children=[], is_visible=True, parent=None)
+  index = 1
+  for region in range(regions):
+    section = DOMElementNode(tag_name='section', xpath=f'/body/section[{region + 1}]', attributes={'id': f'region{region}'},
+                             children=[], is_visible=True, parent=body)
+    body.children.append(section)
+    for button in range(buttons):
+      section.children.append(DOMElementNode(tag_name='button', xpath=f'{section.xpath}/button[{button + 1}]',
+                                             attributes={'name': f'b{region}-{button}'}, children=[], is_visible=True,
+                                             is_interactive=True, is_top_element=True, highlight_index=index, parent=section))
+      index += 1
+  return body
+
+
+def _region_id(region: int) -> str:
+  return _section_id(f"|/body/section[{region + 1}]")
+
+
+def test_expanded_sections_belong_to_their_controller_and_task():
+  """Sections expanded by one agent don't show up in another agent's prompt, nor in the next task of the same agent."""
+  first, second = Controller(), Controller()
+  sections = register_expand_action(first)
+  register_expand_action(second)
+  assert ExpandedSections.activate(first, ('task-1', 'Buy a book')) is sections
+  sections.expand(_region_id(0))
+
+  assert _region_id(0) not in ExpandedSections.activate(second, ('task-2', 'Buy a book'))
+  assert _region_id(0) in ExpandedSections.activate(first, ('task-1', 'Buy a book'))  # Next step, same task ...
+  assert _region_id(0) not in ExpandedSections.activate(first, ('task-1', 'Now buy a pen'))  # ... add_new_task
+
+
+def test_expanded_sections_keep_to_their_share_of_the_budget():
+  """The agent expanding section after section can't push the rest of the page out of the prompt."""
+  tree = _page(regions=4, buttons=30)
+  sections = ExpandedSections()
+  for region in range(3):
+    sections.expand(_region_id(region))
+  token_budget = 400
+
+  text = budgeted_clickable_elements_to_string(tree, ['name'], token_budget, sections)
+  buttons = [line for line in text.split('\n') if '<button' in line]
+  expanded = [line for line in buttons if "name='b3-" not in line]
+  assert sum(estimate_tokens(line) for line in expanded) <= token_budget * PINNED_BUDGET_FRACTION
+  assert len(expanded) < len(buttons)  # The section not expanded still gets the rest of the budget
+
+
+def test_serialization_within_budget_is_upstreams():
+  """Fitting the budget, the element list is the upstream one, from the single walk of the budgeted serializer."""
+  tree = _page(regions=2, buttons=3)
+  section = tree.children[0]
+  section.is_top_element = True
+  section.children.insert(0, DOMTextNode(text=' Regions ', is_visible=True, parent=section))
+  section.children.append(DOMTextNode(text='  ', is_visible=True, parent=section))
+
+  full = tree.clickable_elements_to_string(include_attributes=['name', 'id'])
+  assert serialize_dom_state(tree, ['name', 'id'], token_budget=estimate_tokens(full)) == full
+  assert serialize_dom_state(tree, ['name', 'id'], token_budget=estimate_tokens(full) // 2) != full
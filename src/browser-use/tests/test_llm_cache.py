@@ -0,0 +1,46 @@
+from datetime import datetime
+
+import pytest
+
+import browser_use.agent.prompts as agent_prompts
+from browser_use.agent.llm_cache import SQLiteLLMCache
+from browser_use.agent.views import AgentHistoryList
+from patchright.async_api import async_playwright as async_patchright
+from tests.benchmarks.fixture_pages import FixturePageSpec, FixtureServer
+from tests.scripted_llm import ScriptedChatModel, action, agent_output, done
+from tests.utils_for_tests import create_agent, create_browser_session
+
+
+def _clock(now: datetime):
+  class Clock(datetime):
+    @classmethod
+    def now(cls, tz=None):
+      return now
+
+  return Clock
+
+
+@pytest.mark.asyncio
+async def test_replayed_task_hits_the_cache(tmp_path, monkeypatch):
+  """The same task run twice: every agent call of the second run is answered by the cache, even a few minutes later."""
+  cache = SQLiteLLMCache(str(tmp_path / 'llm_cache.sqlite3'))
+  with FixtureServer() as server:
+    script = [
+      agent_output(action('go_to_url', url=server.url_for(FixturePageSpec(interactive_elements=5))), next_goal='Open the page'),
+      done('Opened'),
+    ]
+    async with async_patchright() as patchright:
+      llms = []
+      for now in (datetime(2025, 7, 1, 10, 0), datetime(2025, 7, 1, 10, 7)):
+        monkeypatch.setattr(agent_prompts, 'datetime', _clock(now))  # 'Current date and time: ...' in every state message
+        browser_session = await create_browser_session(patchright, headless=True)
+        llm = ScriptedChatModel(script=list(script), cache=cache)
+        agent = await create_agent(task='Open the fixture page', llm=llm, browser_session=browser_session)
+        history: AgentHistoryList = await agent.run(max_steps=3)
+        await browser_session.kill()
+        assert history.is_done() and history.is_successful()
+        llms.append(llm)
+
+  first, second = llms
+  assert first.calls == 2 and cache.misses == 2  # Everything asked once ...
+  assert second.calls == 0 and cache.hits == 2  # ... and never again
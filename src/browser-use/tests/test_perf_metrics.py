@@ -0,0 +1,30 @@
+import pytest
+
+from browser_use.agent.service import Agent
+from browser_use.agent.views import AgentHistoryList
+from browser_use.browser.perf_metrics import PerformanceSampler
+from tests.benchmarks.fixture_pages import FixturePageSpec, FixtureServer
+from tests.scripted_llm import ScriptedChatModel, action, agent_output, done
+
+
+@pytest.mark.asyncio
+async def test_performance_samples_land_on_their_history_item():
+  """Every step's samples (its capture and its actions) must end up in its own item of history_with_metrics, not the next one."""
+  with FixtureServer() as server:
+    llm = ScriptedChatModel(script=[
+      agent_output(action('go_to_url', url=server.url_for(FixturePageSpec(interactive_elements=5))), next_goal='Open the page'),
+      done('Opened'),
+    ])
+    agent = await Agent.create_stealth_agent(task='Open the fixture page', llm=llm, headless=True, sample_performance=True)
+    try:
+      history: AgentHistoryList = await agent.run(max_steps=3)
+      sampler = PerformanceSampler.get(agent.browser_session.browser_context)
+      dump = sampler.history_with_metrics(history)
+    finally:
+      await agent.browser_session.kill()
+
+  assert history.is_done() and len(dump['history']) == 2
+  actions_per_item = [[sample['label'] for sample in item['performance'] if sample['kind'] == 'action'] for item in dump['history']]
+  assert actions_per_item == [['go_to_url'], ['done']]
+  # The fixture page was captured at the start of the second step (the first one starts on about:blank) ...
+  assert any(sample['kind'] == 'capture' for sample in dump['history'][1]['performance'])
@@ -1,9 +1,16 @@
 # Work in progress. It could be replaced/complemented by a conftest.py file ...
 import os
+import pytest
 
+from contextlib import contextmanager
 from browser_use.agent.service import Agent
+from browser_use.controller.service import Controller
 from browser_use import BrowserProfile, BrowserSession
-from langchain_google_genai import ChatGoogleGenerativeAI
+from browser_use.agent.llm_cache import SQLiteLLMCache
+from browser_use.agent.llm_clients import get_llm_registry
+from browser_use.agent.rate_limiter import SharedRateLimiter
+from browser_use.dom.budgeted_serializer import DOM_TOKEN_BUDGET, register_expand_action
+from browser_use.dom.cdp_accounting import account_cdp
 
 BY_DEFAULT_GOOGLE_MODEL = "gemini-2.5-flash-lite-preview-06-17"
 
@@ -30,17 +37,42 @@ async def create_browser_session(playwright, headless=True):
   return browser_session
 
 
-def create_llm(model=BY_DEFAULT_GOOGLE_MODEL):
-  """Initialize language model for testing"""
+def create_llm(model=BY_DEFAULT_GOOGLE_MODEL, rate_limiter=None, cache=None, shared=True):
+  """
+  Initialize language model for testing. Rate limited when RE_BROWSER_USE_LLM_RPM/_TPM are set (see SharedRateLimiter) and
+  cached on disk when RE_BROWSER_USE_LLM_CACHE is set (see SQLiteLLMCache). The agents of a run share it, and its
+  connection, unless shared=False or it's created outside the run's event loop (see LLMClientRegistry)
+  """
+  # Imported here: the provider SDK is heavy and the scripted/offline tests never need it ...
+  from langchain_google_genai import ChatGoogleGenerativeAI
+
   model_from_environment = os.environ.get('BY_DEFAULT_GOOGLE_MODEL', BY_DEFAULT_GOOGLE_MODEL)
-  return ChatGoogleGenerativeAI(model=model if model != BY_DEFAULT_GOOGLE_MODEL else model_from_environment)
+  model = model if model != BY_DEFAULT_GOOGLE_MODEL else model_from_environment
+
+  def build(rate_limiter=None, cache=None):
+    rate_limiter = rate_limiter or SharedRateLimiter.from_environment(model)
+    cache = cache or SQLiteLLMCache.from_environment()
+    options = {}
+    if rate_limiter is not None:
+      options.update(rate_limiter=rate_limiter, callbacks=[rate_limiter.callback_handler])
+    if cache is not None:
+      options.update(cache=cache)
+    return ChatGoogleGenerativeAI(model=model, **options)
+
+  if not shared:
+    return build(rate_limiter, cache)
+  return get_llm_registry().get_llm(ChatGoogleGenerativeAI, model, factory=build, rate_limiter=rate_limiter, cache=cache)
 
 
 async def create_agent(task, llm, browser_session):
+  controller = Controller()
+  if DOM_TOKEN_BUDGET:  # The placeholders of the budgeted element list point at this action ...
+    register_expand_action(controller)
   agent = Agent(
     task=task,
     llm=llm,
     browser_session=browser_session,
+    controller=controller,
     # I don't want vision or memory ...
     enable_memory=False,
     use_vision=False,
@@ -49,3 +81,18 @@ async def create_agent(task, llm, browser_session):
   )
 
   return agent
+
+
+@contextmanager
+def cdp_budget(max_round_trips: int, max_bytes: int | None = None):
+  """
+  Fails the test when any state capture done inside the block goes over the declared budget (per step):
+    with cdp_budget(max_round_trips=40):
+      await dom_service.get_multitarget_clickable_elements()
+  """
+  with account_cdp() as accountant:
+    yield accountant
+
+  violations = accountant.budget_violations(max_round_trips, max_bytes)
+  if violations:
+    pytest.fail("CDP budget exceeded:\n  " + "\n  ".join(violations))